@@ -0,0 +1,286 @@
+# utils/analytics.py
+# Thống kê lịch sử game: kết quả từng game/từng người chơi lưu theo cột và các bảng tổng hợp
+# được cộng dồn mỗi khi game kết thúc, để /stats chỉ cần đọc vài dòng đã tính sẵn
+
+import json
+import hashlib
+import logging
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+from constants import WEREWOLF_ROLES
+from db import execute_async_query, player_won
+from utils.game_journal import EventKind, get_timeline
+
+logger = logging.getLogger(__name__)
+
+# Tạo bởi migration trong utils.migrations
+ANALYTICS_TABLES = [
+    # Một dòng cho mỗi game đã kết thúc
+    """
+    CREATE TABLE IF NOT EXISTS game_results (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        ended_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        winner VARCHAR(20) NOT NULL,
+        players_count SMALLINT UNSIGNED NOT NULL,
+        werewolves_count SMALLINT UNSIGNED NOT NULL,
+        villagers_count SMALLINT UNSIGNED NOT NULL,
+        nights SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+        duration_seconds INT UNSIGNED NOT NULL DEFAULT 0,
+        role_mix VARCHAR(512) NOT NULL,
+        INDEX idx_guild_time (guild_id, ended_at)
+    )
+    """,
+    # Một dòng cho mỗi người chơi trong mỗi game
+    """
+    CREATE TABLE IF NOT EXISTS game_player_results (
+        game_result_id BIGINT NOT NULL,
+        guild_id BIGINT NOT NULL,
+        player_id BIGINT NOT NULL,
+        role VARCHAR(32) NOT NULL,
+        team VARCHAR(20) NOT NULL,
+        won TINYINT NOT NULL,
+        survived TINYINT NOT NULL,
+        death_night SMALLINT UNSIGNED DEFAULT NULL,
+        voted_out TINYINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (game_result_id, player_id),
+        INDEX idx_guild_player (guild_id, player_id),
+        INDEX idx_guild_role (guild_id, role)
+    )
+    """,
+    # Tổng hợp theo số người chơi
+    """
+    CREATE TABLE IF NOT EXISTS stats_team_size (
+        guild_id BIGINT NOT NULL,
+        players_count SMALLINT UNSIGNED NOT NULL,
+        games INT NOT NULL DEFAULT 0,
+        werewolf_wins INT NOT NULL DEFAULT 0,
+        villager_wins INT NOT NULL DEFAULT 0,
+        total_nights INT NOT NULL DEFAULT 0,
+        total_seconds BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, players_count)
+    )
+    """,
+    # Tổng hợp theo vai trò
+    """
+    CREATE TABLE IF NOT EXISTS stats_role (
+        guild_id BIGINT NOT NULL,
+        role VARCHAR(32) NOT NULL,
+        appearances INT NOT NULL DEFAULT 0,
+        wins INT NOT NULL DEFAULT 0,
+        deaths INT NOT NULL DEFAULT 0,
+        voted_out INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, role)
+    )
+    """,
+    # Tổng hợp theo tổ hợp vai trò (role_mix_hash là md5 của role_mix)
+    """
+    CREATE TABLE IF NOT EXISTS stats_role_mix (
+        guild_id BIGINT NOT NULL,
+        role_mix_hash CHAR(32) NOT NULL,
+        role_mix VARCHAR(512) NOT NULL,
+        games INT NOT NULL DEFAULT 0,
+        werewolf_wins INT NOT NULL DEFAULT 0,
+        villager_wins INT NOT NULL DEFAULT 0,
+        total_nights INT NOT NULL DEFAULT 0,
+        total_seconds BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, role_mix_hash),
+        INDEX idx_guild_games (guild_id, games)
+    )
+    """
+]
+
+class PlayerResult(NamedTuple):
+    player_id: int
+    role: str
+    team: str
+    won: bool
+    survived: bool
+    death_night: Optional[int] = None
+    voted_out: bool = False
+
+class GameResult(NamedTuple):
+    guild_id: int
+    winner: str
+    nights: int
+    duration_seconds: int
+    players: List[PlayerResult]
+
+    @property
+    def werewolves_count(self) -> int:
+        return sum(1 for p in self.players if p.team == "werewolves")
+
+    @property
+    def role_mix(self) -> str:
+        """Tổ hợp vai trò dạng chuẩn hóa (sắp theo tên), ví dụ "Guard, Seer, Villager x3, Werewolf x2" """
+        counts = Counter(p.role for p in self.players)
+        return ", ".join(role if n == 1 else f"{role} x{n}" for role, n in sorted(counts.items()))
+
+def team_of(role: str) -> str:
+    """Phe của vai trò (thắng/thua tính bằng db.player_won: Nhà Ảo Giác cũng thắng khi Dân thắng)"""
+    return "werewolves" if role in WEREWOLF_ROLES else "villagers"
+
+def build_game_result(game_state, winner: str) -> GameResult:
+    """
+    Chuẩn hóa kết quả game từ game_state và timeline trong bộ nhớ
+
+    Args:
+        game_state (dict): Trạng thái game vừa kết thúc (journal chưa bị tách)
+        winner (str): Phe thắng ("werewolves", "villagers", "no_one")
+    """
+    death_nights: Dict[int, int] = {}
+    voted_out = set()
+    duration_ms = 0
+    for event in get_timeline(game_state):
+        duration_ms = event.offset_ms
+        if event.kind == EventKind.STATUS and event.data == "dead":
+            death_nights.setdefault(event.actor, event.night)
+        elif event.kind == EventKind.VOTE_RESULT and event.target:
+            voted_out.add(event.target)
+
+    players = []
+    for user_id_raw, data in game_state["players"].items():
+        user_id = int(user_id_raw)
+        role = data.get("role", "Unknown")
+        team = team_of(role)
+        survived = data.get("status") in ["alive", "wounded"]
+        players.append(PlayerResult(
+            user_id, role, team, player_won(role, winner), survived,
+            None if survived else death_nights.get(user_id), user_id in voted_out
+        ))
+    return GameResult(int(game_state["guild_id"]), winner, game_state.get("night_count") or 0, duration_ms // 1000, players)
+
+def store_game_result(cursor, result: GameResult) -> int:
+    """
+    Ghi kết quả game và cộng dồn các bảng tổng hợp bằng cursor của transaction đang mở
+    (transaction ghi kết quả game trong db, commit/rollback do bên gọi đảm nhiệm)
+
+    Returns:
+        int: id của dòng game_results
+    """
+    role_mix = result.role_mix[:512]
+    role_mix_hash = hashlib.md5(role_mix.encode("utf-8")).hexdigest()
+    werewolf_win = int(result.winner == "werewolves")
+    villager_win = int(result.winner == "villagers")
+
+    roles: Dict[str, List[int]] = {}
+    for p in result.players:
+        row = roles.setdefault(p.role, [0, 0, 0, 0])
+        row[0] += 1
+        row[1] += int(p.won)
+        row[2] += int(not p.survived)
+        row[3] += int(p.voted_out)
+
+    cursor.execute("""
+        INSERT INTO game_results (guild_id, winner, players_count, werewolves_count, villagers_count,
+                                  nights, duration_seconds, role_mix)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (result.guild_id, result.winner, len(result.players), result.werewolves_count,
+          len(result.players) - result.werewolves_count, result.nights, result.duration_seconds, role_mix))
+    game_result_id = cursor.lastrowid
+
+    cursor.executemany("""
+        INSERT INTO game_player_results (game_result_id, guild_id, player_id, role, team, won, survived, death_night, voted_out)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(game_result_id, result.guild_id, p.player_id, p.role, p.team, int(p.won), int(p.survived),
+           p.death_night, int(p.voted_out)) for p in result.players])
+
+    cursor.execute("""
+        INSERT INTO stats_team_size (guild_id, players_count, games, werewolf_wins, villager_wins, total_nights, total_seconds)
+        VALUES (%s, %s, 1, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            games = games + 1,
+            werewolf_wins = werewolf_wins + VALUES(werewolf_wins),
+            villager_wins = villager_wins + VALUES(villager_wins),
+            total_nights = total_nights + VALUES(total_nights),
+            total_seconds = total_seconds + VALUES(total_seconds)
+    """, (result.guild_id, len(result.players), werewolf_win, villager_win, result.nights, result.duration_seconds))
+
+    cursor.executemany("""
+        INSERT INTO stats_role (guild_id, role, appearances, wins, deaths, voted_out)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            appearances = appearances + VALUES(appearances),
+            wins = wins + VALUES(wins),
+            deaths = deaths + VALUES(deaths),
+            voted_out = voted_out + VALUES(voted_out)
+    """, [(result.guild_id, role, *counts) for role, counts in roles.items()])
+
+    cursor.execute("""
+        INSERT INTO stats_role_mix (guild_id, role_mix_hash, role_mix, games, werewolf_wins, villager_wins, total_nights, total_seconds)
+        VALUES (%s, %s, %s, 1, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            games = games + 1,
+            werewolf_wins = werewolf_wins + VALUES(werewolf_wins),
+            villager_wins = villager_wins + VALUES(villager_wins),
+            total_nights = total_nights + VALUES(total_nights),
+            total_seconds = total_seconds + VALUES(total_seconds)
+    """, (result.guild_id, role_mix_hash, role_mix, werewolf_win, villager_win, result.nights, result.duration_seconds))
+
+    return game_result_id
+
+def backfill_from_game_logs(cursor) -> int:
+    """
+    Chuẩn hóa các game cũ trong game_logs (cột players_data dạng JSON) sang bảng thống kê.
+    Game cũ không có timeline nên không có đêm chết, số người bị treo và thời lượng.
+    Chạy bằng cursor của transaction migration: lỗi giữa chừng thì toàn bộ được rollback và chạy lại từ đầu.
+
+    Returns:
+        int: Số game đã nạp
+    """
+    cursor.execute("""
+        SELECT guild_id, winner, duration, players_data FROM game_logs
+        WHERE players_data IS NOT NULL AND winner IS NOT NULL
+        ORDER BY id
+    """)
+    imported = 0
+    for guild_id, winner, duration, players_data in cursor.fetchall():
+        try:
+            players = []
+            for user_id, data in json.loads(players_data).items():
+                role = data.get("role", "Unknown")
+                players.append(PlayerResult(int(user_id), role, team_of(role), player_won(role, winner),
+                                            data.get("status") in ["alive", "wounded"]))
+        except (TypeError, ValueError, AttributeError) as e:
+            logger.error(f"Bỏ qua game_logs không hợp lệ khi nạp thống kê: {str(e)}")
+            continue
+        if players:
+            store_game_result(cursor, GameResult(int(guild_id), winner, duration or 0, 0, players))
+            imported += 1
+    if imported:
+        logger.info(f"Đã nạp {imported} game cũ vào bảng thống kê")
+    return imported
+
+async def get_overview(guild_id: int) -> Optional[Dict]:
+    """Tổng quan của guild (cộng các dòng stats_team_size, mỗi guild chỉ có vài dòng)"""
+    rows, _ = await execute_async_query("""
+        SELECT SUM(games) AS games, SUM(werewolf_wins) AS werewolf_wins, SUM(villager_wins) AS villager_wins,
+               SUM(total_nights) AS total_nights, SUM(total_seconds) AS total_seconds
+        FROM stats_team_size WHERE guild_id = %s
+    """, (int(guild_id),), fetch=True)
+    return rows[0] if rows and rows[0]["games"] else None
+
+async def get_team_size_stats(guild_id: int) -> List[Dict]:
+    """Tỉ lệ thắng và độ dài game theo số người chơi"""
+    rows, _ = await execute_async_query("""
+        SELECT players_count, games, werewolf_wins, villager_wins, total_nights, total_seconds
+        FROM stats_team_size WHERE guild_id = %s ORDER BY players_count
+    """, (int(guild_id),), fetch=True)
+    return rows or []
+
+async def get_role_stats(guild_id: int) -> List[Dict]:
+    """Số lần xuất hiện, thắng, chết và bị treo của từng vai trò (vai bị giết nhiều nhất trước)"""
+    rows, _ = await execute_async_query("""
+        SELECT role, appearances, wins, deaths, voted_out
+        FROM stats_role WHERE guild_id = %s ORDER BY deaths DESC, appearances DESC
+    """, (int(guild_id),), fetch=True)
+    return rows or []
+
+async def get_role_mix_stats(guild_id: int, limit: int = 5) -> List[Dict]:
+    """Các tổ hợp vai trò được chơi nhiều nhất"""
+    rows, _ = await execute_async_query("""
+        SELECT role_mix, games, werewolf_wins, villager_wins, total_nights, total_seconds
+        FROM stats_role_mix WHERE guild_id = %s ORDER BY games DESC LIMIT %s
+    """, (int(guild_id), limit), fetch=True)
+    return rows or []
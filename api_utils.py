@@ -6,10 +6,11 @@ import asyncio
 import inspect
 import logging
 import traceback
-import random
 from typing import Callable, Any, Dict, List, Optional, Union
 
 from config import API_MAX_RETRIES, API_RETRY_DELAY
+from utils.voice_manager import get_voice_manager, start_playback
+from utils.perf import record_value
 
 logger = logging.getLogger(__name__)
 
@@ -227,103 +228,37 @@ async def play_audio(file_path, voice_connection):
     """
     Phát âm thanh trong kênh voice với xử lý lỗi tốt hơn
     
+    Nếu kết nối đang bị ngắt, âm thanh được xếp hàng và phát khi VoiceManager kết nối lại xong
+    (không kết nối lại trực tiếp trên luồng phát để tránh chạy song song với các lần kết nối lại khác).
+    
     Args:
         file_path (str): Đường dẫn đến file âm thanh
         voice_connection (discord.VoiceClient): Kết nối voice
         
     Returns:
-        bool: True nếu thành công, False nếu thất bại
+        bool: True nếu phát ngay được, False nếu đang chờ kết nối lại hoặc thất bại
     """
     if not voice_connection:
         logger.error("Voice connection is None, cannot play audio")
         return False
         
     try:
-        # Kiểm tra kết nối còn nguyên vẹn không
+        voice_manager = get_voice_manager()
+        if voice_manager:
+            return voice_manager.play(voice_connection.guild.id, file_path, voice_connection)
+        
+        # Chưa có VoiceManager: phát trực tiếp nếu còn kết nối
         if not voice_connection.is_connected():
             logger.warning("Voice connection is not connected, cannot play audio")
-            # Thử lấy tham chiếu đến VoiceManager để kết nối lại
-            try:
-                from main import voice_manager
-                if voice_manager and voice_connection.channel:
-                    guild_id = voice_connection.channel.guild.id
-                    await voice_manager._attempt_reconnect(guild_id)
-                    # Cập nhật lại voice_connection với phiên bản mới
-                    if guild_id in voice_manager.voice_connections:
-                        voice_connection = voice_manager.voice_connections[guild_id]
-                    else:
-                        return False
-            except ImportError:
-                logger.warning("Cannot import voice_manager, reconnection not attempted")
-                return False
-                
-        # Ngừng phát âm thanh nếu đang phát
-        if voice_connection.is_playing():
-            voice_connection.stop()
-            
-        # Thêm xử lý lỗi cụ thể hơn
-        audio_source = discord.FFmpegPCMAudio(file_path)
-        voice_connection.play(
-            audio_source,
-            after=lambda error: logger.error(f"Audio playback error: {error}") if error else None
-        )
-        return True
+            return False
+        return start_playback(voice_connection, file_path)
         
-    except FileNotFoundError:
-        logger.error(f"Audio file not found: {file_path}")
-    except discord.errors.ClientException as e:
-        logger.error(f"Discord client error when playing audio: {e}")
     except Exception as e:
         logger.error(f"General error playing audio {file_path}: {e}")
         traceback.print_exc()
     
     return False
 
-async def generate_math_problem(used_problems):
-    """
-    Tạo bài toán cộng/trừ cho người chơi phải giải quyết
-    
-    Args:
-        used_problems (set): Tập hợp các bài toán đã được sử dụng
-    
-    Returns:
-        dict: Bài toán với dạng {"problem": "123 + 456", "answer": 579, "options": [579, 589, 569]}
-    """
-    for _ in range(20):  # Giảm số lần thử từ 100 xuống 20 để tối ưu
-        num1 = random.randint(100, 999)
-        num2 = random.randint(100, 999)
-        operation = random.choice(['+', '-'])
-        problem = f"{num1} {operation} {num2}"
-        
-        if problem in used_problems:
-            continue
-            
-        answer = num1 + num2 if operation == '+' else num1 - num2
-        if answer < 100:
-            continue
-            
-        # Tạo các phương án sai gần với đáp án đúng
-        wrong_options = [answer + offset for offset in [-100, -50, -10, 10, 50, 100] 
-                         if answer + offset != answer and answer + offset >= 0]
-        
-        if len(wrong_options) < 2:
-            continue
-            
-        wrong1, wrong2 = random.sample(wrong_options, 2)
-        options = [answer, wrong1, wrong2]
-        random.shuffle(options)
-        
-        return {"problem": problem, "answer": answer, "options": options}
-    
-    # Nếu không thể tạo bài toán duy nhất sau nhiều lần thử
-    # Trả về một bài toán mặc định
-    default_answer = 150
-    return {
-        "problem": "100 + 50", 
-        "answer": default_answer, 
-        "options": [default_answer, default_answer + 10, default_answer - 10]
-    }
-
 async def countdown(channel, seconds, phase, game_state):
     """
     Hiển thị đếm ngược cho một pha game
@@ -342,6 +277,7 @@ async def countdown(channel, seconds, phase, game_state):
         logger.error(f"Không thể gửi tin nhắn đếm ngược cho {phase}: channel is None")
         return
 
+    started_at = asyncio.get_running_loop().time()
     try:
         # Gửi tin nhắn ban đầu
         current_message = await channel.send(f"⏳ *Đang đếm ngược cho {phase}... ({seconds}s)*")
@@ -370,6 +306,9 @@ async def countdown(channel, seconds, phase, game_state):
             
         await current_message.edit(content=f"⏳ *Pha {phase} kết thúc!*")
         
+        # Độ lệch giữa thời gian thực tế và thời gian đếm ngược danh nghĩa
+        record_value(game_state, f"countdown_drift.{phase}", asyncio.get_running_loop().time() - started_at - seconds)
+        
     except Exception as e:
         logger.error(f"Lỗi trong quá trình đếm ngược cho {phase}: {str(e)}")
         traceback.print_exc()
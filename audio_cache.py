@@ -0,0 +1,98 @@
+# utils/audio_cache.py
+# Giải mã trước các file âm thanh của phase thành PCM trong bộ nhớ để không phải chạy ffmpeg mỗi lần phát
+
+import discord
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Định dạng PCM mà discord.py yêu cầu: 48kHz, stereo, 16-bit, khung 20ms
+SAMPLE_RATE = 48000
+CHANNELS = 2
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE  # 3840 bytes
+
+class CachedPCMAudio(discord.AudioSource):
+    """AudioSource đọc từng khung PCM từ buffer đã giải mã sẵn"""
+
+    def __init__(self, pcm: memoryview):
+        self.pcm = pcm
+        self.position = 0
+
+    def read(self) -> bytes:
+        end = self.position + FRAME_SIZE
+        if end > len(self.pcm):
+            return b''
+        frame = self.pcm[self.position:end]
+        self.position = end
+        # Opus encoder của discord.py cần bytes nên chỉ sao chép đúng một khung 20ms
+        return frame.tobytes()
+
+    def is_opus(self) -> bool:
+        return False
+
+class AudioCache:
+    """Lưu PCM đã giải mã của các file âm thanh, dùng chung cho mọi guild"""
+
+    def __init__(self, executable: str = "ffmpeg"):
+        self.executable = executable
+        self.clips: Dict[str, memoryview] = {}
+        self.lock = asyncio.Lock()
+
+    async def _decode(self, file_path: str) -> Optional[memoryview]:
+        """Chạy ffmpeg một lần để giải mã file sang PCM s16le 48kHz stereo"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.executable, "-hide_banner", "-loglevel", "error",
+                "-i", file_path,
+                "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS),
+                "pipe:1",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+            if process.returncode != 0:
+                logger.error(f"ffmpeg không thể giải mã {file_path}: {stderr.decode(errors='ignore').strip()}")
+                return None
+            return memoryview(stdout)
+        except FileNotFoundError:
+            logger.error(f"Không tìm thấy ffmpeg khi giải mã {file_path}")
+        except Exception as e:
+            logger.error(f"Lỗi khi giải mã âm thanh {file_path}: {str(e)}")
+        return None
+
+    async def preload(self, file_paths: Iterable[str]):
+        """
+        Giải mã trước các file âm thanh (bỏ qua file đã có trong cache)
+
+        Args:
+            file_paths (iterable): Đường dẫn các file âm thanh
+        """
+        async with self.lock:
+            pending = [path for path in dict.fromkeys(file_paths) if path not in self.clips]
+            if not pending:
+                return
+
+            results = await asyncio.gather(*(self._decode(path) for path in pending))
+            for path, pcm in zip(pending, results):
+                if pcm is not None:
+                    self.clips[path] = pcm
+
+            total_bytes = sum(len(pcm) for pcm in self.clips.values())
+            logger.info(f"Đã giải mã trước {len(self.clips)} file âm thanh ({total_bytes / 1024 / 1024:.1f} MB PCM)")
+
+    def get_source(self, file_path: str) -> Optional[CachedPCMAudio]:
+        """
+        Tạo AudioSource từ PCM đã cache
+
+        Returns:
+            CachedPCMAudio hoặc None nếu file chưa được giải mã
+        """
+        pcm = self.clips.get(file_path)
+        if pcm is None:
+            return None
+        return CachedPCMAudio(pcm)
+
+# Cache dùng chung cho toàn bộ bot
+audio_cache = AudioCache()
@@ -0,0 +1,87 @@
+# utils/command_sync.py
+# Đồng bộ lệnh slash theo hash: chỉ gọi tree.sync() khi command tree thay đổi so với lần đồng bộ trước
+
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Optional
+
+import discord
+from discord import app_commands
+
+from config import COMMAND_SYNC_FILE, DEV_GUILD_IDS
+
+logger = logging.getLogger(__name__)
+
+def _command_payload(command, tree: app_commands.CommandTree) -> dict:
+    """Dữ liệu của lệnh đúng như được gửi lên Discord khi sync"""
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        # discord.py < 2.4: to_dict() không nhận tree
+        return command.to_dict()
+
+def command_tree_hash(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """sha256 của command tree (toàn cục hoặc của một guild) đã chuẩn hóa"""
+    payload = sorted(
+        (_command_payload(command, tree) for command in tree.get_commands(guild=guild)),
+        key=lambda data: (data.get("type", 1), data["name"])
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def load_hashes(path: str = COMMAND_SYNC_FILE) -> Dict[str, str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Không đọc được {path}, sẽ đồng bộ lại toàn bộ: {str(e)}")
+        return {}
+
+def save_hashes(hashes: Dict[str, str], path: str = COMMAND_SYNC_FILE):
+    """Ghi qua file tạm để không bao giờ để lại file hỏng"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, indent=2)
+    os.replace(temp_path, path)
+
+async def sync_commands(bot, force: bool = False) -> Dict[str, Optional[int]]:
+    """
+    Đồng bộ command tree với Discord khi có thay đổi
+
+    Nếu cấu hình DEV_GUILD_IDS, lệnh toàn cục được sao chép vào từng guild dev và đồng bộ
+    theo guild (áp dụng ngay, giới hạn rate riêng) thay cho đồng bộ toàn cục.
+
+    Args:
+        bot (commands.Bot): Bot có command tree cần đồng bộ
+        force (bool): Đồng bộ kể cả khi hash không đổi (dùng cho /sync)
+
+    Returns:
+        dict: {phạm vi: số lệnh đã đồng bộ, None nếu bỏ qua vì không đổi}
+    """
+    tree = bot.tree
+    hashes = load_hashes()
+    scopes = {f"guild:{guild_id}": discord.Object(id=guild_id) for guild_id in DEV_GUILD_IDS} or {"global": None}
+    results: Dict[str, Optional[int]] = {}
+
+    for scope, guild in scopes.items():
+        if guild is not None:
+            tree.copy_global_to(guild=guild)
+        key = f"{bot.application_id}:{scope}"
+        current = command_tree_hash(tree, guild)
+        if not force and hashes.get(key) == current:
+            logger.info(f"Command tree ({scope}) không đổi, bỏ qua sync")
+            results[scope] = None
+            continue
+        synced = await tree.sync(guild=guild)
+        hashes[key] = current
+        results[scope] = len(synced)
+        logger.info(f"Đã đồng bộ {len(synced)} lệnh ({scope})")
+
+    try:
+        save_hashes(hashes)
+    except Exception as e:
+        logger.error(f"Không lưu được hash command tree: {str(e)}")
+    return results
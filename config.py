@@ -3,20 +3,19 @@
 
 import os
 import logging
-import sys
 from dotenv import load_dotenv
 
+from utils.log_pipeline import setup_logging
+
 # Đảm bảo biến môi trường được tải
 load_dotenv()
 
-# Thiết lập logging
-logging.basicConfig(
+# Thiết lập logging qua queue (ghi file/console ở thread riêng, file bot.log dạng JSON xoay vòng theo dung lượng)
+setup_logging(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler("bot.log", encoding="utf-8")
-    ]
+    log_file="bot.log",
+    max_bytes=int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+    backup_count=int(os.getenv("LOG_BACKUP_COUNT", 5))
 )
 
 logger = logging.getLogger("masoi_bot")
@@ -51,6 +50,14 @@ TIMINGS = {
     "countdown_final": 15
 }
 
+# Thư mục lưu journal sự kiện của từng game
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journals")
+
+# Đồng bộ lệnh slash: file lưu hash của command tree đã đồng bộ, và các guild dev
+# (DEV_GUILD_IDS="123,456") được đồng bộ riêng từng guild thay cho đồng bộ toàn cục
+COMMAND_SYNC_FILE = os.getenv("COMMAND_SYNC_FILE", ".command_sync.json")
+DEV_GUILD_IDS = [int(g) for g in os.getenv("DEV_GUILD_IDS", "").replace(" ", "").split(",") if g]
+
 # Các biến toàn cục cho trạng thái
 game_states = {}  # Lưu trữ trạng thái game cho từng guild
 game_logs = {}    # Lưu trữ logs game cho từng guild
\ No newline at end of file
@@ -80,5 +80,11 @@ AUDIO_FILES = {
     "end_game": "end_game.mp3" 
 }
 
+# Tên và lý do tạo các tài nguyên Discord của game (dùng để nhận diện khi dọn dẹp)
+GAME_ROLE_REASON = "DeWolfVie game role"
+GAME_ROLE_NAMES = ["Villager", "Dead", "Werewolf"]
+GAME_TEXT_CHANNEL_NAMES = ["wolf-chat", "dead-chat"]
+PLAYER_CHANNEL_PREFIX = "House of "
+
 # Phiên bản bot
 BOT_VERSION = "DeWolfVie ver 5.15"
\ No newline at end of file
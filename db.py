@@ -4,12 +4,15 @@
 import mysql.connector
 import mysql.connector.pooling
 from contextlib import contextmanager, asynccontextmanager
+from collections import OrderedDict
 import logging
 import asyncio
 import json
 import traceback
 import time
 from config import DB_CONFIG
+from constants import WEREWOLF_ROLES
+from utils.perf import traced
 
 logger = logging.getLogger(__name__)
 
@@ -200,23 +203,23 @@ def execute_query(query, params=None, fetch=False, commit=True, many=False):
                 cursor = conn.cursor(dictionary=True)
                 
                 # Ghi log truy vấn và tham số để gỡ lỗi
-                logger.debug(f"Thực thi truy vấn: {query}")
+                logger.debug("Thực thi truy vấn: %s", query)
                 
-                # In tham số dưới dạng không gây lỗi
-                try:
-                    if params:
+                # In tham số dưới dạng không gây lỗi (chỉ khi bật DEBUG)
+                if params and logger.isEnabledFor(logging.DEBUG):
+                    try:
                         if isinstance(params, list) and len(params) > 10:
-                            logger.debug(f"Với {len(params)} tham số (showing first 2): {params[:2]}")
+                            logger.debug("Với %d tham số (showing first 2): %s", len(params), params[:2])
                         else:
-                            logger.debug(f"Với tham số: {params}")
-                except:
-                    logger.debug("Không thể in tham số truy vấn")
+                            logger.debug("Với tham số: %s", params)
+                    except:
+                        logger.debug("Không thể in tham số truy vấn")
                 
                 # Xử lý các loại tham số khác nhau
                 if many and isinstance(params, (list, tuple)) and params:
                     try:
                         cursor.executemany(query, params)
-                        logger.debug(f"Đã thực thi executemany với {len(params)} dòng dữ liệu")
+                        logger.debug("Đã thực thi executemany với %d dòng dữ liệu", len(params))
                     except Exception as e:
                         logger.error(f"Lỗi executemany: {str(e)}")
                         # Thử phương án thay thế: thực hiện từng truy vấn một
@@ -240,7 +243,7 @@ def execute_query(query, params=None, fetch=False, commit=True, many=False):
                 
                 if commit:
                     conn.commit()
-                    logger.debug(f"Truy vấn đã commit với {cursor.rowcount} dòng bị ảnh hưởng")
+                    logger.debug("Truy vấn đã commit với %d dòng bị ảnh hưởng", cursor.rowcount)
                 
                 affected_rows = cursor.rowcount
                 return result, affected_rows
@@ -296,43 +299,9 @@ def init_database():
             if not test_database_connection():
                 return False
             
-        # Bảng leaderboard với schema mở rộng
-        execute_query("""
-            CREATE TABLE IF NOT EXISTS leaderboard (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                guild_id BIGINT NOT NULL,
-                player_id BIGINT NOT NULL,
-                player_name VARCHAR(255) NOT NULL,
-                score INT DEFAULT 0,
-                games_played INT DEFAULT 0,
-                wins INT DEFAULT 0,
-                role_counts TEXT DEFAULT '{}',
-                role_wins TEXT DEFAULT '{}',
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                UNIQUE KEY unique_guild_player (guild_id, player_id),
-                INDEX idx_guild_score (guild_id, score DESC)
-            )
-        """)
-        
-        # Bảng game_logs
-        execute_query("""
-            CREATE TABLE IF NOT EXISTS game_logs (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                guild_id BIGINT NOT NULL,
-                log_message TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                winner VARCHAR(20) DEFAULT NULL,
-                players_count INT DEFAULT 0,
-                werewolves_count INT DEFAULT 0,
-                villagers_count INT DEFAULT 0,
-                duration INT DEFAULT 0,
-                players_data TEXT DEFAULT NULL,
-                INDEX idx_guild_time (guild_id, timestamp DESC)
-            )
-        """)
-        
-        # Kiểm tra và cập nhật schema nếu cần
-        update_database_schema()
+        # Đưa schema lên phiên bản mới nhất (chỉ một lần đọc schema_version nếu đã mới nhất)
+        from utils.migrations import run_migrations
+        run_migrations()
         
         logger.info("Đã khởi tạo các bảng trong cơ sở dữ liệu")
         return True
@@ -341,593 +310,468 @@ def init_database():
         logger.error(traceback.format_exc())
         return False
 
-def update_database_schema():
-    """
-    Cập nhật cấu trúc cơ sở dữ liệu khi có thay đổi
-    """
-    try:
-        # Kiểm tra và thêm các cột mới vào bảng leaderboard
-        columns_to_check = [
-            ('wins', 'INT DEFAULT 0 AFTER games_played'),
-            ('role_counts', 'TEXT DEFAULT \'{}\' AFTER wins'),
-            ('role_wins', 'TEXT DEFAULT \'{}\' AFTER role_counts')
-        ]
-        
-        for column_name, column_def in columns_to_check:
-            check_query = """
-                SELECT COUNT(*) as column_exists 
-                FROM information_schema.COLUMNS 
-                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'leaderboard' AND COLUMN_NAME = %s
-            """
-            result, _ = execute_query(check_query, (DB_CONFIG["database"], column_name), fetch=True)
-            
-            # Nếu cột chưa tồn tại, thêm vào
-            if result and result[0]['column_exists'] == 0:
-                add_column_query = f"""
-                    ALTER TABLE leaderboard ADD COLUMN {column_name} {column_def}
-                """
-                execute_query(add_column_query)
-                logger.info(f"Đã thêm cột {column_name} vào bảng leaderboard")
-        
-        # Kiểm tra và thêm các cột mới vào bảng game_logs
-        log_columns_to_check = [
-            ('winner', 'VARCHAR(20) DEFAULT NULL AFTER log_message'),
-            ('players_count', 'INT DEFAULT 0 AFTER timestamp'),
-            ('werewolves_count', 'INT DEFAULT 0 AFTER players_count'),
-            ('villagers_count', 'INT DEFAULT 0 AFTER werewolves_count'),
-            ('duration', 'INT DEFAULT 0 AFTER villagers_count'),
-            ('players_data', 'TEXT DEFAULT NULL AFTER duration')
-        ]
-        
-        for column_name, column_def in log_columns_to_check:
-            check_query = """
-                SELECT COUNT(*) as column_exists 
-                FROM information_schema.COLUMNS 
-                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'game_logs' AND COLUMN_NAME = %s
-            """
-            result, _ = execute_query(check_query, (DB_CONFIG["database"], column_name), fetch=True)
-            
-            # Nếu cột chưa tồn tại, thêm vào
-            if result and result[0]['column_exists'] == 0:
-                add_column_query = f"""
-                    ALTER TABLE game_logs ADD COLUMN {column_name} {column_def}
-                """
-                execute_query(add_column_query)
-                logger.info(f"Đã thêm cột {column_name} vào bảng game_logs")
-            
-        return True
-    except Exception as e:
-        logger.error(f"Lỗi cập nhật schema database: {e}")
-        logger.error(traceback.format_exc())
-        return False
+# Điểm leaderboard: thắng và còn sống +3, thắng nhưng đã chết +1, thua -1
+# (utils.leaderboard_rebuild dùng cùng các hằng số này khi tính lại toàn bộ leaderboard)
+SCORE_WIN_ALIVE = 3
+SCORE_WIN_DEAD = 1
+SCORE_LOSS = -1
 
-async def direct_update_leaderboard(guild_id, user_id, player_name, points=1, wins=0, role="Unknown"):
-    """
-    Cập nhật trực tiếp leaderboard cho một người chơi duy nhất - phương pháp đơn giản nhất
-    
-    Args:
-        guild_id (int): ID của guild (server)
-        user_id (int): ID của người chơi
-        player_name (str): Tên hiển thị của người chơi
-        points (int): Điểm thưởng
-        wins (int): Số trận thắng (0 hoặc 1)
-        role (str): Vai trò của người chơi
-    """
-    try:
-        # Đảm bảo các giá trị là số nguyên
-        guild_id = int(guild_id)
-        user_id = int(user_id)
-        
-        # Kiểm tra player_name
-        if not player_name or player_name == "":
-            player_name = "Unknown Player"
-        
-        # Ghi log thông tin điểm số
-        logger.info(f"Direct update leaderboard: Player={player_name}, UserID={user_id}, Points={points:+d}, Wins={wins}, Role={role}")
-        
-        # Kiểm tra xem người chơi đã tồn tại chưa
-        check_query = "SELECT id, role_counts, role_wins FROM leaderboard WHERE guild_id = %s AND player_id = %s"
-        result, _ = await execute_async_query(check_query, (guild_id, user_id), fetch=True)
-        
-        if result:
-            # Người chơi đã tồn tại, cập nhật
-            try:
-                role_counts = json.loads(result[0].get('role_counts', '{}')) if result[0].get('role_counts') else {}
-                role_wins = json.loads(result[0].get('role_wins', '{}')) if result[0].get('role_wins') else {}
-            except:
-                role_counts = {}
-                role_wins = {}
-            
-            # Cập nhật số lần chơi và thắng theo vai trò
-            role_counts[role] = role_counts.get(role, 0) + 1
-            if wins > 0:
-                role_wins[role] = role_wins.get(role, 0) + 1
-            
-            # Cập nhật bảng
-            update_query = """
-                UPDATE leaderboard SET
-                score = score + %s,
-                games_played = games_played + 1,
-                wins = wins + %s,
-                player_name = %s,
-                role_counts = %s,
-                role_wins = %s
-                WHERE guild_id = %s AND player_id = %s
-            """
-            
-            params = (points, wins, player_name, json.dumps(role_counts), json.dumps(role_wins), guild_id, user_id)
-            _, affected_rows = await execute_async_query(update_query, params)
-            
-            if affected_rows > 0:
-                logger.info(f"Cập nhật thành công: {player_name} ({user_id}): {points:+d} điểm, {wins:+d} thắng")
-            else:
-                logger.warning(f"Không có dòng nào được cập nhật: {player_name} ({user_id})")
-            
-        else:
-            # Thêm người chơi mới
-            role_counts = {role: 1}
-            role_wins = {role: 1} if wins > 0 else {role: 0}
-            
-            insert_query = """
-                INSERT INTO leaderboard (guild_id, player_id, player_name, score, games_played, wins, role_counts, role_wins)
-                VALUES (%s, %s, %s, %s, 1, %s, %s, %s)
-            """
-            
-            params = (guild_id, user_id, player_name, points, wins, json.dumps(role_counts), json.dumps(role_wins))
-            _, affected_rows = await execute_async_query(insert_query, params)
-            
-            if affected_rows > 0:
-                logger.info(f"Thêm mới thành công: {player_name} ({user_id}): {points:+d} điểm, {wins:+d} thắng")
-            else:
-                logger.warning(f"Không thể thêm mới: {player_name} ({user_id})")
-            
-        return True
-    except Exception as e:
-        logger.error(f"Lỗi cập nhật leaderboard cho {player_name} ({user_id}): {str(e)}")
-        logger.error(traceback.format_exc())
-        return False
+def score_change(is_winner, is_alive):
+    if is_winner:
+        return SCORE_WIN_ALIVE if is_alive else SCORE_WIN_DEAD
+    return SCORE_LOSS
+
+# Nhà Ảo Giác thuộc Phe Sói (WEREWOLF_ROLES), nhưng cũng được tính là thắng khi Dân thắng
+def player_won(role, winner):
+    if winner == "werewolves":
+        return role in WEREWOLF_ROLES
+    if winner == "villagers":
+        return role not in WEREWOLF_ROLES or role == "Illusionist"
+    return False
+
+def player_team(role):
+    return "werewolves" if role in WEREWOLF_ROLES else "villagers"
+
+PARTICIPANTS_INSERT = """
+    INSERT IGNORE INTO game_participants (game_id, guild_id, player_id, role, team, won, survived)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Cộng điểm và thống kê vai trò cho một người chơi; role_counts/role_wins được cập nhật bằng JSON_SET
+# ngay trong câu lệnh nên không cần đọc dòng leaderboard trước khi ghi
+LEADERBOARD_UPSERT = """
+    INSERT INTO leaderboard (guild_id, player_id, player_name, score, games_played, wins, role_counts, role_wins)
+    VALUES (%s, %s, %s, %s, 1, %s, JSON_OBJECT(%s, 1), JSON_OBJECT(%s, %s))
+    ON DUPLICATE KEY UPDATE
+    player_name = VALUES(player_name),
+    score = score + VALUES(score),
+    games_played = games_played + 1,
+    wins = wins + VALUES(wins),
+    role_counts = JSON_SET(COALESCE(NULLIF(role_counts, ''), '{}'), %s,
+                           COALESCE(JSON_EXTRACT(COALESCE(NULLIF(role_counts, ''), '{}'), %s), 0) + 1),
+    role_wins = JSON_SET(COALESCE(NULLIF(role_wins, ''), '{}'), %s,
+                         COALESCE(JSON_EXTRACT(COALESCE(NULLIF(role_wins, ''), '{}'), %s), 0) + %s)
+"""
+
+def _new_game_log(cursor, guild_id):
+    """Tạo dòng game_logs cho game mới, trả về game_id"""
+    cursor.execute(
+        "INSERT INTO game_logs (guild_id, log_message) VALUES (%s, %s)",
+        (guild_id, "Game đang diễn ra")
+    )
+    return cursor.lastrowid
 
-async def update_leaderboard(guild_id, player_updates):
+def _create_game_log(guild_id):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            game_id = _new_game_log(cursor, guild_id)
+            conn.commit()
+            return game_id
+        finally:
+            cursor.close()
+
+async def create_game_log(guild_id):
     """
-    Cập nhật leaderboard cho nhiều người chơi
+    Cấp game_id cho game vừa bắt đầu (id của dòng game_logs của game đó)
     
     Args:
-        guild_id (int): ID của guild (server)
-        player_updates (dict): Dictionary chứa thông tin cập nhật điểm cho từng người chơi
-            {player_id: {"name": "Player Name", "score": 3}}
+        guild_id (int): ID của guild
+    
+    Returns:
+        int: game_id, None nếu lỗi (game_id sẽ được cấp khi ghi kết quả)
     """
     try:
-        # Kiểm tra kết nối
-        if not test_database_connection():
-            logger.error("Không thể cập nhật leaderboard: Kiểm tra kết nối cơ sở dữ liệu thất bại")
-            reconnect_pool()
-            if not test_database_connection():
-                return False
-            
-        # Chuyển đổi guild_id sang số nguyên để đảm bảo đúng kiểu
-        guild_id = int(guild_id)
-        
-        if not player_updates:
-            logger.warning("update_leaderboard: Không có dữ liệu cập nhật")
-            return False
-            
-        # Log chi tiết thông tin cập nhật
-        logger.info(f"update_leaderboard: Đang cập nhật cho {len(player_updates)} người chơi trong guild {guild_id}")
-        for player_id, data in player_updates.items():
-            logger.info(f"  - Player {player_id}: name={data.get('name', 'Unknown')}, score={data.get('score', 0):+d}")
-            
-        # Thực hiện cập nhật từng người một để tránh lỗi batch
-        success_count = 0
-        for player_id, data in player_updates.items():
-            try:
-                # Đảm bảo player_id là số nguyên
-                player_id_int = int(player_id)
-                player_name = data.get("name", "Unknown Player")
-                score = data.get("score", 0)
-                
-                # Sử dụng truy vấn INSERT ... ON DUPLICATE KEY UPDATE
-                query = """
-                    INSERT INTO leaderboard (guild_id, player_id, player_name, score, games_played)
-                    VALUES (%s, %s, %s, %s, 1)
-                    ON DUPLICATE KEY UPDATE
-                    player_name = VALUES(player_name),
-                    score = score + VALUES(score),
-                    games_played = games_played + 1
-                """
-                
-                params = (guild_id, player_id_int, player_name, score)
-                _, affected = await execute_async_query(query, params)
-                
-                if affected > 0:
-                    success_count += 1
-                    logger.debug(f"Cập nhật thành công cho {player_name} ({player_id_int}): {score:+d} điểm")
-                else:
-                    logger.warning(f"Không có dòng nào được cập nhật cho {player_name} ({player_id_int})")
-                    
-            except Exception as e:
-                logger.error(f"Lỗi cập nhật cho người chơi {player_id}: {str(e)}")
-                
-        logger.info(f"Đã cập nhật leaderboard cho {success_count}/{len(player_updates)} người chơi trong guild {guild_id}")
-        return success_count > 0
+        loop = asyncio.get_running_loop()
+        game_id = await loop.run_in_executor(None, _create_game_log, int(guild_id))
+        logger.info(f"Đã cấp game_id {game_id} cho guild {guild_id}")
+        return game_id
     except Exception as e:
-        logger.error(f"Lỗi tổng thể trong update_leaderboard: {e}")
+        logger.error(f"Lỗi khi cấp game_id: {str(e)}")
         logger.error(traceback.format_exc())
-        return False
+        return None
 
-async def update_player_stats(guild_id, user_id, player_name, win=False, role="", is_alive=True):
+def _ingest_game_result(game_id, guild_id, players, log_params, game_events=None, first_seq=0, analytics_result=None):
     """
-    Cập nhật thống kê cho một người chơi
+    Ghi toàn bộ kết quả game trong một transaction, an toàn khi chạy lại với cùng game_id:
+    - leaderboard_ledger có khóa (game_id, player_id): chỉ người chơi chưa có trong ledger mới được cộng điểm
+    - game_logs chỉ được điền kết quả một lần (winner IS NULL), thống kê chỉ được cộng khi đó
+    - game_events có khóa (game_id, seq) và game_participants có khóa (game_id, player_id) nên dòng đã ghi bị bỏ qua
+    - player_ratings chỉ được cập nhật ở lần điền kết quả đầu tiên
     
-    Args:
-        guild_id (int): ID của guild (server)
-        user_id (int): ID của người chơi
-        player_name (str): Tên hiển thị của người chơi
-        win (bool): True nếu người chơi thắng
-        role (str): Vai trò của người chơi trong game
-        is_alive (bool): True nếu người chơi còn sống khi game kết thúc
+    Returns:
+        tuple: (game_id, số người chơi được cộng điểm, True nếu đây là lần ghi kết quả đầu tiên)
     """
-    try:
-        # Kiểm tra kết nối database
-        if not test_database_connection():
-            logger.error(f"Không thể cập nhật thống kê cho {player_name}: Kết nối database không khả dụng")
-            reconnect_pool()
-            if not test_database_connection():
-                return False
-        
-        # Chuyển đổi ID sang số nguyên để đảm bảo đúng kiểu
-        guild_id = int(guild_id)
-        user_id = int(user_id)
-        
-        # Sanitize player_name
-        if not player_name or player_name == "":
-            player_name = "Unknown Player"
-            
-        # Sanitize role
-        if not role or role == "":
-            role = "Unknown"
-            
-        # Điểm cộng thêm dựa trên kết quả và trạng thái
-        # Win và còn sống: +3 điểm
-        # Win nhưng đã chết: +1 điểm
-        # Thua: -1 điểm
-        if win:
-            score_change = 3 if is_alive else 1
-        else:
-            score_change = -1
-        
-        logger.info(f"update_player_stats: Guild={guild_id}, Player={player_name} ({user_id}), Role={role}, Win={win}, Alive={is_alive}, Points={score_change:+d}")
-        
-        # Kiểm tra người chơi đã tồn tại chưa
-        query_check = """
-            SELECT role_counts, role_wins FROM leaderboard
-            WHERE guild_id = %s AND player_id = %s
-        """
-        results, _ = await execute_async_query(query_check, (guild_id, user_id), fetch=True)
-        
-        if results:
-            # Người chơi đã tồn tại, cập nhật dữ liệu
-            try:
-                role_counts = json.loads(results[0]['role_counts']) if results[0]['role_counts'] else {}
-                role_wins = json.loads(results[0]['role_wins']) if results[0]['role_wins'] else {}
-            except (json.JSONDecodeError, TypeError) as e:
-                logger.warning(f"Lỗi phân tích JSON cho người chơi {user_id}: {e}")
-                role_counts = {}
-                role_wins = {}
-                
-            # Cập nhật số lần chơi và thắng theo vai trò
-            role_counts[role] = role_counts.get(role, 0) + 1
-            if win:
-                role_wins[role] = role_wins.get(role, 0) + 1
-                
-            # Cập nhật record
-            query_update = """
-                UPDATE leaderboard SET
-                score = score + %s,
-                games_played = games_played + 1,
-                wins = wins + %s,
-                player_name = %s,
-                role_counts = %s,
-                role_wins = %s
-                WHERE guild_id = %s AND player_id = %s
-            """
-            
-            params = (
-                score_change, 
-                1 if win else 0, 
-                player_name, 
-                json.dumps(role_counts), 
-                json.dumps(role_wins), 
-                guild_id, 
-                user_id
-            )
-            
-            _, affected_rows = await execute_async_query(query_update, params)
-            
-            if affected_rows == 0:
-                logger.warning(f"Cập nhật cho người chơi {player_name} ({user_id}) không có tác dụng")
-                return False
-            else:
-                logger.info(f"Đã cập nhật thống kê cho người chơi {player_name} ({user_id}): {score_change:+d} điểm, thắng={win}")
-                return True
-                
-        else:
-            # Người chơi chưa tồn tại, thêm mới
-            role_counts = {role: 1}
-            role_wins = {role: 1} if win else {role: 0}
-            
-            query_insert = """
-                INSERT INTO leaderboard (guild_id, player_id, player_name, score, games_played, wins, role_counts, role_wins)
-                VALUES (%s, %s, %s, %s, 1, %s, %s, %s)
-            """
-            
-            params = (
-                guild_id, 
-                user_id, 
-                player_name, 
-                score_change, 
-                1 if win else 0, 
-                json.dumps(role_counts), 
-                json.dumps(role_wins)
-            )
-            
-            _, affected_rows = await execute_async_query(query_insert, params)
-            
-            if affected_rows == 0:
-                logger.warning(f"Thêm mới người chơi {player_name} ({user_id}) không có tác dụng")
-                return False
-            else:
-                logger.info(f"Đã thêm người chơi mới {player_name} ({user_id}) với {score_change:+d} điểm, thắng={win}")
-                return True
-            
-    except Exception as e:
-        logger.error(f"Lỗi khi cập nhật thống kê người chơi {player_name} ({user_id}): {str(e)}")
-        logger.error(traceback.format_exc())
-        return False
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if game_id is None:
+                game_id = _new_game_log(cursor, guild_id)
+            
+            applied = 0
+            for player in players:
+                cursor.execute("""
+                    INSERT IGNORE INTO leaderboard_ledger (game_id, player_id, guild_id, role, points, won)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (game_id, player["user_id"], guild_id, player["role"], player["points"], player["win"]))
+                if cursor.rowcount != 1:
+                    continue
+                role_path = '$."' + player["role"].replace('"', '') + '"'
+                cursor.execute(LEADERBOARD_UPSERT, (
+                    guild_id, player["user_id"], player["player_name"], player["points"], player["win"],
+                    player["role"], player["role"], player["win"],
+                    role_path, role_path, role_path, role_path, player["win"]
+                ))
+                applied += 1
+            
+            cursor.execute("""
+                UPDATE game_logs SET log_message = %s, winner = %s, players_count = %s,
+                    werewolves_count = %s, villagers_count = %s, duration = %s, players_data = %s
+                WHERE id = %s AND winner IS NULL
+            """, (*log_params, game_id))
+            finalized = cursor.rowcount == 1
+            
+            # Chỉ mục người chơi -> game cho /history, một lệnh executemany cho cả game
+            cursor.executemany(PARTICIPANTS_INSERT, [
+                (game_id, guild_id, player["user_id"], player["role"], player_team(player["role"]),
+                 player["win"], player["survived"])
+                for player in players
+            ])
+            
+            if game_events:
+                cursor.executemany("""
+                    INSERT IGNORE INTO game_events (game_id, seq, kind, offset_ms, night, actor_id, target_id, data)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """, [
+                    (game_id, first_seq + index, int(event.kind), event.offset_ms, event.night,
+                     event.actor or None, event.target or None, event.data[:255] or None)
+                    for index, event in enumerate(game_events)
+                ])
+            
+            if finalized:
+                # Rating kỹ năng chỉ cập nhật ở lần ghi kết quả đầu tiên, cùng transaction với điểm
+                from utils.rating import apply_game_ratings
+                apply_game_ratings(cursor, game_id, guild_id, players)
+                if analytics_result is not None:
+                    from utils.analytics import store_game_result
+                    store_game_result(cursor, analytics_result)
+            
+            conn.commit()
+            return game_id, applied, finalized
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+def _player_name(game_state, user_id):
+    """Tên hiển thị của người chơi từ member_cache (khóa có thể là int hoặc str)"""
+    member_cache = game_state.get("member_cache") or {}
+    member = member_cache.get(user_id) or member_cache.get(str(user_id))
+    return getattr(member, "display_name", None) or "Unknown Player"
 
+@traced("db.update_all_player_stats")
 async def update_all_player_stats(game_state, winner="no_one"):
     """
-    Cập nhật thống kê cho tất cả người chơi sau khi game kết thúc
+    Ghi kết quả game sau khi game kết thúc: leaderboard, game_logs, game_events và thống kê.
+    Đây là đường ghi duy nhất, mọi đường kết thúc game đều gọi trực tiếp; gọi lại nhiều lần cho cùng
+    một game (thử lại sau lỗi, kết thúc hai lần) không cộng điểm trùng vì được chặn bởi khóa (game_id, player_id).
     
     Args:
         game_state (dict): Trạng thái game hiện tại
         winner (str): Phe thắng cuộc ("werewolves", "villagers", "no_one")
     
     Returns:
-        bool: True nếu cập nhật thành công, False nếu không
+        tuple: (True nếu ghi thành công, True nếu đây là lần đầu kết quả game được ghi)
     """
     try:
-        # Ghi log chi tiết về tham số đầu vào
-        logger.info(f"update_all_player_stats called with winner={winner}")
-        logger.info(f"Game state keys: {list(game_state.keys())}")
+        logger.info("update_all_player_stats called with winner=%s", winner)
         
-        # Kiểm tra cờ leaderboard_updated để tránh cập nhật trùng lặp
-        if game_state.get("leaderboard_updated", False):
-            logger.warning("Leaderboard đã được cập nhật trước đó, bỏ qua cập nhật trùng lặp")
-            return True
-            
-        # Kiểm tra kết nối
-        if not test_database_connection():
-            logger.error("Không thể cập nhật player stats: Kết nối cơ sở dữ liệu không khả dụng")
-            reconnect_pool()
-            if not test_database_connection():
-                return False
-            
-        # Kiểm tra dữ liệu đầu vào
         guild_id = game_state.get("guild_id")
         if not guild_id:
             logger.error("Cannot update leaderboard: guild_id not found in game_state")
-            return False
-        
-        # Đảm bảo guild_id là số nguyên
+            return False, False
         guild_id = int(guild_id)
         
-        # Kiểm tra dữ liệu players
         if not game_state.get("players"):
             logger.error("Game state không chứa thông tin người chơi")
-            return False
-            
-        # Hiển thị chi tiết thông tin game_state để debug
-        logger.info(f"update_all_player_stats: winner={winner}, guild_id={guild_id}, player_count={len(game_state.get('players', {}))}")
+            return False, False
         
-        # Phương pháp đơn giản hóa: lập danh sách người chơi và điểm để cập nhật trực tiếp
-        direct_updates = []
-        
-        # Chuẩn bị dữ liệu cập nhật cho mỗi người chơi 
+        players = []
+        players_data = {}
+        werewolf_count = 0
         for user_id_raw, data in game_state["players"].items():
-            # Đảm bảo user_id luôn là int
             user_id = int(user_id_raw)
-            role = data.get("role", "Unknown")
-            player_name = "Unknown Player"
-            
-            # Tìm tên người chơi từ member_cache
-            if game_state.get("member_cache"):
-                if user_id in game_state["member_cache"]:
-                    member = game_state["member_cache"][user_id]
-                    player_name = getattr(member, "display_name", "Unknown Player")
-                elif str(user_id) in game_state["member_cache"]:
-                    member = game_state["member_cache"][str(user_id)]
-                    player_name = getattr(member, "display_name", "Unknown Player")
-                    
-            # Xác định người chơi thuộc phe nào và có thắng hay không  
-            is_winner = False
+            role = data.get("role", "Unknown") or "Unknown"
+            player_name = _player_name(game_state, user_id)
             
-            if winner == "werewolves":
-                # Nếu Illusionist thuộc phía sói hay dân là tùy thuộc vào cách code của bạn
-                if role in ["Werewolf", "Wolfman", "Demon Werewolf", "Assassin Werewolf", "Illusionist"]:
-                    is_winner = True
-            elif winner == "villagers":
-                if role not in ["Werewolf", "Wolfman", "Demon Werewolf", "Assassin Werewolf"]:
-                    is_winner = True
-                    
-            # Xác định trạng thái còn sống hay đã chết
+            is_winner = player_won(role, winner)
             is_alive = data.get("status") in ["alive", "wounded"]
+            if player_team(role) == "werewolves":
+                werewolf_count += 1
             
-            # SỬA ĐỔI: Áp dụng logic tính điểm mới
-            # Win và còn sống: +3 điểm
-            # Win và đã chết: +1 điểm
-            # Thua: -1 điểm
-            if is_winner:
-                points = 3 if is_alive else 1
-            else:
-                points = -1
-                
-            # Ghi log và thêm vào danh sách cập nhật
-            logger.debug(f"Người chơi: {player_name} ({user_id}), vai trò: {role}, thắng: {is_winner}, còn sống: {is_alive}, điểm: {points:+d}")
-            
-            # Thêm vào danh sách cập nhật trực tiếp
-            direct_updates.append({
+            points = score_change(is_winner, is_alive)
+            logger.debug("Người chơi: %s (%s), vai trò: %s, thắng: %s, còn sống: %s, điểm: %+d", player_name, user_id, role, is_winner, is_alive, points)
+            players.append({
                 "user_id": user_id,
-                "player_name": player_name, 
+                "player_name": player_name,
                 "points": points,
                 "win": 1 if is_winner else 0,
                 "role": role,
-                "is_alive": is_alive
+                "survived": 1 if is_alive else 0
             })
-                
-        # Thực hiện cập nhật database - dùng phương pháp trực tiếp
-        if direct_updates:
-            # Dùng mô hình worker pool để làm việc với nhiều người chơi cùng lúc
-            update_tasks = []
-            for player_data in direct_updates:
-                update_tasks.append(direct_update_leaderboard(
-                    guild_id,
-                    player_data["user_id"],
-                    player_data["player_name"],
-                    player_data["points"],
-                    player_data["win"],
-                    player_data["role"]
-                ))
-            
-            if update_tasks:
-                results = await asyncio.gather(*update_tasks, return_exceptions=True)
-                success_count = sum(1 for r in results if r is True)
-                error_count = sum(1 for r in results if isinstance(r, Exception))
-                
-                logger.info(f"Kết quả cập nhật leaderboard: {success_count} thành công, {error_count} lỗi")
+            players_data[str(user_id)] = {"name": player_name, "role": role, "status": data.get("status", "unknown")}
         
-        # Lưu log kết quả game
-        try:
-            # Tính số lượng sói và dân
-            werewolf_count = sum(1 for _, d in game_state["players"].items() 
-                              if d.get("role") in ["Werewolf", "Wolfman", "Demon Werewolf", "Assassin Werewolf", "Illusionist"])
-            villager_count = len(game_state["players"]) - werewolf_count
-            
-            # Chuẩn bị dữ liệu người chơi để lưu vào logs
-            players_data = {}
-            for user_id_raw, data in game_state["players"].items():
-                user_id = int(user_id_raw)
-                user_id_str = str(user_id)
-                player_name = "Unknown Player"
-                
-                # Tìm tên người chơi
-                if user_id_str in game_state.get("member_cache", {}):
-                    member = game_state["member_cache"][user_id_str]
-                    player_name = getattr(member, "display_name", "Unknown Player")
-                elif user_id in game_state.get("member_cache", {}):
-                    member = game_state["member_cache"][user_id]
-                    player_name = getattr(member, "display_name", "Unknown Player")
-                    
-                players_data[user_id_str] = {
-                    "name": player_name,
-                    "role": data.get("role", "Unknown"),
-                    "status": data.get("status", "unknown")
-                }
-                
-            # Tạo nội dung log
-            log_message = f"Game kết thúc. Kết quả: {winner.capitalize()} thắng!"
-            
-            # Lưu log game
-            await save_game_log(
-                guild_id, 
-                log_message, 
-                winner, 
-                len(game_state["players"]), 
-                werewolf_count, 
-                villager_count, 
-                game_state.get("night_count", 0), 
-                json.dumps(players_data)
-            )
-                
-        except Exception as e:
-            logger.error(f"Lỗi khi lưu log game: {str(e)}")
-            logger.error(traceback.format_exc())
-            
-        # Đánh dấu rằng leaderboard đã được cập nhật
-        game_state["leaderboard_updated"] = True
-        logger.info(f"Đã đánh dấu leaderboard_updated=True để tránh cập nhật trùng lặp")
-            
-        return True
+        log_params = (
+            f"Game kết thúc. Kết quả: {winner.capitalize()} thắng!",
+            winner,
+            len(players),
+            werewolf_count,
+            len(players) - werewolf_count,
+            game_state.get("night_count", 0),
+            json.dumps(players_data)
+        )
+        
+        # Các sự kiện chưa ghi của game (từ journal) và kết quả chuẩn hóa cho bảng thống kê
+        journal = game_state.get("journal")
+        first_seq, game_events = journal.unsaved_events() if journal else (0, [])
+        from utils.analytics import build_game_result
+        analytics_result = build_game_result(game_state, winner)
+        
+        loop = asyncio.get_running_loop()
+        game_id, applied, finalized = await loop.run_in_executor(
+            None, _ingest_game_result,
+            game_state.get("game_id"), guild_id, players, log_params, game_events, first_seq, analytics_result
+        )
+        game_state["game_id"] = game_id
+        if journal:
+            journal.mark_saved(len(game_events))
+        if applied:
+            invalidate_leaderboard_cache(guild_id)
+        
+        logger.info("Đã ghi kết quả game %s: %d/%d người chơi được cộng điểm, lần ghi đầu: %s", game_id, applied, len(players), finalized)
+        return True, finalized
     
     except Exception as e:
         logger.error(f"Lỗi tổng thể khi cập nhật thống kê người chơi: {str(e)}")
         logger.error(traceback.format_exc())
-        return False
+        return False, False
+
+# Cache đọc leaderboard: {(guild_id, season_id, limit): (hết hạn lúc, kết quả)}.
+# Mùa đã lưu trữ không đổi nữa nên được giữ đến khi bị đẩy ra; mùa hiện tại hết hạn sau LEADERBOARD_CACHE_TTL giây
+# hoặc khi có kết quả game mới của guild.
+LEADERBOARD_CACHE_TTL = 30
+LEADERBOARD_CACHE_SIZE = 256
+_leaderboard_cache = OrderedDict()
+_season_tables = {}  # season_id -> tên bảng của mùa đã lưu trữ
+
+# Khóa MySQL để hai lệnh chuyển mùa không chạy chồng lên nhau
+SEASON_LOCK = "masoi_season_rollover"
+ARCHIVE_TABLE_PREFIX = "leaderboard_season_"
+
+def invalidate_leaderboard_cache(guild_id=None):
+    """Xóa cache mùa hiện tại (của một guild hoặc tất cả)"""
+    for key in [k for k in _leaderboard_cache if k[1] is None and (guild_id is None or k[0] in (guild_id, None))]:
+        _leaderboard_cache.pop(key, None)
+
+def _leaderboard_table(season_id):
+    """Tên bảng của một mùa: mùa hiện tại (None) là leaderboard, mùa cũ là bảng lưu trữ"""
+    if season_id is None:
+        return "leaderboard"
+    table = _season_tables.get(season_id)
+    if table is None:
+        rows, _ = execute_query(
+            "SELECT table_name FROM leaderboard_seasons WHERE season_id = %s AND ended_at IS NOT NULL",
+            (int(season_id),), fetch=True
+        )
+        if not rows:
+            return None
+        table = rows[0]["table_name"]
+        # Tên bảng được ghép vào câu truy vấn nên chỉ chấp nhận đúng định dạng do rollover tạo ra
+        if not (table.startswith(ARCHIVE_TABLE_PREFIX) and table[len(ARCHIVE_TABLE_PREFIX):].isdigit()):
+            raise ValueError(f"Tên bảng mùa không hợp lệ: {table}")
+        _season_tables[season_id] = table
+    return table
+
+def _read_leaderboard(guild_id, limit, season_id):
+    table = _leaderboard_table(season_id)
+    if table is None:
+        return []
+    if guild_id is None:
+        query = f"""
+            SELECT player_name, score, games_played, wins, role_counts, role_wins 
+            FROM {table}
+            ORDER BY score DESC
+            LIMIT %s
+        """
+        params = (limit,)
+    else:
+        query = f"""
+            SELECT player_name, score, games_played, wins, role_counts, role_wins 
+            FROM {table}
+            WHERE guild_id = %s
+            ORDER BY score DESC
+            LIMIT %s
+        """
+        params = (int(guild_id), limit)
+    results, _ = execute_query(query, params, fetch=True)
+    return results or []
 
-async def get_leaderboard(guild_id, limit=10):
+async def get_leaderboard(guild_id, limit=10, season=None):
     """
-    Lấy bảng xếp hạng cho một guild
+    Lấy bảng xếp hạng cho một guild (có cache)
     
     Args:
-        guild_id (int): ID của guild
+        guild_id (int): ID của guild (None để lấy toàn bộ server)
         limit (int): Số lượng người chơi tối đa
+        season (int, optional): Mùa đã lưu trữ cần xem, None là mùa hiện tại
     
     Returns:
         list: Danh sách người chơi và điểm
     """
     try:
-        guild_id = int(guild_id)
-        query = """
-            SELECT player_name, score, games_played, wins, role_counts, role_wins 
-            FROM leaderboard
-            WHERE guild_id = %s
-            ORDER BY score DESC
-            LIMIT %s
-        """
+        guild_id = int(guild_id) if guild_id is not None else None
+        key = (guild_id, season, limit)
+        cached = _leaderboard_cache.get(key)
+        if cached and (cached[0] is None or cached[0] > time.monotonic()):
+            _leaderboard_cache.move_to_end(key)
+            return cached[1]
         
-        results, _ = await execute_async_query(query, (guild_id, limit), fetch=True)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, _read_leaderboard, guild_id, limit, season)
+        expires_at = time.monotonic() + LEADERBOARD_CACHE_TTL if season is None else None
+        _leaderboard_cache[key] = (expires_at, results)
+        if len(_leaderboard_cache) > LEADERBOARD_CACHE_SIZE:
+            _leaderboard_cache.popitem(last=False)
         return results
     except Exception as e:
         logger.error(f"Lỗi lấy dữ liệu leaderboard: {e}")
         logger.error(traceback.format_exc())
         return []
 
-async def save_game_log(guild_id, log_message, winner=None, players_count=0, werewolves_count=0, villagers_count=0, duration=0, players_data=None):
+async def get_seasons():
+    """Danh sách các mùa (mới nhất trước)"""
+    try:
+        results, _ = await execute_async_query(
+            "SELECT season_id, started_at, ended_at FROM leaderboard_seasons ORDER BY season_id DESC",
+            fetch=True
+        )
+        return results
+    except Exception as e:
+        logger.error(f"Lỗi lấy danh sách mùa: {e}")
+        return []
+
+def _rollover_season():
     """
-    Lưu log game vào cơ sở dữ liệu
+    Kết thúc mùa hiện tại: tạo bảng leaderboard trống rồi đổi tên đồng thời
+    leaderboard -> bảng lưu trữ và bảng trống -> leaderboard trong một lệnh RENAME TABLE (nguyên tử).
+    Thời gian không phụ thuộc số dòng của leaderboard.
+    
+    RENAME TABLE tự commit nên không nguyên tử cùng các dòng leaderboard_seasons; nếu lần trước dừng sau
+    RENAME (bảng lưu trữ của mùa hiện tại đã tồn tại) thì chỉ hoàn tất phần cập nhật leaderboard_seasons.
+    
+    Returns:
+        int: id của mùa mới
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (SEASON_LOCK, 10))
+            if cursor.fetchone()[0] != 1:
+                raise RuntimeError("Đang có một lần chuyển mùa khác")
+            try:
+                cursor.execute("SELECT season_id FROM leaderboard_seasons WHERE ended_at IS NULL ORDER BY season_id DESC LIMIT 1")
+                row = cursor.fetchone()
+                current = row[0] if row else 1
+                archive_table = f"{ARCHIVE_TABLE_PREFIX}{current}"
+                
+                # Mùa mới bắt đầu từ game_id kế tiếp (game đang diễn ra lúc chuyển mùa vẫn được cộng vào mùa mới
+                # khi kết thúc nhưng không được tính khi dựng lại leaderboard của mùa mới)
+                cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM game_logs")
+                first_game_id = cursor.fetchone()[0]
+                
+                cursor.execute("SHOW TABLES LIKE %s", (archive_table,))
+                if cursor.fetchone():
+                    logger.warning(f"Bảng {archive_table} đã tồn tại: hoàn tất lần chuyển mùa {current} bị dừng giữa chừng")
+                else:
+                    cursor.execute("DROP TABLE IF EXISTS leaderboard_next")
+                    cursor.execute("CREATE TABLE leaderboard_next LIKE leaderboard")
+                    cursor.execute(f"RENAME TABLE leaderboard TO {archive_table}, leaderboard_next TO leaderboard")
+                
+                cursor.execute(
+                    "INSERT INTO leaderboard_seasons (season_id, table_name, started_at, ended_at) VALUES (%s, %s, NOW(), NOW()) "
+                    "ON DUPLICATE KEY UPDATE table_name = VALUES(table_name), ended_at = NOW()",
+                    (current, archive_table)
+                )
+                cursor.execute(
+                    "INSERT IGNORE INTO leaderboard_seasons (season_id, table_name, first_game_id) VALUES (%s, 'leaderboard', %s)",
+                    (current + 1, first_game_id)
+                )
+                conn.commit()
+                return current + 1
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (SEASON_LOCK,))
+                cursor.fetchone()
+        finally:
+            cursor.close()
+
+async def rollover_season():
+    """Chuyển sang mùa mới (bảng xếp hạng cũ được lưu trữ nguyên vẹn), trả về id mùa mới"""
+    loop = asyncio.get_running_loop()
+    season_id = await loop.run_in_executor(None, _rollover_season)
+    invalidate_leaderboard_cache()
+    logger.info(f"Đã chuyển sang mùa {season_id}")
+    return season_id
+
+async def get_player_history(guild_id, player_id, limit=20):
+    """
+    Các game gần nhất của một người chơi (đọc từ chỉ mục game_participants)
     
     Args:
         guild_id (int): ID của guild
-        log_message (str): Nội dung log
-        winner (str, optional): Phe thắng cuộc
-        players_count (int, optional): Số lượng người chơi
-        werewolves_count (int, optional): Số lượng sói
-        villagers_count (int, optional): Số lượng dân
-        duration (int, optional): Số đêm đã qua
-        players_data (str, optional): Dữ liệu JSON về người chơi
+        player_id (int): ID của người chơi
+        limit (int): Số game tối đa
+    
+    Returns:
+        list: Các game (game_id, role, team, won, survived, timestamp, winner, players_count), mới nhất trước
     """
     try:
-        guild_id = int(guild_id)
         query = """
-            INSERT INTO game_logs (
-                guild_id, log_message, winner, players_count, 
-                werewolves_count, villagers_count, duration, players_data
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            SELECT p.game_id, p.role, p.team, p.won, p.survived, g.timestamp, g.winner, g.players_count
+            FROM game_participants p
+            JOIN game_logs g ON g.id = p.game_id
+            WHERE p.guild_id = %s AND p.player_id = %s
+            ORDER BY p.game_id DESC
+            LIMIT %s
         """
-        
-        params = (guild_id, log_message, winner, players_count, werewolves_count, villagers_count, duration, players_data)
-        _, affected_rows = await execute_async_query(query, params)
-        
-        if affected_rows > 0:
-            logger.info(f"Đã lưu log game cho guild {guild_id}: {winner} thắng")
-            return True
-        else:
-            logger.warning(f"Không thể lưu log game cho guild {guild_id}")
-            return False
+        results, _ = await execute_async_query(query, (int(guild_id), int(player_id), limit), fetch=True)
+        return results
     except Exception as e:
-        logger.error(f"Lỗi lưu game log: {e}")
+        logger.error(f"Lỗi khi lấy lịch sử người chơi {player_id}: {str(e)}")
         logger.error(traceback.format_exc())
-        return False
+        return []
+
+async def get_game_events(game_id):
+    """
+    Lấy các sự kiện của một game theo thứ tự
+    
+    Args:
+        game_id (int): id của dòng game_logs
+    
+    Returns:
+        list: Các sự kiện (seq, kind, offset_ms, night, actor_id, target_id, data)
+    """
+    try:
+        query = """
+            SELECT seq, kind, offset_ms, night, actor_id, target_id, data
+            FROM game_events WHERE game_id = %s ORDER BY seq
+        """
+        results, _ = await execute_async_query(query, (int(game_id),), fetch=True)
+        return results
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy sự kiện game {game_id}: {str(e)}")
+        logger.error(traceback.format_exc())
+        return []
 
 async def get_game_logs(guild_id, limit=10):
     """
@@ -938,7 +782,7 @@ async def get_game_logs(guild_id, limit=10):
         limit (int): Số lượng bản ghi tối đa muốn lấy
         
     Returns:
-        list: Danh sách các bản ghi game, hoặc list rỗng nếu không có
+        list: Danh sách các game đã kết thúc (bỏ qua dòng của game đang diễn ra hoặc bị bỏ dở), hoặc list rỗng nếu không có
     """
     try:
         guild_id = int(guild_id)
@@ -946,7 +790,7 @@ async def get_game_logs(guild_id, limit=10):
             SELECT id, guild_id, timestamp, log_message, winner, 
             players_count, werewolves_count, villagers_count, duration, players_data
             FROM game_logs 
-            WHERE guild_id = %s 
+            WHERE guild_id = %s AND winner IS NOT NULL
             ORDER BY timestamp DESC 
             LIMIT %s
         """
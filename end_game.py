@@ -9,6 +9,9 @@ from typing import Dict, List, Optional
 
 from constants import AUDIO_FILES, BOT_VERSION
 from utils.api_utils import play_audio
+from utils.rate_limiter import scheduler
+from utils.perf import perf, traced
+from utils.game_journal import EventKind, JournalEvent, close_journal, get_timeline
 from views.voting_views import GameEndView
 from db import update_all_player_stats  # Thêm import này
 
@@ -64,21 +67,15 @@ async def end_game(interaction, game_state, winner="no_one", reason="Game đã k
                     
             logger.info(f"Cập nhật leaderboard cho game kết thúc với winner: {normalized_winner}")
             
-            # Kiểm tra nếu leaderboard đã được cập nhật để tránh trùng lặp
-            if game_state.get("leaderboard_updated", False):
-                logger.info("Leaderboard đã được cập nhật trước đó, bỏ qua")
+            # Gọi lại cho game đã ghi kết quả không cộng điểm trùng (khóa (game_id, player_id) trong database)
+            update_success, first_write = await update_all_player_stats(game_state, normalized_winner)
+            if update_success:
+                logger.info("Cập nhật leaderboard thành công")
+                text_channel = game_state.get("text_channel") or interaction.channel
+                if first_write and text_channel:
+                    await text_channel.send("🏆 Leaderboard đã được cập nhật!")
             else:
-                update_success = await update_all_player_stats(game_state, normalized_winner)
-                if update_success:
-                    logger.info("Cập nhật leaderboard thành công")
-                    text_channel = game_state.get("text_channel") or interaction.channel
-                    if text_channel:
-                        await text_channel.send("🏆 Leaderboard đã được cập nhật!")
-                else:
-                    logger.error("Cập nhật leaderboard thất bại")
-                    
-                # Đánh dấu rằng leaderboard đã được cập nhật để tránh cập nhật lặp lại
-                game_state["leaderboard_updated"] = True
+                logger.error("Cập nhật leaderboard thất bại")
         except Exception as e:
             logger.error(f"Lỗi khi cập nhật leaderboard: {str(e)}")
             traceback.print_exc()
@@ -93,19 +90,16 @@ async def end_game(interaction, game_state, winner="no_one", reason="Game đã k
                 
             if voice_conn and voice_conn.is_connected():
                 await play_audio(AUDIO_FILES["end_game"], voice_conn)
-                await asyncio.sleep(2)  # Đợi âm thanh phát xong
         except Exception as e:
             logger.error(f"Lỗi khi phát âm thanh kết thúc: {str(e)}")
         
-        # QUAN TRỌNG: Di chuyển người chơi về kênh chính TRƯỚC
-        await restore_player_states(interaction, game_state)
-        
-        # Đợi một chút để đảm bảo việc di chuyển hoàn tất
-        await asyncio.sleep(2)
-        
-        # Thực hiện dọn dẹp và xóa kênh
+        # Di chuyển người chơi (và xóa kênh riêng đã trống) song song với việc gỡ vai trò,
+        # sau đó dọn các kênh còn lại
+        await asyncio.gather(
+            restore_player_states(interaction, game_state),
+            cleanup_roles(interaction, game_state)
+        )
         await cleanup_channels(interaction, game_state)
-        await cleanup_roles(interaction, game_state)
         
         # Gửi tóm tắt game
         guild_id = interaction.guild.id
@@ -150,36 +144,32 @@ async def handle_game_end(interaction: discord.Interaction, game_state):
         logger.warning("Text channel not set, cannot send game ending message")
     
     # THÊM: Cập nhật leaderboard trước khi reset game state
-    if not game_state.get("leaderboard_updated", False):
+    # Luôn gọi: nếu kết quả đã được ghi ở pha trước thì database bỏ qua, nếu lần trước lỗi thì đây là lần thử lại
+    try:
+        # Lấy thông tin phe thắng từ game_state
+        winner = "no_one"
         try:
-            # Lấy thông tin phe thắng từ game_state
-            winner = "no_one"
-            try:
-                winner = game_state.last_winner
-            except:
-                winner = game_state.get("last_winner", "no_one")
-                
-            logger.info(f"Cập nhật leaderboard từ handle_game_end với winner: {winner}")
+            winner = game_state.last_winner
+        except:
+            winner = game_state.get("last_winner", "no_one")
             
-            if winner != "no_one":
-                # Cập nhật leaderboard
-                update_success = await update_all_player_stats(game_state, winner)
-                if update_success:
-                    logger.info("Cập nhật leaderboard thành công từ handle_game_end")
-                    # Thông báo cập nhật leaderboard thành công
-                    text_channel = game_state.get("text_channel")
-                    if text_channel:
-                        await text_channel.send("🏆 Leaderboard đã được cập nhật!")
-                else:
-                    logger.error("Cập nhật leaderboard thất bại từ handle_game_end")
+        logger.info(f"Cập nhật leaderboard từ handle_game_end với winner: {winner}")
+        
+        if winner and winner != "no_one":
+            update_success, first_write = await update_all_player_stats(game_state, winner)
+            if update_success:
+                logger.info("Cập nhật leaderboard thành công từ handle_game_end")
+                # Chỉ thông báo khi kết quả vừa được ghi lần đầu
+                text_channel = game_state.get("text_channel")
+                if first_write and text_channel:
+                    await text_channel.send("🏆 Leaderboard đã được cập nhật!")
             else:
-                logger.warning("Không xác định được phe thắng cuộc để cập nhật leaderboard")
-                
-            # Đánh dấu rằng leaderboard đã được cập nhật
-            game_state["leaderboard_updated"] = True
-        except Exception as e:
-            logger.error(f"Lỗi khi cập nhật leaderboard từ handle_game_end: {str(e)}")
-            traceback.print_exc()
+                logger.error("Cập nhật leaderboard thất bại từ handle_game_end")
+        else:
+            logger.warning("Không xác định được phe thắng cuộc để cập nhật leaderboard")
+    except Exception as e:
+        logger.error(f"Lỗi khi cập nhật leaderboard từ handle_game_end: {str(e)}")
+        traceback.print_exc()
     
     # Lưu thông tin setup trước khi reset
     try:
@@ -207,9 +197,6 @@ async def handle_game_end(interaction: discord.Interaction, game_state):
     # Reset game state
     await reset_game_state(interaction, game_state)
     
-    # Thêm khoảng thời gian chờ để đảm bảo các tác vụ reset hoàn tất
-    await asyncio.sleep(3)
-    
     # Phát âm thanh end_game.mp3 trước khi bot rời kênh voice
     if game_state["voice_connection"] and game_state["voice_connection"].is_connected():
         await play_audio(AUDIO_FILES["end_game"], game_state["voice_connection"])
@@ -284,19 +271,14 @@ async def reset_game_state(interaction: discord.Interaction, game_state):
         else:
             logger.info("Summary already shown, skipping duplicate summary")
         
-        # QUAN TRỌNG: Thứ tự thực hiện reset - di chuyển người chơi TRƯỚC, sau đó mới dọn dẹp kênh và vai trò
-        await restore_player_states(interaction, game_state)  # Di chuyển người chơi và unmute TRƯỚC
-        
-        # Thêm độ trễ để đảm bảo việc di chuyển hoàn tất
-        await asyncio.sleep(1.5)
-        
-        # Sau đó mới thực hiện các tác vụ dọn dẹp
-        tasks = [
-            cleanup_channels(interaction, game_state),     # Dọn dẹp kênh wolf-chat và dead-chat
+        # Di chuyển người chơi và unmute (kênh riêng được xóa ngay khi trống) song song với việc gỡ vai trò
+        await asyncio.gather(
+            restore_player_states(interaction, game_state),
             cleanup_roles(interaction, game_state)         # Xóa vai trò game
-        ]
+        )
         
-        await asyncio.gather(*tasks)
+        # Dọn dẹp kênh wolf-chat, dead-chat và các kênh riêng còn sót
+        await cleanup_channels(interaction, game_state)
         
         # Reset game state
         reset_game_variables(game_state)
@@ -311,6 +293,83 @@ async def reset_game_state(interaction: discord.Interaction, game_state):
     finally:
         game_state["reset_in_progress"] = False
 
+# Mô tả hành động đêm trong diễn biến: loại hành động -> (biểu tượng, mẫu câu)
+NIGHT_ACTION_TEXT = {
+    "Werewolf": ("🐺", "Phe Sói chọn giết {target}"),
+    "Guard": ("🛡️", "{actor} bảo vệ {target}"),
+    "Seer": ("🔮", "{actor} soi {target}"),
+    "Hunter": ("🏹", "{actor} bắn {target}"),
+    "Explorer": ("🧭", "{actor} khám phá {target}"),
+    "Witch:save": ("🧪", "{actor} cứu {target}"),
+    "Witch:kill": ("☠️", "{actor} đầu độc {target}"),
+    "Demon Werewolf": ("👹", "{actor} nguyền {target}"),
+    "Assassin Werewolf": ("🗡️", "{actor} đoán {target} là {detail}"),
+    "Detective": ("🔍", "{actor} điều tra {target} và {detail}")
+}
+
+def format_timeline(game_state, events: List[JournalEvent]) -> List[str]:
+    """
+    Chuyển các sự kiện của game thành các dòng diễn biến dễ đọc
+    
+    Args:
+        game_state (dict): Trạng thái game (dùng member_cache để lấy tên)
+        events (list): Sự kiện theo thứ tự thời gian
+    
+    Returns:
+        List[str]: Các dòng diễn biến
+    """
+    member_cache = game_state.get("member_cache") or {}
+    
+    def name_of(user_id) -> str:
+        member = member_cache.get(user_id) if user_id else None
+        return member.display_name if member else f"#{user_id}"
+    
+    lines = []
+    for event in events:
+        if event.kind == EventKind.PHASE:
+            if event.data == "night":
+                lines.append(f"**🌙 Đêm {event.night}**")
+            elif event.data == "voting":
+                lines.append("**🗳️ Bỏ phiếu**")
+        elif event.kind == EventKind.NIGHT_ACTION:
+            action, _, detail = event.data.partition(":")
+            key = event.data if event.data in NIGHT_ACTION_TEXT else action
+            if key in NIGHT_ACTION_TEXT:
+                icon, template = NIGHT_ACTION_TEXT[key]
+                if key == "Detective":
+                    detail = name_of(int(detail)) if detail.isdigit() else detail
+                lines.append(f"{icon} " + template.format(actor=name_of(event.actor), target=name_of(event.target), detail=detail))
+        elif event.kind == EventKind.STATUS:
+            if event.data == "dead":
+                lines.append(f"💀 {name_of(event.actor)} đã chết")
+            elif event.data == "wounded":
+                lines.append(f"🩹 {name_of(event.actor)} bị thương")
+        elif event.kind == EventKind.VOTE_RESULT:
+            if event.target:
+                lines.append(f"⚖️ {name_of(event.target)} bị ngồi ghế điện với {event.data} phiếu")
+            else:
+                lines.append("⚖️ Không ai bị loại")
+        elif event.kind == EventKind.ROLE_CHANGED:
+            lines.append(f"👹 {name_of(event.actor)} bị nguyền và trở thành {event.data}")
+    return lines
+
+def chunk_lines(lines: List[str], max_length: int, max_chunks: int) -> List[str]:
+    """Chia các dòng thành các đoạn vừa giới hạn của field embed (giữ phần cuối nếu quá dài)"""
+    chunks, current = [], ""
+    for line in lines:
+        line = line[:max_length]
+        if current and len(current) + 1 + len(line) > max_length:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    if len(chunks) > max_chunks:
+        chunks = ["…"] + chunks[-(max_chunks - 1):] if max_chunks > 1 else chunks[-1:]
+    return chunks
+
+@traced("end_game.summary")
 async def send_game_summary(interaction, game_state, guild_id):
     """
     Gửi tóm tắt kết quả game
@@ -327,50 +386,19 @@ async def send_game_summary(interaction, game_state, guild_id):
         return
     
     try:
-        # Tạo summary từ logs và trạng thái game
-        from db import get_game_logs
-        
         embed = discord.Embed(title="Kết Quả Game", color=discord.Color.gold())
         
-        # Lấy logs và xử lý đúng định dạng
+        # Diễn biến lấy từ timeline trong bộ nhớ của chính game này (không truy vấn DB)
         try:
-            game_logs = await get_game_logs(guild_id)
-            
-            # Hiển thị logs nếu có
-            if game_logs and len(game_logs) > 0:
-                # Định dạng logs để hiển thị dễ đọc hơn
-                formatted_logs = []
-                for i, log in enumerate(game_logs[-10:]):  # Chỉ lấy 10 log gần nhất
-                    if isinstance(log, str):
-                        formatted_logs.append(log)
-                    elif isinstance(log, dict):
-                        # Xử lý log dạng dict
-                        if "message" in log:
-                            formatted_logs.append(log["message"])
-                        elif "timestamp" in log:
-                            time_str = log.get("timestamp", "")
-                            action = log.get("action", "")
-                            desc = log.get("description", "")
-                            if action and desc:
-                                formatted_logs.append(f"{action}: {desc}")
-                            elif action:
-                                formatted_logs.append(action)
-                            else:
-                                formatted_logs.append(time_str)
-                
-                if formatted_logs:
-                    embed.add_field(
-                        name="Diễn biến", 
-                        value="\n".join(formatted_logs), 
-                        inline=False
-                    )
-                else:
-                    embed.add_field(name="Diễn biến", value="Không có dữ liệu chi tiết", inline=False)
+            timeline_lines = format_timeline(game_state, get_timeline(game_state))
+            if timeline_lines:
+                for index, chunk in enumerate(chunk_lines(timeline_lines, 1024, max_chunks=3)):
+                    embed.add_field(name="Diễn biến" if index == 0 else "Diễn biến (tiếp)", value=chunk, inline=False)
             else:
-                embed.add_field(name="Diễn biến", value="Không có dữ liệu game logs", inline=False)
+                embed.add_field(name="Diễn biến", value="Không có dữ liệu diễn biến", inline=False)
         except Exception as log_error:
-            logger.error(f"Error processing game logs: {str(log_error)}")
-            embed.add_field(name="Diễn biến", value="Không thể tải logs game", inline=False)
+            logger.error(f"Error processing game timeline: {str(log_error)}")
+            embed.add_field(name="Diễn biến", value="Không thể dựng diễn biến game", inline=False)
         
         # Hiển thị vai trò và trạng thái người chơi
         try:
@@ -449,15 +477,22 @@ async def send_game_summary(interaction, game_state, guild_id):
         except:
             logger.error("Cannot send error message to text channel")
 
+@traced("end_game.restore_players")
 async def restore_player_states(interaction, game_state):
     """
     Khôi phục trạng thái người chơi (di chuyển, unmute, v.v.)
     
+    Mỗi người chơi chỉ cần một lần member.edit (di chuyển + unmute), các lời gọi chạy song song
+    qua bucket scheduler. Kênh riêng nào đã được di chuyển hết người sẽ bị xóa ngay,
+    không chờ những kênh khác.
+    
     Args:
         interaction (discord.Interaction): Interaction gốc
         game_state (dict): Trạng thái game hiện tại
     """
     try:
+        guild = interaction.guild
+        
         # Lấy kênh voice chính
         voice_channel_id = None
         try:
@@ -465,12 +500,11 @@ async def restore_player_states(interaction, game_state):
         except:
             voice_channel_id = game_state.get("voice_channel_id")
             
-        main_channel = interaction.guild.get_channel(voice_channel_id)
+        main_channel = guild.get_channel(voice_channel_id)
         if not main_channel:
             logger.error(f"Main voice channel not found: ID={voice_channel_id}")
             return
         
-        # Di chuyển người chơi từ các kênh riêng về kênh chính
         logger.info(f"Starting to move players to main voice channel: {main_channel.name}")
         player_channels = {}
         try:
@@ -478,80 +512,85 @@ async def restore_player_states(interaction, game_state):
         except:
             player_channels = game_state.get("player_channels", {})
             
-        # Di chuyển từng người chơi trong các kênh riêng
-        moved_count = 0
-        for user_id, channel in player_channels.items():
-            try:
-                member = interaction.guild.get_member(int(user_id))
-                if member and member.voice and member.voice.channel:
-                    await member.move_to(main_channel)
-                    logger.info(f"Moved player {member.display_name} to main channel")
-                    moved_count += 1
-                    
-                    # Nếu bị mute thì unmute
-                    if member.voice.mute:
-                        try:
-                            await member.edit(mute=False)
-                            logger.info(f"Unmuted player {member.display_name}")
-                        except:
-                            logger.warning(f"Failed to unmute player {member.display_name}")
-                    
-                    # Thêm độ trễ nhỏ để tránh rate limit
-                    await asyncio.sleep(0.3)
-            except Exception as e:
-                logger.error(f"Error moving player ID {user_id}: {str(e)}")
-                
-        # Di chuyển người chơi từ kênh sói và kênh người chết
-        for channel_attr in ["wolf_channel", "dead_channel"]:
-            special_channel = None
-            try:
-                special_channel = getattr(game_state, channel_attr)
-            except:
-                special_channel = game_state.get(channel_attr)
-                
-            if special_channel:
-                try:
-                    # Di chuyển tất cả thành viên trong kênh này về kênh chính
-                    for member in special_channel.members:
-                        if not member.bot and member.voice and member.voice.channel:
-                            try:
-                                await member.move_to(main_channel)
-                                logger.info(f"Moved player {member.display_name} from {channel_attr} to main channel")
-                                moved_count += 1
-                                
-                                # Nếu bị mute thì unmute
-                                if member.voice.mute:
-                                    await member.edit(mute=False)
-                                
-                                # Thêm độ trễ nhỏ để tránh rate limit
-                                await asyncio.sleep(0.3)
-                            except Exception as e:
-                                logger.error(f"Error moving player {member.display_name} from {channel_attr}: {str(e)}")
-                except Exception as e:
-                    logger.error(f"Error processing {channel_attr}: {str(e)}")
-                    
-        logger.info(f"Successfully moved {moved_count} players to main channel")
-        
-        # Đảm bảo mọi người đều được unmute
         players = {}
         try:
             players = game_state.players
         except:
             players = game_state.get("players", {})
-            
-        # Unmute tất cả người chơi (một lần nữa để chắc chắn)
+        
+        # Gom tất cả thành viên cần khôi phục: người chơi và bất kỳ ai còn trong kênh riêng
+        members = {}
         for user_id in players:
+            member = guild.get_member(int(user_id))
+            if member:
+                members[member.id] = member
+        for channel in player_channels.values():
+            if channel:
+                for member in channel.members:
+                    if not member.bot:
+                        members[member.id] = member
+        
+        bucket = f"member_edit:{guild.id}"
+        
+        def restore_call(member):
+            """Tạo lời gọi edit duy nhất cho một thành viên, None nếu không cần thay đổi"""
+            if not member.voice or not member.voice.channel:
+                return None
+            if member.voice.channel.id != main_channel.id:
+                return lambda: member.edit(voice_channel=main_channel, mute=False)
+            if member.voice.mute:
+                return lambda: member.edit(mute=False)
+            return None
+        
+        async def restore_members(member_list):
+            """Khôi phục một nhóm thành viên, trả về (số người thành công, số người thất bại)"""
+            calls = [(member, restore_call(member)) for member in member_list]
+            calls = [(member, call) for member, call in calls if call]
+            if not calls:
+                return 0, 0
+            results = await scheduler.gather(bucket, [call for _, call in calls])
+            restored = 0
+            for (member, _), result in zip(calls, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error restoring player {member.display_name}: {str(result)}")
+                else:
+                    restored += 1
+            return restored, len(calls) - restored
+        
+        async def vacate_and_delete(user_id, channel, occupants):
+            """Đưa người trong kênh riêng về kênh chính rồi xóa kênh đó"""
+            restored, failed = await restore_members(occupants)
+            if failed:
+                # Xóa kênh lúc này sẽ ngắt voice của người còn trong kênh; cleanup_channels thử di chuyển lại
+                logger.warning(f"Giữ lại kênh {channel.name}: {failed} người chưa được đưa về kênh chính")
+                return restored, failed
             try:
-                member = interaction.guild.get_member(int(user_id))
-                if member and member.voice and member.voice.mute:
-                    await member.edit(mute=False)
+                await scheduler.run(f"channel_delete:{guild.id}", channel.delete)
+                player_channels.pop(user_id, None)
             except Exception as e:
-                logger.error(f"Error unmuting player ID {user_id}: {str(e)}")
+                logger.error(f"Error deleting private channel {channel.name}: {str(e)}")
+            return restored, failed
+        
+        # Mỗi kênh riêng là một chuỗi độc lập (di chuyển -> xóa kênh); người chơi ở nơi khác chạy song song
+        channel_tasks = []
+        for user_id, channel in list(player_channels.items()):
+            if channel:
+                occupants = [members.pop(m.id) for m in channel.members if m.id in members]
+                channel_tasks.append(vacate_and_delete(user_id, channel, occupants))
+        results = await asyncio.gather(
+            restore_members(list(members.values())),
+            *channel_tasks,
+            return_exceptions=True
+        )
+        
+        restored_count = sum(r[0] for r in results if not isinstance(r, Exception))
+        logger.info(f"Successfully restored {restored_count} players to main channel")
     
     except Exception as e:
         logger.error(f"Error restoring player states: {str(e)}")
         traceback.print_exc()
 
+@traced("end_game.cleanup_channels")
 async def cleanup_channels(interaction, game_state):
     """
     Dọn dẹp các kênh voice và text liên quan đến game
@@ -589,27 +628,46 @@ async def cleanup_channels(interaction, game_state):
                 await text_channel.set_permissions(guild.default_role, send_messages=True)
                 logger.info(f"Restored send permission for channel {text_channel.name}")
         
-        # Xóa các kênh voice riêng
+        # Xóa các kênh voice riêng còn sót (thường đã được xóa trong restore_player_states).
+        # Kênh còn người (di chuyển thất bại ở restore_player_states) được thử di chuyển lại một lần;
+        # nếu vẫn còn người thì giữ kênh để không ngắt voice của họ, resource sweeper xóa sau khi kênh trống
+        try:
+            voice_channel_id = game_state.voice_channel_id
+        except:
+            voice_channel_id = game_state.get("voice_channel_id")
+        main_channel = guild.get_channel(voice_channel_id) if voice_channel_id else None
+        
+        async def vacate(channel):
+            occupants = [m for m in channel.members if not m.bot]
+            if not occupants or not main_channel:
+                return not occupants
+            results = await scheduler.gather(
+                f"member_edit:{guild.id}",
+                [lambda m=m: m.edit(voice_channel=main_channel, mute=False) for m in occupants]
+            )
+            return not any(isinstance(result, Exception) for result in results)
+        
         voice_deletion_tasks = []
         for user_id, channel in player_channels.items():
-            if channel:
-                voice_deletion_tasks.append(channel.delete())
+            if not channel:
+                continue
+            if await vacate(channel):
+                voice_deletion_tasks.append(channel.delete)
+            else:
+                logger.warning(f"Giữ lại kênh {channel.name}: vẫn còn người chưa được đưa về kênh chính")
         
         # Xóa kênh wolf-chat và dead-chat
         text_deletion_tasks = []
         if dead_channel:
-            text_deletion_tasks.append(dead_channel.delete())
+            text_deletion_tasks.append(dead_channel.delete)
         if wolf_channel:
-            text_deletion_tasks.append(wolf_channel.delete())
+            text_deletion_tasks.append(wolf_channel.delete)
         
-        # Thực hiện các task xóa kênh cùng lúc
-        if voice_deletion_tasks:
-            await asyncio.gather(*voice_deletion_tasks, return_exceptions=True)
-            logger.info(f"Deleted {len(voice_deletion_tasks)} private voice channels")
-            
-        if text_deletion_tasks:
-            await asyncio.gather(*text_deletion_tasks, return_exceptions=True)
-            logger.info(f"Deleted wolf-chat and dead-chat channels")
+        # Thực hiện các task xóa kênh cùng lúc, điều tiết qua bucket scheduler
+        bucket = f"channel_delete:{guild.id}"
+        if voice_deletion_tasks or text_deletion_tasks:
+            await scheduler.gather(bucket, voice_deletion_tasks + text_deletion_tasks)
+            logger.info(f"Deleted {len(voice_deletion_tasks)} private voice channels and {len(text_deletion_tasks)} text channels")
         
         # Xóa thông tin kênh từ game state
         try:
@@ -624,6 +682,7 @@ async def cleanup_channels(interaction, game_state):
         logger.error(f"Error cleaning up channels: {str(e)}")
         traceback.print_exc()
 
+@traced("end_game.cleanup_roles")
 async def cleanup_roles(interaction, game_state):
     """
     Xóa các vai trò Discord liên quan đến game
@@ -718,6 +777,11 @@ def reset_game_variables(game_state):
     Args:
         game_state (dict): Trạng thái game hiện tại
     """
+    # Ghi timeline đo thời gian và đóng journal của game vừa kết thúc
+    perf.finish_game(game_state)
+    close_journal(game_state, game_state.get("last_winner"))
+    game_state["game_id"] = None
+    
     # Giữ lại thông tin để khởi động lại game
     try:
         temp_admin_id = game_state.temp_admin_id
@@ -743,6 +807,10 @@ def reset_game_variables(game_state):
     try:
         game_state.players.clear()
         game_state.votes.clear()
+        game_state.vote_tally = None
+        game_state.vote_board = None
+        game_state.eligible_voters = None
+        game_state.math_pool = None
         game_state.is_game_running = False
         game_state.is_game_paused = False
         game_state.phase = "none"
@@ -778,12 +846,15 @@ def reset_game_variables(game_state):
         game_state.math_results.clear() if hasattr(game_state, 'math_results') else None
         
         # THÊM: Reset cờ liên quan đến leaderboard
-        game_state.leaderboard_updated = False
         game_state.last_winner = None
         game_state.summary_already_shown = False
     except:
         game_state["players"] = {}
         game_state["votes"] = {}
+        game_state["vote_tally"] = None
+        game_state["vote_board"] = None
+        game_state["eligible_voters"] = None
+        game_state["math_pool"] = None
         game_state["is_game_running"] = False
         game_state["is_game_paused"] = False
         game_state["phase"] = "none"
@@ -819,7 +890,6 @@ def reset_game_variables(game_state):
         game_state["math_results"] = {}
         
         # THÊM: Reset cờ liên quan đến leaderboard
-        game_state["leaderboard_updated"] = False
         game_state["last_winner"] = None
         game_state["summary_already_shown"] = False
     
@@ -0,0 +1,128 @@
+# utils/export.py
+# Xuất leaderboard, game_logs và game_participants ra CSV hoặc NDJSON theo luồng:
+# cursor không buffer + fetchmany từng khối cố định nên bộ nhớ không phụ thuộc kích thước bảng
+#
+# Chạy: python -m utils.export TABLE [--format csv|ndjson] [--guild GUILD_ID] [--output FILE]
+
+import os
+import csv
+import json
+import logging
+import argparse
+import tempfile
+from typing import Optional, Tuple
+
+from db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+FORMATS = ("csv", "ndjson")
+
+# Cột được xuất, điều kiện lọc và thứ tự của từng bảng (sắp theo khóa chính để file ổn định giữa các lần xuất)
+EXPORTS = {
+    "leaderboard": (
+        "SELECT guild_id, player_id, player_name, score, games_played, wins, role_counts, role_wins FROM leaderboard",
+        [],
+        "guild_id, player_id"
+    ),
+    # Dòng game_logs được tạo khi game bắt đầu; chỉ xuất các game đã có kết quả
+    "game_logs": (
+        "SELECT id AS game_id, guild_id, timestamp, winner, players_count, werewolves_count, villagers_count, "
+        "duration, players_data FROM game_logs",
+        ["winner IS NOT NULL"],
+        "id"
+    ),
+    "participants": (
+        "SELECT game_id, guild_id, player_id, role, team, won, survived FROM game_participants",
+        [],
+        "game_id, player_id"
+    )
+}
+
+def _open_output(table: str, fmt: str, path: Optional[str]):
+    if path:
+        return open(path, "w", encoding="utf-8", newline="")
+    return tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", newline="", delete=False, prefix=f"masoi-{table}-", suffix=f".{fmt}"
+    )
+
+def _write_rows(output, query: str, params: tuple, fmt: str) -> int:
+    """Đọc kết quả truy vấn từng khối và ghi ngay ra file, trả về số dòng"""
+    rows_written = 0
+    with get_db_connection() as conn:
+        # SELECT của InnoDB là đọc snapshot, không khóa dòng; READ COMMITTED để snapshot không bị giữ
+        # suốt lần xuất dài (chỉ áp dụng cho transaction kế tiếp của kết nối này)
+        cursor = conn.cursor()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        cursor.close()
+
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            writer = csv.writer(output) if fmt == "csv" else None
+            if writer:
+                writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(CHUNK_SIZE)
+                if not rows:
+                    break
+                if writer:
+                    writer.writerows(rows)
+                else:
+                    output.writelines(
+                        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n" for row in rows
+                    )
+                rows_written += len(rows)
+            conn.commit()
+        finally:
+            cursor.close()
+    return rows_written
+
+def export_table(table: str, fmt: str = "csv", guild_id: Optional[int] = None, path: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Ghi một bảng ra file theo từng khối CHUNK_SIZE dòng (hàm đồng bộ, chạy trong executor)
+
+    Args:
+        table (str): "leaderboard", "game_logs" hoặc "participants"
+        fmt (str): "csv" hoặc "ndjson"
+        guild_id (int, optional): Chỉ xuất một guild
+        path (str, optional): File đích, mặc định là file tạm (bên gọi xóa sau khi dùng)
+
+    Returns:
+        tuple: (đường dẫn file, số dòng đã ghi)
+    """
+    if table not in EXPORTS:
+        raise ValueError(f"Bảng không hỗ trợ xuất: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    select, conditions, order_by = EXPORTS[table]
+    conditions, params = list(conditions), ()
+    if guild_id is not None:
+        conditions.append("guild_id = %s")
+        params = (int(guild_id),)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"{select}{where} ORDER BY {order_by}"
+
+    output = _open_output(table, fmt, path)
+    try:
+        with output:
+            rows_written = _write_rows(output, query, params, fmt)
+    except Exception:
+        # Không để lại file tạm ghi dở
+        if path is None:
+            os.remove(output.name)
+        raise
+    logger.info(f"Đã xuất {rows_written} dòng của {table} ra {output.name}")
+    return output.name, rows_written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xuất dữ liệu bảng xếp hạng và lịch sử game")
+    parser.add_argument("table", choices=sorted(EXPORTS), help="Bảng cần xuất")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="Định dạng file")
+    parser.add_argument("--guild", type=int, default=None, help="Chỉ xuất một guild")
+    parser.add_argument("--output", default=None, help="File đích (mặc định là file tạm)")
+    args = parser.parse_args()
+    path, count = export_table(args.table, args.format, args.guild, args.output)
+    print(f"{count} dòng -> {os.path.abspath(path)}")
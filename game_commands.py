@@ -18,6 +18,8 @@ from phases.night import night_phase
 from phases.voting import voting_phase
 from utils.api_utils import update_member_cache
 from views.skip_phase_view import SkipPhaseView
+from utils.perf import perf
+from utils.readiness import requires
 
 logger = logging.getLogger(__name__)
 
@@ -78,6 +80,7 @@ class GameCommands(commands.Cog):
         return self.game_states[guild_id]
     
     @app_commands.command(name="start_game", description="Bắt đầu một game Ma Sói mới")
+    @requires("database", "voice_manager")
     @handle_interaction
     async def start_game(self, interaction: discord.Interaction):
         if not interaction.guild:
@@ -430,6 +433,42 @@ class GameCommands(commands.Cog):
         
         await interaction.followup.send(embed=embed)
     
+    @app_commands.command(name="perf", description="Xem thời gian xử lý từng bước của game (p50/p95) qua các game gần đây")
+    @app_commands.describe(all_guilds="Tính cả các game ở server khác")
+    @handle_interaction
+    async def perf_report(self, interaction: discord.Interaction, all_guilds: bool = False):
+        if not interaction.guild:
+            await interaction.followup.send("Lỗi: Lệnh này phải được sử dụng trong server.", ephemeral=True)
+            return
+
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.followup.send("Chỉ admin mới có thể xem thống kê hiệu năng!", ephemeral=True)
+            return
+
+        report = perf.report(None if all_guilds else interaction.guild.id)
+        if not report:
+            await interaction.followup.send("Chưa có dữ liệu đo thời gian nào (chỉ tính các game đã kết thúc).", ephemeral=True)
+            return
+
+        # Bước chậm nhất (theo p95) lên đầu, giới hạn để vừa một embed
+        rows = sorted(report.items(), key=lambda item: item[1]["p95"], reverse=True)[:30]
+        name_width = min(32, max(len(name) for name, _ in rows))
+        lines = [f"{'Bước':<{name_width}} {'n':>4} {'p50':>8} {'p95':>8}"]
+        for name, stats in rows:
+            lines.append(
+                f"{name[:name_width]:<{name_width}} {stats['count']:>4} "
+                f"{stats['p50'] * 1000:>6.0f}ms {stats['p95'] * 1000:>6.0f}ms"
+            )
+
+        embed = discord.Embed(
+            title="⏱️ Thời Gian Xử Lý Của Game",
+            description="```\n" + "\n".join(lines)[:3900] + "\n```",
+            color=discord.Color.blue()
+        )
+        scope = "tất cả server" if all_guilds else "server này"
+        embed.set_footer(text=f"{len(perf.recent)} game gần nhất được lưu • Phạm vi: {scope}")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
     @app_commands.command(name="check_mute", description="Kiểm tra tình trạng mic")
     @handle_interaction
     async def check_mute(self, interaction: discord.Interaction):
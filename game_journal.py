@@ -0,0 +1,247 @@
+# utils/game_journal.py
+# Nhật ký sự kiện của từng game: chỉ ghi nối tiếp, mã hóa nhị phân gọn, ghi file theo lô và có thể phát lại
+
+import os
+import time
+import struct
+import asyncio
+import logging
+from enum import IntEnum
+from collections import deque
+from typing import Deque, Iterator, List, NamedTuple, Optional
+
+from config import JOURNAL_DIR
+
+logger = logging.getLogger(__name__)
+
+# Đầu file: magic + phiên bản định dạng
+JOURNAL_MAGIC = b"MWJ\x01"
+
+# Mỗi sự kiện: [độ dài payload u16][kind u8][offset_ms u32][night u16][actor u64][target u64][data utf-8]
+FRAME_PREFIX = struct.Struct("<H")
+EVENT_HEADER = struct.Struct("<BIHQQ")
+MAX_DATA_BYTES = 0xFFFF - EVENT_HEADER.size
+
+class EventKind(IntEnum):
+    GAME_START = 1      # data: tên guild/game (tùy chọn)
+    ROLE_ASSIGNED = 2   # actor: người chơi, data: vai trò
+    PHASE = 3           # data: "night" | "morning" | "voting"
+    NIGHT_ACTION = 4    # actor: người hành động (0 nếu cả phe), target: mục tiêu, data: loại hành động
+    STATUS = 5          # actor: người chơi, data: trạng thái mới ("dead" | "wounded" | "alive")
+    VOTE = 6            # actor: người bỏ phiếu, target: mục tiêu (0 = bỏ qua)
+    VOTE_RESULT = 7     # target: người bị loại (0 = không ai), data: số phiếu cao nhất
+    ROLE_CHANGED = 8    # actor: người chơi, data: vai trò mới
+    GAME_END = 9        # data: phe thắng
+
+class JournalEvent(NamedTuple):
+    kind: EventKind
+    offset_ms: int
+    night: int
+    actor: int = 0
+    target: int = 0
+    data: str = ""
+
+def encode_event(event: JournalEvent) -> bytes:
+    """Mã hóa một sự kiện thành frame có tiền tố độ dài"""
+    data = event.data.encode("utf-8")[:MAX_DATA_BYTES]
+    payload = EVENT_HEADER.pack(int(event.kind), event.offset_ms, event.night, event.actor, event.target) + data
+    return FRAME_PREFIX.pack(len(payload)) + payload
+
+def decode_events(buffer: bytes) -> Iterator[JournalEvent]:
+    """
+    Giải mã các frame liên tiếp (bỏ qua frame cuối nếu bị ghi dở)
+
+    Args:
+        buffer (bytes): Nội dung file journal (không gồm magic)
+    """
+    position = 0
+    while position + FRAME_PREFIX.size <= len(buffer):
+        (length,) = FRAME_PREFIX.unpack_from(buffer, position)
+        start = position + FRAME_PREFIX.size
+        end = start + length
+        if end > len(buffer) or length < EVENT_HEADER.size:
+            logger.warning(f"Journal bị cắt cụt tại byte {position}, bỏ qua phần còn lại")
+            return
+        kind, offset_ms, night, actor, target = EVENT_HEADER.unpack_from(buffer, start)
+        data = bytes(buffer[start + EVENT_HEADER.size:end]).decode("utf-8", errors="replace")
+        yield JournalEvent(EventKind(kind), offset_ms, night, actor, target, data)
+        position = end
+
+def read_journal(path: str) -> List[JournalEvent]:
+    """Đọc toàn bộ sự kiện từ file journal"""
+    with open(path, "rb") as f:
+        content = f.read()
+    if not content.startswith(JOURNAL_MAGIC):
+        raise ValueError(f"{path} không phải file journal hợp lệ")
+    return list(decode_events(memoryview(content)[len(JOURNAL_MAGIC):]))
+
+class GameJournal:
+    """
+    Journal của một game. record() chỉ mã hóa vào bộ đệm trong bộ nhớ; bộ đệm được ghi nối
+    vào file theo lô (khi đủ kích thước, khi chuyển pha và khi game kết thúc) trong executor.
+    """
+
+    def __init__(self, guild_id: int, game_id=None, directory: str = JOURNAL_DIR, flush_every: int = 64,
+                 timeline_size: int = 500):
+        self.guild_id = guild_id
+        self.game_id = game_id
+        self.started_at = time.monotonic()
+        self.flush_every = flush_every
+        name = game_id if game_id is not None else time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(directory, f"{guild_id}-{name}.mwj")
+        self.pending: List[bytes] = [JOURNAL_MAGIC]
+        self.event_count = 0
+        # Các sự kiện gần nhất giữ trong bộ nhớ để dựng tóm tắt cuối game (không cần đọc file hay DB)
+        self.timeline: Deque[JournalEvent] = deque(maxlen=timeline_size)
+        # Các sự kiện chưa được ghi vào bảng game_events và số sự kiện đã ghi (dùng làm seq)
+        self.unsaved: List[JournalEvent] = []
+        self.saved_count = 0
+        self.closed = False
+        self.lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+
+    def record(self, kind: EventKind, night: int = 0, actor: int = 0, target: int = 0, data: str = "") -> Optional[JournalEvent]:
+        """Ghi một sự kiện vào bộ đệm (không chặn event loop)"""
+        if self.closed:
+            return None
+        offset_ms = int((time.monotonic() - self.started_at) * 1000)
+        event = JournalEvent(kind, offset_ms, night, actor or 0, target or 0, data or "")
+        self.pending.append(encode_event(event))
+        self.timeline.append(event)
+        self.unsaved.append(event)
+        self.event_count += 1
+        # Flush theo lô: khi bộ đệm đủ lớn hoặc khi chuyển pha
+        if len(self.pending) >= self.flush_every or kind == EventKind.PHASE:
+            self.schedule_flush()
+        return event
+
+    def _write(self, frames: List[bytes]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(b"".join(frames))
+
+    async def flush(self):
+        """Ghi các frame đang chờ vào file (giữ đúng thứ tự giữa các lần flush)"""
+        async with self.lock:
+            if not self.pending:
+                return
+            frames, self.pending = self.pending, []
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, frames)
+            except Exception as e:
+                # Giữ lại để thử ghi ở lần flush sau
+                self.pending = frames + self.pending
+                logger.error(f"Lỗi khi ghi journal {self.path}: {str(e)}")
+
+    def schedule_flush(self):
+        """Hẹn flush nền (bỏ qua nếu đang có một lần flush chờ chạy)"""
+        if self.flush_task and not self.flush_task.done():
+            return
+        try:
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush())
+        except RuntimeError:
+            # Không có event loop (ví dụ khi phát lại offline): ghi đồng bộ
+            frames, self.pending = self.pending, []
+            self._write(frames)
+
+    def unsaved_events(self):
+        """(seq của sự kiện đầu tiên, các sự kiện chưa ghi vào game_events)"""
+        return self.saved_count, list(self.unsaved)
+
+    def mark_saved(self, count: int):
+        """Đánh dấu count sự kiện đầu tiên trong unsaved đã được ghi vào database"""
+        del self.unsaved[:count]
+        self.saved_count += count
+
+    async def close(self):
+        """Flush lần cuối và ngừng nhận sự kiện"""
+        self.closed = True
+        await self.flush()
+        logger.info(f"Đã đóng journal {self.path} ({self.event_count} sự kiện)")
+
+def record_event(game_state, kind: EventKind, actor: int = 0, target: int = 0, data: str = ""):
+    """Ghi sự kiện vào journal của game nếu có (dùng trong các module pha)"""
+    journal = game_state.get("journal")
+    if journal is None:
+        return None
+    return journal.record(kind, game_state.get("night_count") or 0, actor, target, data)
+
+def get_timeline(game_state) -> List[JournalEvent]:
+    """Các sự kiện của game hiện tại đang giữ trong bộ nhớ"""
+    journal = game_state.get("journal")
+    return list(journal.timeline) if journal is not None else []
+
+def start_journal(game_state) -> GameJournal:
+    """Tạo journal mới cho game vừa bắt đầu (đóng journal cũ nếu game trước chưa kết thúc đúng cách)"""
+    close_journal(game_state)
+    journal = GameJournal(game_state.get("guild_id"), game_state.get("game_id"))
+    game_state["journal"] = journal
+    journal.record(EventKind.GAME_START)
+    return journal
+
+def close_journal(game_state, winner: Optional[str] = None):
+    """Ghi kết quả, tách journal khỏi game_state và flush nền"""
+    journal = game_state.get("journal")
+    if journal is None:
+        return None
+    game_state["journal"] = None
+    journal.record(EventKind.GAME_END, game_state.get("night_count") or 0, data=winner or "no_one")
+    journal.closed = True
+    try:
+        return asyncio.get_running_loop().create_task(journal.close())
+    except RuntimeError:
+        journal.schedule_flush()
+        return None
+
+def apply_event(game_state, event: JournalEvent):
+    """Áp dụng một sự kiện lên GameState (dùng khi phát lại)"""
+    kind = event.kind
+    game_state.night_count = event.night
+    if kind == EventKind.GAME_START:
+        game_state.is_game_running = True
+        game_state.phase = "none"
+    elif kind == EventKind.ROLE_ASSIGNED:
+        game_state.players[event.actor] = {"role": event.data, "status": "alive", "muted": False}
+    elif kind == EventKind.PHASE:
+        game_state.phase = event.data
+        if event.data == "night":
+            game_state.votes.clear()
+    elif kind == EventKind.STATUS:
+        if event.actor in game_state.players:
+            game_state.players[event.actor]["status"] = event.data
+    elif kind == EventKind.ROLE_CHANGED:
+        if event.actor in game_state.players:
+            game_state.players[event.actor]["role"] = event.data
+    elif kind == EventKind.VOTE:
+        game_state.votes[event.actor] = event.target or "skip"
+    elif kind == EventKind.NIGHT_ACTION:
+        game_state.night_actions.append((event.data, event.actor, event.target))
+    elif kind == EventKind.GAME_END:
+        game_state.is_game_running = False
+        game_state.last_winner = event.data
+
+def replay(events: List[JournalEvent], guild_id: int = 0, until_ms: Optional[int] = None, until_index: Optional[int] = None):
+    """
+    Dựng lại GameState tại một thời điểm của game
+
+    Args:
+        events (list): Sự kiện đọc từ read_journal
+        guild_id (int): Guild của game
+        until_ms (int, optional): Chỉ áp dụng các sự kiện có offset <= until_ms
+        until_index (int, optional): Chỉ áp dụng until_index sự kiện đầu tiên
+
+    Returns:
+        GameState: Trạng thái game tại thời điểm đó (night_actions chứa các hành động của đêm hiện tại)
+    """
+    from game_state import GameState
+    game_state = GameState(guild_id)
+    game_state.night_actions = []
+    for index, event in enumerate(events):
+        if until_index is not None and index >= until_index:
+            break
+        if until_ms is not None and event.offset_ms > until_ms:
+            break
+        if event.kind == EventKind.PHASE and event.data == "night":
+            game_state.night_actions = []
+        apply_event(game_state, event)
+    return game_state
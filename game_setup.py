@@ -8,9 +8,14 @@ import random
 import traceback
 from typing import Dict, List, Optional
 
-from constants import ROLE_ICONS, BOT_VERSION
+from constants import ROLE_ICONS, BOT_VERSION, GAME_ROLE_REASON, PLAYER_CHANNEL_PREFIX
 from utils.api_utils import retry_api_call, play_audio
 from utils.role_utils import assign_random_roles
+from utils.math_problems import MathProblemPool
+from utils.perf import perf, span
+from utils.log_pipeline import bind_game_context
+from utils.game_journal import start_journal
+from db import create_game_log
 from phases.morning import morning_phase
 
 logger = logging.getLogger(__name__)
@@ -179,10 +184,20 @@ async def start_game_logic(interaction: discord.Interaction, game_state):
             await text_channel.send("Lỗi: Không tìm thấy kênh voice.")
             return
     
+        # Cấp game_id cho game mới (khóa cho leaderboard_ledger, game_events và journal)
+        game_state["guild_id"] = guild.id
+        game_state["game_id"] = await create_game_log(guild.id)
+        
+        # Bắt đầu timeline đo thời gian cho game mới
+        perf.start_game(game_state)
+        bind_game_context(game_state)
+        start_journal(game_state)
+    
         try:
             # Sử dụng voice_manager để kết nối
             from main import voice_manager
-            voice_client = await voice_manager.connect_to_voice(voice_channel, guild.id)
+            with span(game_state, "setup.voice_connect"):
+                voice_client = await voice_manager.connect_to_voice(voice_channel, guild.id)
             if not voice_client:
                 logger.error(f"Không thể tham gia kênh voice ID={voice_channel.id}")
                 await text_channel.send(f"Lỗi: Không thể tham gia kênh voice {voice_channel.name}.")
@@ -192,44 +207,46 @@ async def start_game_logic(interaction: discord.Interaction, game_state):
             logger.info(f"Bot đã tham gia kênh voice: ID={voice_channel.id}, Name={voice_channel.name}")
     
             # Tạo vai trò Discord
-            villager_role = await guild.create_role(
-                name="Villager", 
-                color=discord.Color.green(), 
-                hoist=True, 
-                mentionable=False,
-                reason="DeWolfVie game role"
-            )
-            game_state["villager_role_id"] = villager_role.id
+            with span(game_state, "setup.create_roles"):
+                villager_role = await guild.create_role(
+                    name="Villager", 
+                    color=discord.Color.green(), 
+                    hoist=True, 
+                    mentionable=False,
+                    reason=GAME_ROLE_REASON
+                )
+                game_state["villager_role_id"] = villager_role.id
             
-            dead_role = await guild.create_role(
-                name="Dead", 
-                color=discord.Color.greyple(), 
-                hoist=True, 
-                mentionable=False,
-                reason="DeWolfVie game role"
-            )
-            game_state["dead_role_id"] = dead_role.id
+                dead_role = await guild.create_role(
+                    name="Dead", 
+                    color=discord.Color.greyple(), 
+                    hoist=True, 
+                    mentionable=False,
+                    reason=GAME_ROLE_REASON
+                )
+                game_state["dead_role_id"] = dead_role.id
             
-            werewolf_role = await guild.create_role(
-                name="Werewolf", 
-                color=discord.Color.red(), 
-                hoist=False, 
-                mentionable=False,
-                reason="DeWolfVie game role"
-            )
-            game_state["werewolf_role_id"] = werewolf_role.id
+                werewolf_role = await guild.create_role(
+                    name="Werewolf", 
+                    color=discord.Color.red(), 
+                    hoist=False, 
+                    mentionable=False,
+                    reason=GAME_ROLE_REASON
+                )
+                game_state["werewolf_role_id"] = werewolf_role.id
     
-            # Đảm bảo người chết không nói được trong kênh voice
-            await voice_channel.set_permissions(dead_role, speak=False)
+                # Đảm bảo người chết không nói được trong kênh voice
+                await voice_channel.set_permissions(dead_role, speak=False)
     
-            # Thiết lập channel permissions
-            await text_channel.set_permissions(guild.default_role, send_messages=False)
-            await text_channel.set_permissions(villager_role, send_messages=True)
-            await text_channel.set_permissions(dead_role, send_messages=False)
+                # Thiết lập channel permissions
+                await text_channel.set_permissions(guild.default_role, send_messages=False)
+                await text_channel.set_permissions(villager_role, send_messages=True)
+                await text_channel.set_permissions(dead_role, send_messages=False)
             
             # Tạo kênh wolf-chat và dead-chat
-            wolf_channel = await setup_wolf_channel(guild, game_state)
-            dead_channel = await setup_dead_channel(guild, game_state)
+            with span(game_state, "setup.create_text_channels"):
+                wolf_channel = await setup_wolf_channel(guild, game_state)
+                dead_channel = await setup_dead_channel(guild, game_state)
             
             # Tạo các kênh voice riêng biệt cho từng người chơi
             game_state["player_channels"] = {}
@@ -243,8 +260,8 @@ async def start_game_logic(interaction: discord.Interaction, game_state):
                         logger.warning(f"Member not found in cache: ID={user_id}")
                         continue
                     
-                max_name_length = 100 - len("House of ") - 1  # Đảm bảo tên không vượt quá 100 ký tự
-                channel_name = f"House of {member.display_name[:max_name_length]}"
+                max_name_length = 100 - len(PLAYER_CHANNEL_PREFIX) - 1  # Đảm bảo tên không vượt quá 100 ký tự
+                channel_name = f"{PLAYER_CHANNEL_PREFIX}{member.display_name[:max_name_length]}"
                 
                 overwrites = {
                     guild.default_role: discord.PermissionOverwrite(read_messages=False, connect=False),
@@ -256,7 +273,8 @@ async def start_game_logic(interaction: discord.Interaction, game_state):
                 player_channel_tasks.append(create_player_channel(guild, channel_name, overwrites, user_id, game_state))
                 
             # Thực hiện tất cả các tasks tạo channel cùng lúc
-            await asyncio.gather(*player_channel_tasks)
+            with span(game_state, "setup.create_player_channels"):
+                await asyncio.gather(*player_channel_tasks)
             
             # Khởi tạo game state
             game_state["wolf_channel"] = wolf_channel
@@ -277,15 +295,17 @@ async def start_game_logic(interaction: discord.Interaction, game_state):
             game_state["demon_werewolf_cursed_this_night"] = False
             
             # THÊM: Reset cờ liên quan đến leaderboard khi bắt đầu game mới
-            game_state["leaderboard_updated"] = False
             game_state["last_winner"] = None
             game_state["summary_already_shown"] = False
             
-            logger.info("Reset leaderboard flags at game start: leaderboard_updated=False, last_winner=None")
+            logger.info("Reset leaderboard flags at game start: last_winner=None")
             
             # Phân vai cho người chơi và gửi tin nhắn
             await assign_random_roles(game_state, guild)
             
+            # Tạo sẵn kho bài toán ban đêm không trùng lặp cho cả game
+            game_state["math_pool"] = MathProblemPool.for_players(len(game_state["players"]))
+            
             # Thông báo game bắt đầu
             role_list_str = ", ".join([f"{role}: {count}" for role, count in game_state["temp_roles"].items() if count > 0])
             
@@ -398,7 +418,6 @@ async def start_new_game_with_same_setup(interaction: discord.Interaction, game_
         
         # THÊM: Đảm bảo cờ leaderboard được reset
         try:
-            game_state["leaderboard_updated"] = False
             game_state["last_winner"] = None
             game_state["summary_already_shown"] = False
             logger.info("Reset leaderboard flags for new game with same setup")
@@ -533,7 +552,6 @@ class ContinueWithMissingPlayersView(discord.ui.View):
             self.game_state.reset()
             
             # THÊM: Đảm bảo cờ leaderboard được reset sau khi hủy game
-            self.game_state["leaderboard_updated"] = False
             self.game_state["last_winner"] = None
             self.game_state["summary_already_shown"] = False
             
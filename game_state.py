@@ -2,12 +2,13 @@
 # Quản lý trạng thái game
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Set
+from typing import Deque, Dict, List, Optional, Any, Set
+from collections import deque
 import discord
 import random
 import logging
 import asyncio
-from constants import ROLES, VILLAGER_ROLES, WEREWOLF_ROLES
+from constants import ROLES, VILLAGER_ROLES, WEREWOLF_ROLES, NO_NIGHT_ACTION_ROLES
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +44,64 @@ class PlayerData:
         else:
             return "unknown"
 
+class VoteTally:
+    """
+    Bảng kiểm phiếu được cập nhật tăng dần: mỗi phiếu chỉ điều chỉnh số phiếu
+    của mục tiêu cũ và mục tiêu mới, không phải đếm lại toàn bộ người chơi.
+    """
+    
+    def __init__(self, voter_ids, eligible_ids):
+        self.voter_ids = set(voter_ids)
+        self.eligible_ids = set(eligible_ids) & self.voter_ids
+        self.ballots: Dict[int, Any] = {}  # voter_id -> target_id hoặc "skip"
+        self.counts: Dict[int, int] = {}   # target_id -> số phiếu hợp lệ
+        self.counted_votes = 0             # tổng số phiếu hợp lệ cho một mục tiêu
+        self.version = 0                   # tăng mỗi khi kết quả thay đổi
+    
+    def is_eligible(self, voter_id: int) -> bool:
+        return voter_id in self.eligible_ids
+    
+    def cast(self, voter_id: int, target) -> bool:
+        """
+        Ghi nhận (hoặc đổi) phiếu của một người chơi
+        
+        Args:
+            voter_id (int): ID người bỏ phiếu
+            target (int | str): ID mục tiêu hoặc "skip"
+        
+        Returns:
+            bool: True nếu phiếu được tính
+        """
+        if voter_id not in self.voter_ids:
+            return False
+        
+        previous = self.ballots.get(voter_id, "skip")
+        self.ballots[voter_id] = target
+        eligible = voter_id in self.eligible_ids
+        if not eligible or previous == target:
+            return eligible
+        
+        if isinstance(previous, int):
+            self.counts[previous] -= 1
+            self.counted_votes -= 1
+            if self.counts[previous] == 0:
+                del self.counts[previous]
+        if isinstance(target, int):
+            self.counts[target] = self.counts.get(target, 0) + 1
+            self.counted_votes += 1
+        
+        self.version += 1
+        return True
+    
+    def snapshot(self):
+        """
+        Returns:
+            Tuple[Dict[int, int], int, int]: (vote_counts, skip_votes, ineligible_count)
+        """
+        skip_votes = len(self.eligible_ids) - self.counted_votes
+        ineligible_count = len(self.voter_ids) - len(self.eligible_ids)
+        return dict(self.counts), skip_votes, ineligible_count
+
 # game_state.py
 # Class quản lý trạng thái game
 
@@ -95,8 +154,15 @@ class GameState:
         
         # Thông tin pha bỏ phiếu
         self.votes = {}
+        self.vote_tally = None  # VoteTally của lượt bỏ phiếu hiện tại
+        self.vote_board = None  # Embed kết quả trực tiếp của lượt bỏ phiếu hiện tại
         self.math_problems = {}
         self.math_results = {}
+        self.eligible_voters = None  # Tập ID người được tính phiếu, chốt khi hết giờ giải toán ban đêm
+        self.math_pool = None  # MathProblemPool của game, tạo khi game bắt đầu
+        self.perf_timeline = None  # GameTimeline đo thời gian các bước của game
+        self.journal = None  # GameJournal ghi sự kiện của game
+        self.game_id = None  # id của game (dòng game_logs), cấp khi game bắt đầu
         
         # Thông tin vai trò đặc biệt
         self.detective_has_used_power = False
@@ -162,8 +228,12 @@ class GameState:
         # Xóa dữ liệu người chơi
         self.players.clear()
         self.votes.clear()
+        self.vote_tally = None
+        self.vote_board = None
         self.math_problems.clear()
         self.math_results.clear()
+        self.eligible_voters = None
+        self.math_pool = None
         
         # Xóa thông tin kênh
         self.wolf_channel = None
@@ -272,36 +342,50 @@ class GameState:
             return False
             
         self.votes[voter_id] = target_id
-        logger.debug(f"Người chơi {voter_id} vote cho {target_id}")
+        logger.debug("Người chơi %s vote cho %s", voter_id, target_id)
         return True
     
+    def close_math_window(self) -> Set[int]:
+        """
+        Chốt tập người được tính phiếu khi hết giờ giải toán ban đêm:
+        vai trò không yêu cầu toán hoặc đã giải toán đúng
+        
+        Returns:
+            set: ID người chơi được tính phiếu
+        """
+        eligible = set()
+        for user_id, data in self.players.items():
+            role = data["role"] if isinstance(data, dict) else data.role
+            if role not in NO_NIGHT_ACTION_ROLES or self.math_results.get(user_id):
+                eligible.add(user_id)
+        
+        self.eligible_voters = eligible
+        # Bài toán chưa trả lời coi như đã hết hạn
+        self.math_problems.clear()
+        logger.debug("Chốt %d/%d người được tính phiếu cho guild ID %s", len(eligible), len(self.players), self.guild_id)
+        return eligible
+    
     def count_votes(self) -> Dict[int, int]:
         """Đếm số phiếu bầu cho từng người chơi"""
         vote_counts = {}
         skip_votes = 0
         ineligible_count = 0
         
+        eligible_voters = self.eligible_voters if self.eligible_voters is not None else self.close_math_window()
         for user_id, data in self.players.items():
             if not data.is_alive():
                 continue
-                
-            # Kiểm tra điều kiện để vote
-            from constants import NO_NIGHT_ACTION_ROLES
-            eligible_to_vote = True
             
-            if data.role in NO_NIGHT_ACTION_ROLES:
-                if user_id not in self.math_results or not self.math_results[user_id]:
-                    eligible_to_vote = False
-                    ineligible_count += 1
-                    continue
+            if user_id not in eligible_voters:
+                ineligible_count += 1
+                continue
             
             # Xử lý phiếu bầu
-            if eligible_to_vote:
-                target_id = self.votes.get(user_id, "skip")
-                if target_id == "skip":
-                    skip_votes += 1
-                elif isinstance(target_id, int):
-                    vote_counts[target_id] = vote_counts.get(target_id, 0) + 1
+            target_id = self.votes.get(user_id, "skip")
+            if target_id == "skip":
+                skip_votes += 1
+            elif isinstance(target_id, int):
+                vote_counts[target_id] = vote_counts.get(target_id, 0) + 1
         
         return vote_counts, skip_votes, ineligible_count
     
@@ -326,17 +410,20 @@ class GameState:
             
         return None
 
+# Số log giữ lại cho mỗi guild (lịch sử đầy đủ nằm trong journal của game)
+MAX_GAME_LOGS = 200
+
 # Lớp quản lý tất cả các game đang chạy
 class GameStateManager:
     def __init__(self):
         self.game_states: Dict[int, GameState] = {}
-        self.game_logs: Dict[int, List[str]] = {}
+        self.game_logs: Dict[int, Deque[str]] = {}
         
     def get_game_state(self, guild_id: int) -> GameState:
         """Lấy hoặc tạo mới game state cho guild"""
         if guild_id not in self.game_states:
             self.game_states[guild_id] = GameState(guild_id)
-            self.game_logs[guild_id] = []
+            self.game_logs[guild_id] = deque(maxlen=MAX_GAME_LOGS)
         return self.game_states[guild_id]
     
     def remove_game_state(self, guild_id: int):
@@ -349,10 +436,10 @@ class GameStateManager:
     def add_log(self, guild_id: int, message: str):
         """Thêm log cho guild"""
         if guild_id not in self.game_logs:
-            self.game_logs[guild_id] = []
+            self.game_logs[guild_id] = deque(maxlen=MAX_GAME_LOGS)
         self.game_logs[guild_id].append(message)
         logger.info(f"[Guild {guild_id}] {message}")
     
     def get_logs(self, guild_id: int) -> List[str]:
         """Lấy logs của guild"""
-        return self.game_logs.get(guild_id, [])
\ No newline at end of file
+        return list(self.game_logs.get(guild_id, []))
\ No newline at end of file
@@ -4,14 +4,33 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import asyncio
 import logging
+import os
 
 from constants import ROLES, VILLAGER_ROLES, WEREWOLF_ROLES, ROLE_DESCRIPTIONS, ROLE_LINKS, BOT_VERSION
-from db import get_leaderboard
+from db import get_leaderboard, get_player_history, get_seasons, rollover_season
+from utils.readiness import requires
+from utils.rating import get_rating_ranking
+from utils.export import export_table
+from utils.analytics import get_overview, get_team_size_stats, get_role_stats, get_role_mix_stats
 
 logger = logging.getLogger(__name__)
 
+def _win_rates(row) -> str:
+    """Tỉ lệ thắng của hai phe trong một dòng tổng hợp"""
+    games = row["games"] or 1
+    return f"🐺 {row['werewolf_wins'] * 100 / games:.0f}% | 👨‍🌾 {row['villager_wins'] * 100 / games:.0f}%"
+
+def _average_length(row) -> str:
+    """Độ dài trung bình của game trong một dòng tổng hợp"""
+    games = row["games"] or 1
+    minutes = row["total_seconds"] / games / 60
+    return f"{row['total_nights'] / games:.1f} đêm" + (f", ~{minutes:.0f} phút" if minutes >= 1 else "")
+
 class InfoCommands(commands.Cog):
+    stats = app_commands.Group(name="stats", description="Thống kê các game đã chơi trên server")
+    
     def __init__(self, bot):
         self.bot = bot
     
@@ -83,6 +102,11 @@ class InfoCommands(commands.Cog):
             {"name": "roles", "desc": "Xem chi tiết về một vai trò cụ thể."},
             {"name": "status", "desc": "Kiểm tra trạng thái hiện tại của game."},
             {"name": "leaderboard", "desc": "Hiển thị bảng xếp hạng người chơi."},
+            {"name": "rating", "desc": "Bảng xếp hạng theo kỹ năng (rating tính theo thắng/thua của cả đội)."},
+            {"name": "export", "desc": "Xuất bảng xếp hạng/lịch sử game của server ra CSV hoặc NDJSON (chỉ admin)."},
+            {"name": "seasons", "desc": "Xem các mùa của bảng xếp hạng (dùng /leaderboard season:<số> để xem mùa cũ)."},
+            {"name": "history", "desc": "Xem các game gần nhất của một người chơi."},
+            {"name": "stats", "desc": "Thống kê các game đã chơi: tổng quan, theo số người, theo vai trò, theo tổ hợp vai trò."},
             {"name": "check_mute", "desc": "Kiểm tra người chơi nào đang bị mute."},
             {"name": "help_masoi", "desc": "Hiển thị hướng dẫn chi tiết về chơi game Ma Sói."}
         ]
@@ -230,25 +254,28 @@ class InfoCommands(commands.Cog):
         await interaction.followup.send(embed=embed)
     
     @app_commands.command(name="leaderboard", description="Hiển thị bảng vinh danh")
-    @app_commands.describe(scope="Phạm vi hiển thị", limit="Số lượng người hiển thị")
+    @app_commands.describe(scope="Phạm vi hiển thị", limit="Số lượng người hiển thị", season="Mùa đã kết thúc cần xem (bỏ trống để xem mùa hiện tại)")
     @app_commands.choices(scope=[
         app_commands.Choice(name="Server này", value="server"),
         app_commands.Choice(name="Tất cả server", value="global")
     ])
+    @requires("database")
     async def leaderboard(self, interaction: discord.Interaction, 
                         scope: str = "server", 
-                        limit: app_commands.Range[int, 5, 20] = 10):
+                        limit: app_commands.Range[int, 5, 20] = 10,
+                        season: app_commands.Range[int, 1] = None):
         await interaction.response.defer()
         
         guild_id = interaction.guild.id
+        season_label = f" - Mùa {season}" if season else ""
         
         try:
             if scope == "server":
-                records = await get_leaderboard(guild_id, limit)
-                title = f"🏆 Bảng xếp hạng - Top {limit} (Server: {interaction.guild.name})"
+                records = await get_leaderboard(guild_id, limit, season)
+                title = f"🏆 Bảng xếp hạng{season_label} - Top {limit} (Server: {interaction.guild.name})"
             else:
-                records = await get_leaderboard(None, limit)
-                title = f"🏆 Bảng xếp hạng Toàn Cầu - Top {limit}"
+                records = await get_leaderboard(None, limit, season)
+                title = f"🏆 Bảng xếp hạng Toàn Cầu{season_label} - Top {limit}"
             
             if not records:
                 await interaction.followup.send("Chưa có dữ liệu leaderboard.")
@@ -274,5 +301,254 @@ class InfoCommands(commands.Cog):
             logger.error(f"Error fetching leaderboard: {e}")
             await interaction.followup.send(f"Lỗi khi lấy dữ liệu leaderboard: {str(e)[:100]}...")
 
+    @app_commands.command(name="rating", description="Bảng xếp hạng theo kỹ năng")
+    @app_commands.describe(limit="Số lượng người hiển thị")
+    @requires("database")
+    async def rating(self, interaction: discord.Interaction, limit: app_commands.Range[int, 5, 20] = 10):
+        await interaction.response.defer()
+        try:
+            records = await get_rating_ranking(interaction.guild.id, limit)
+            if not records:
+                await interaction.followup.send("Chưa có dữ liệu rating.")
+                return
+            
+            embed = discord.Embed(
+                title=f"🎯 Bảng xếp hạng kỹ năng - Top {limit} (Server: {interaction.guild.name})",
+                description="Rating = kỹ năng ước lượng - 3 × độ không chắc chắn (chơi càng nhiều càng chính xác)",
+                color=discord.Color.purple()
+            )
+            for i, record in enumerate(records, start=1):
+                medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+                # Tên lấy từ leaderboard mùa hiện tại; người chưa chơi mùa này thì lấy từ thành viên của server
+                # (tên field của embed không hiển thị mention nên không dùng <@id>)
+                member = interaction.guild.get_member(record["player_id"])
+                name = (member.display_name if member else None) or record["player_name"] or f"Người chơi {record['player_id']}"
+                embed.add_field(
+                    name=f"{medal} {name}",
+                    value=f"Rating: **{record['rating']:.1f}** (μ {record['mu']:.1f}, σ {record['sigma']:.1f}) | Số game: {record['games']}",
+                    inline=False
+                )
+            embed.set_footer(text=BOT_VERSION)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Error fetching ratings: {e}")
+            await interaction.followup.send(f"Lỗi khi lấy bảng xếp hạng kỹ năng: {str(e)[:100]}...")
+
+    @app_commands.command(name="seasons", description="Danh sách các mùa của bảng xếp hạng")
+    @requires("database")
+    async def seasons(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        try:
+            records = await get_seasons()
+            if not records:
+                await interaction.followup.send("Chưa có dữ liệu mùa.")
+                return
+            
+            lines = []
+            for record in records[:25]:
+                started = record["started_at"].strftime("%d/%m/%Y") if record["started_at"] else "?"
+                if record["ended_at"]:
+                    lines.append(f"**Mùa {record['season_id']}**: {started} - {record['ended_at'].strftime('%d/%m/%Y')}")
+                else:
+                    lines.append(f"**Mùa {record['season_id']}** (hiện tại): từ {started}")
+            embed = discord.Embed(
+                title="📅 Các mùa bảng xếp hạng",
+                description="\n".join(lines) + "\n\nDùng `/leaderboard season:<số>` để xem mùa đã kết thúc.",
+                color=discord.Color.gold()
+            )
+            embed.set_footer(text=BOT_VERSION)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Error fetching seasons: {e}")
+            await interaction.followup.send(f"Lỗi khi lấy danh sách mùa: {str(e)[:100]}...")
+    
+    @app_commands.command(name="new_season", description="Kết thúc mùa hiện tại và bắt đầu mùa mới (chỉ chủ bot)")
+    @requires("database")
+    async def new_season(self, interaction: discord.Interaction):
+        # Bảng xếp hạng dùng chung cho mọi server nên chỉ chủ bot được chuyển mùa
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("Chỉ chủ bot mới có thể bắt đầu mùa mới!", ephemeral=True)
+            return
+        
+        await interaction.response.defer(ephemeral=True)
+        try:
+            season_id = await rollover_season()
+            await interaction.followup.send(
+                f"✅ Đã bắt đầu mùa {season_id}. Bảng xếp hạng mùa {season_id - 1} được lưu trữ và xem lại bằng `/leaderboard season:{season_id - 1}`.",
+                ephemeral=True
+            )
+        except Exception as e:
+            logger.error(f"Error rolling over season: {e}")
+            await interaction.followup.send(f"Lỗi khi chuyển mùa: {str(e)[:100]}...", ephemeral=True)
+    
+    @app_commands.command(name="export", description="Xuất dữ liệu của server ra CSV/NDJSON (chỉ admin)")
+    @app_commands.describe(table="Dữ liệu cần xuất", format="Định dạng file")
+    @app_commands.choices(
+        table=[
+            app_commands.Choice(name="Bảng xếp hạng", value="leaderboard"),
+            app_commands.Choice(name="Lịch sử game", value="game_logs"),
+            app_commands.Choice(name="Người chơi từng game", value="participants")
+        ],
+        format=[
+            app_commands.Choice(name="CSV", value="csv"),
+            app_commands.Choice(name="NDJSON", value="ndjson")
+        ]
+    )
+    @requires("database")
+    async def export(self, interaction: discord.Interaction, table: str, format: str = "csv"):
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("Chỉ admin mới có thể xuất dữ liệu!", ephemeral=True)
+            return
+        
+        await interaction.response.defer(ephemeral=True)
+        path = None
+        try:
+            loop = asyncio.get_running_loop()
+            path, count = await loop.run_in_executor(None, export_table, table, format, interaction.guild.id)
+            size = os.path.getsize(path)
+            # Giới hạn file đính kèm phụ thuộc cấp boost của server; file lớn hơn phải xuất bằng dòng lệnh
+            if size > interaction.guild.filesize_limit:
+                logger.warning(f"File xuất {table} ({size} bytes) vượt giới hạn đính kèm")
+                await interaction.followup.send(
+                    f"File xuất ({count} dòng, {size / 1024 / 1024:.1f} MB) quá lớn để gửi. "
+                    f"Dùng `python -m utils.export {table} --format {format} --guild {interaction.guild.id}` trên máy chủ bot.",
+                    ephemeral=True
+                )
+                return
+            await interaction.followup.send(
+                f"✅ Đã xuất {count} dòng.",
+                file=discord.File(path, filename=f"{table}-{interaction.guild.id}.{format}"),
+                ephemeral=True
+            )
+        except Exception as e:
+            logger.error(f"Error exporting {table}: {e}")
+            await interaction.followup.send(f"Lỗi khi xuất dữ liệu: {str(e)[:100]}...", ephemeral=True)
+        finally:
+            if path and os.path.exists(path):
+                os.remove(path)
+    
+    @app_commands.command(name="history", description="Xem các game gần nhất của một người chơi")
+    @app_commands.describe(player="Người chơi cần xem", limit="Số game hiển thị")
+    @requires("database")
+    async def history(self, interaction: discord.Interaction, player: discord.Member,
+                      limit: app_commands.Range[int, 5, 20] = 10):
+        await interaction.response.defer()
+        try:
+            games = await get_player_history(interaction.guild.id, player.id, limit)
+            if not games:
+                await interaction.followup.send(f"{player.display_name} chưa chơi game nào trên server này.")
+                return
+            
+            wins = sum(1 for game in games if game["won"])
+            embed = discord.Embed(
+                title=f"📜 Lịch sử - {player.display_name}",
+                description=f"{len(games)} game gần nhất: thắng **{wins}**, thua **{len(games) - wins}**",
+                color=discord.Color.blue()
+            )
+            lines = []
+            for game in games:
+                result = "🏆 Thắng" if game["won"] else "❌ Thua"
+                status = "sống" if game["survived"] else "chết"
+                played_at = game["timestamp"].strftime("%d/%m/%Y") if game["timestamp"] else "?"
+                lines.append(f"`#{game['game_id']}` {played_at} - **{game['role']}** ({status}) - {result} - {game['players_count']} người")
+            embed.add_field(name="Các game", value="\n".join(lines)[:1024], inline=False)
+            embed.set_footer(text=BOT_VERSION)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Error fetching player history: {e}")
+            await interaction.followup.send(f"Lỗi khi lấy lịch sử người chơi: {str(e)[:100]}...")
+    
+    @stats.command(name="overview", description="Tổng quan các game đã chơi trên server")
+    @requires("database")
+    async def stats_overview(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        try:
+            overview = await get_overview(interaction.guild.id)
+            if not overview:
+                await interaction.followup.send("Chưa có dữ liệu thống kê.")
+                return
+            
+            embed = discord.Embed(title=f"📊 Thống kê - {interaction.guild.name}", color=discord.Color.blue())
+            embed.add_field(name="Số game", value=str(overview["games"]), inline=True)
+            embed.add_field(name="Tỉ lệ thắng", value=_win_rates(overview), inline=True)
+            embed.add_field(name="Độ dài trung bình", value=_average_length(overview), inline=True)
+            embed.set_footer(text=BOT_VERSION)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Error fetching stats overview: {e}")
+            await interaction.followup.send(f"Lỗi khi lấy dữ liệu thống kê: {str(e)[:100]}...")
+    
+    @stats.command(name="team_size", description="Tỉ lệ thắng và độ dài game theo số người chơi")
+    @requires("database")
+    async def stats_team_size(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        try:
+            rows = await get_team_size_stats(interaction.guild.id)
+            if not rows:
+                await interaction.followup.send("Chưa có dữ liệu thống kê.")
+                return
+            
+            embed = discord.Embed(title="📊 Thống kê theo số người chơi", color=discord.Color.blue())
+            for row in rows[:25]:
+                embed.add_field(
+                    name=f"{row['players_count']} người ({row['games']} game)",
+                    value=f"{_win_rates(row)}\n{_average_length(row)}",
+                    inline=True
+                )
+            embed.set_footer(text=BOT_VERSION)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Error fetching team size stats: {e}")
+            await interaction.followup.send(f"Lỗi khi lấy dữ liệu thống kê: {str(e)[:100]}...")
+    
+    @stats.command(name="roles", description="Tỉ lệ thắng và số lần bị giết của từng vai trò")
+    @requires("database")
+    async def stats_roles(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        try:
+            rows = await get_role_stats(interaction.guild.id)
+            if not rows:
+                await interaction.followup.send("Chưa có dữ liệu thống kê.")
+                return
+            
+            embed = discord.Embed(title="📊 Thống kê theo vai trò", description="Sắp xếp theo số lần chết", color=discord.Color.blue())
+            for row in rows[:25]:
+                appearances = row["appearances"] or 1
+                embed.add_field(
+                    name=f"{row['role']} ({row['appearances']} lần)",
+                    value=(f"Thắng: {row['wins'] * 100 / appearances:.0f}%\n"
+                           f"Chết: {row['deaths']} (bị treo: {row['voted_out']})"),
+                    inline=True
+                )
+            embed.set_footer(text=BOT_VERSION)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Error fetching role stats: {e}")
+            await interaction.followup.send(f"Lỗi khi lấy dữ liệu thống kê: {str(e)[:100]}...")
+    
+    @stats.command(name="role_mix", description="Các tổ hợp vai trò được chơi nhiều nhất")
+    @requires("database")
+    @app_commands.describe(limit="Số tổ hợp hiển thị")
+    async def stats_role_mix(self, interaction: discord.Interaction, limit: app_commands.Range[int, 1, 10] = 5):
+        await interaction.response.defer()
+        try:
+            rows = await get_role_mix_stats(interaction.guild.id, limit)
+            if not rows:
+                await interaction.followup.send("Chưa có dữ liệu thống kê.")
+                return
+            
+            embed = discord.Embed(title="📊 Tổ hợp vai trò phổ biến", color=discord.Color.blue())
+            for row in rows:
+                embed.add_field(
+                    name=f"{row['games']} game - {_average_length(row)}",
+                    value=f"{row['role_mix'][:900]}\n{_win_rates(row)}",
+                    inline=False
+                )
+            embed.set_footer(text=BOT_VERSION)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Error fetching role mix stats: {e}")
+            await interaction.followup.send(f"Lỗi khi lấy dữ liệu thống kê: {str(e)[:100]}...")
+
 async def setup(bot):
     await bot.add_cog(InfoCommands(bot))
\ No newline at end of file
@@ -0,0 +1,303 @@
+# utils/leaderboard_rebuild.py
+# Tính lại leaderboard từ lịch sử game (game_participants, mùa được giới hạn theo khoảng game_id): đọc theo luồng bằng server-side cursor,
+# tính điểm theo cột bằng NumPy (nếu có) và nạp vào bảng mới rồi đổi bảng trong một lệnh RENAME TABLE.
+# Bảng cũ được giữ lại là leaderboard_before_rebuild cho đến khi xóa bằng --drop-backup.
+#
+# Chạy: python -m utils.leaderboard_rebuild [--guild GUILD_ID] [--all-history] [--dry-run] [--drop-backup]
+
+import json
+import time
+import logging
+import argparse
+from array import array
+from typing import Dict, List, Optional, Set
+
+try:
+    import numpy as np
+except ImportError:  # NumPy là tùy chọn, không có thì dùng vòng lặp Python
+    np = None
+
+from db import (get_db_connection, invalidate_leaderboard_cache, SEASON_LOCK, LEADERBOARD_UPSERT,
+                SCORE_WIN_ALIVE, SCORE_WIN_DEAD, SCORE_LOSS)
+
+logger = logging.getLogger(__name__)
+
+FETCH_SIZE = 10000
+INSERT_BATCH = 1000
+BACKUP_TABLE = "leaderboard_before_rebuild"
+# Kết quả ghi vào ledger trước lúc bắt đầu đọc quá khoảng này chắc chắn đã có trong dữ liệu đọc được
+CATCH_UP_MARGIN_SECONDS = 300
+
+class ResultColumns:
+    """Kết quả lịch sử lưu theo cột (mảng số nguyên liền bộ nhớ), vai trò được mã hóa thành số"""
+
+    def __init__(self):
+        self.guild_ids = array("q")
+        self.player_ids = array("q")
+        self.role_codes = array("q")
+        self.won = array("b")
+        self.survived = array("b")
+        self.roles: List[str] = []
+        self._role_index: Dict[str, int] = {}
+        # Các game đã đọc, thời điểm bắt đầu đọc (giờ MySQL) và game_id đầu mùa: dùng để bù các game
+        # kết thúc trong lúc đang tính lại
+        self.game_ids: Set[int] = set()
+        self.read_at = None
+        self.first_game_id: Optional[int] = None
+
+    def append(self, game_id: int, guild_id: int, player_id: int, role: str, won: int, survived: int):
+        code = self._role_index.get(role)
+        if code is None:
+            code = self._role_index[role] = len(self.roles)
+            self.roles.append(role)
+        self.game_ids.add(game_id)
+        self.guild_ids.append(guild_id)
+        self.player_ids.append(player_id)
+        self.role_codes.append(code)
+        self.won.append(won)
+        self.survived.append(survived)
+
+    def __len__(self):
+        return len(self.player_ids)
+
+class PlayerTotals(dict):
+    """{(guild_id, player_id): [score, games, wins, role_counts, role_wins]}"""
+
+def _season_first_game(cursor) -> Optional[int]:
+    """game_id đầu tiên của mùa hiện tại (None với mùa đầu tiên: tính toàn bộ lịch sử)"""
+    cursor.execute("SELECT first_game_id FROM leaderboard_seasons WHERE ended_at IS NULL ORDER BY season_id DESC LIMIT 1")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def stream_results(guild_id: Optional[int] = None, all_history: bool = False) -> ResultColumns:
+    """
+    Đọc game_participants theo luồng (cursor không buffer, fetchmany) thành các cột
+
+    Args:
+        guild_id (int, optional): Chỉ đọc một guild
+        all_history (bool): Đọc cả các mùa đã kết thúc (mặc định chỉ mùa hiện tại)
+    """
+    columns = ResultColumns()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        first_game_id = None if all_history else _season_first_game(cursor)
+        cursor.execute("SELECT NOW()")
+        columns.read_at = cursor.fetchone()[0]
+        columns.first_game_id = first_game_id
+        cursor.close()
+
+        conditions, params = [], []
+        if guild_id is not None:
+            conditions.append("p.guild_id = %s")
+            params.append(guild_id)
+        if first_game_id is not None:
+            conditions.append("p.game_id >= %s")
+            params.append(first_game_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # Cursor không buffer: MySQL gửi dần từng phần, bộ nhớ phía Python chỉ giữ các cột số
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(f"""
+                SELECT p.game_id, p.guild_id, p.player_id, p.role, p.won, p.survived
+                FROM game_participants p
+                {where}
+            """, tuple(params))
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    columns.append(*row)
+        finally:
+            cursor.close()
+    return columns
+
+def _totals_numpy(columns: ResultColumns) -> PlayerTotals:
+    """Tính tổng theo người chơi bằng các phép toán vector (np.unique + np.bincount)"""
+    guild_ids = np.frombuffer(columns.guild_ids, dtype=np.int64)
+    player_ids = np.frombuffer(columns.player_ids, dtype=np.int64)
+    role_codes = np.frombuffer(columns.role_codes, dtype=np.int64)
+    won = np.frombuffer(columns.won, dtype=np.int8).astype(np.int64)
+    survived = np.frombuffer(columns.survived, dtype=np.int8).astype(np.int64)
+
+    points = np.where(won == 1, np.where(survived == 1, SCORE_WIN_ALIVE, SCORE_WIN_DEAD), SCORE_LOSS)
+    keys, inverse = np.unique(np.stack([guild_ids, player_ids], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    n_players = len(keys)
+    scores = np.bincount(inverse, weights=points, minlength=n_players).astype(np.int64)
+    games = np.bincount(inverse, minlength=n_players)
+    wins = np.bincount(inverse, weights=won, minlength=n_players).astype(np.int64)
+
+    # Bộ đếm theo vai trò: gộp (người chơi, vai trò) thành một khóa số rồi đếm
+    n_roles = max(len(columns.roles), 1)
+    pair_keys = inverse * n_roles + role_codes
+    role_counts = np.bincount(pair_keys, minlength=n_players * n_roles).reshape(n_players, n_roles)
+    role_wins = np.bincount(pair_keys, weights=won, minlength=n_players * n_roles).astype(np.int64).reshape(n_players, n_roles)
+
+    totals = PlayerTotals()
+    for i, (guild_id, player_id) in enumerate(keys.tolist()):
+        played = np.nonzero(role_counts[i])[0]
+        totals[(guild_id, player_id)] = [
+            int(scores[i]), int(games[i]), int(wins[i]),
+            {columns.roles[r]: int(role_counts[i, r]) for r in played},
+            {columns.roles[r]: int(role_wins[i, r]) for r in played}
+        ]
+    return totals
+
+def _totals_python(columns: ResultColumns) -> PlayerTotals:
+    """Cùng phép tính với _totals_numpy khi không có NumPy"""
+    totals = PlayerTotals()
+    for guild_id, player_id, code, won, survived in zip(columns.guild_ids, columns.player_ids,
+                                                         columns.role_codes, columns.won, columns.survived):
+        entry = totals.get((guild_id, player_id))
+        if entry is None:
+            entry = totals[(guild_id, player_id)] = [0, 0, 0, {}, {}]
+        role = columns.roles[code]
+        entry[0] += (SCORE_WIN_ALIVE if survived else SCORE_WIN_DEAD) if won else SCORE_LOSS
+        entry[1] += 1
+        entry[2] += won
+        entry[3][role] = entry[3].get(role, 0) + 1
+        entry[4][role] = entry[4].get(role, 0) + won
+    return totals
+
+def compute_totals(columns: ResultColumns) -> PlayerTotals:
+    if not len(columns):
+        return PlayerTotals()
+    return _totals_numpy(columns) if np is not None else _totals_python(columns)
+
+def _catch_up(cursor, columns: ResultColumns, guild_id: Optional[int]) -> int:
+    """
+    Cộng vào leaderboard_rebuild các kết quả đã vào ledger nhưng không có trong dữ liệu đã đọc
+    (game kết thúc trong lúc đang tính lại). Chạy khi đang khóa bảng nên không còn game nào kết thúc thêm.
+    """
+    conditions, params = ["applied_at >= %s - INTERVAL %s SECOND"], [columns.read_at, CATCH_UP_MARGIN_SECONDS]
+    if guild_id is not None:
+        conditions.append("guild_id = %s")
+        params.append(guild_id)
+    if columns.first_game_id is not None:
+        conditions.append("game_id >= %s")
+        params.append(columns.first_game_id)
+    cursor.execute(f"""
+        SELECT game_id, player_id, guild_id, role, points, won FROM leaderboard_ledger
+        WHERE {' AND '.join(conditions)}
+    """, tuple(params))
+    upsert = LEADERBOARD_UPSERT.replace("INSERT INTO leaderboard ", "INSERT INTO leaderboard_rebuild ", 1)
+    applied = 0
+    for game_id, player_id, row_guild_id, role, points, won in cursor.fetchall():
+        if game_id in columns.game_ids:
+            continue
+        role_path = '$."' + role.replace('"', '') + '"'
+        # Tên được cập nhật lại từ leaderboard ngay sau bước này
+        cursor.execute(upsert, (
+            row_guild_id, player_id, "Unknown Player", points, won, role, role, won,
+            role_path, role_path, role_path, role_path, won
+        ))
+        applied += 1
+    return applied
+
+def load_leaderboard(totals: PlayerTotals, columns: ResultColumns, guild_id: Optional[int] = None):
+    """
+    Nạp kết quả vào bảng leaderboard_rebuild rồi đổi với leaderboard bằng một lệnh RENAME TABLE.
+
+    Phần nạp lớn chạy khi chưa khóa. Bước cuối khóa leaderboard/ledger (LOCK TABLES, game kết thúc lúc đó
+    chờ đến khi đổi bảng xong), bù các game vừa kết thúc từ ledger, sao chép dòng của các guild khác
+    (khi chỉ tính lại một guild), lấy tên mới nhất rồi đổi bảng. RENAME TABLE dưới LOCK TABLES cần MySQL 8.0.13+.
+    Bảng cũ được giữ là leaderboard_before_rebuild để có thể đổi lại nếu kết quả sai.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (SEASON_LOCK, 10))
+            if cursor.fetchone()[0] != 1:
+                raise RuntimeError("Đang có một lần chuyển mùa/tính lại khác")
+            try:
+                cursor.execute("SHOW TABLES LIKE %s", (BACKUP_TABLE,))
+                if cursor.fetchone():
+                    raise RuntimeError(f"Bảng {BACKUP_TABLE} của lần tính lại trước vẫn còn, xóa bằng --drop-backup trước")
+
+                cursor.execute("DROP TABLE IF EXISTS leaderboard_rebuild")
+                cursor.execute("CREATE TABLE leaderboard_rebuild LIKE leaderboard")
+                rows = [
+                    (g, p, "Unknown Player", score, games, wins, json.dumps(counts), json.dumps(role_wins))
+                    for (g, p), (score, games, wins, counts, role_wins) in totals.items()
+                ]
+                for start in range(0, len(rows), INSERT_BATCH):
+                    cursor.executemany("""
+                        INSERT INTO leaderboard_rebuild (guild_id, player_id, player_name, score, games_played, wins, role_counts, role_wins)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """, rows[start:start + INSERT_BATCH])
+                conn.commit()
+
+                cursor.execute("LOCK TABLES leaderboard WRITE, leaderboard_rebuild WRITE, leaderboard_ledger READ")
+                try:
+                    caught_up = _catch_up(cursor, columns, guild_id)
+                    if guild_id is not None:
+                        cursor.execute("INSERT INTO leaderboard_rebuild SELECT * FROM leaderboard WHERE guild_id <> %s", (guild_id,))
+                    # Lịch sử game không lưu tên: lấy tên hiện tại từ leaderboard
+                    cursor.execute("""
+                        UPDATE leaderboard_rebuild JOIN leaderboard
+                            ON leaderboard.guild_id = leaderboard_rebuild.guild_id
+                            AND leaderboard.player_id = leaderboard_rebuild.player_id
+                        SET leaderboard_rebuild.player_name = leaderboard.player_name
+                    """)
+                    conn.commit()
+                    cursor.execute(f"RENAME TABLE leaderboard TO {BACKUP_TABLE}, leaderboard_rebuild TO leaderboard")
+                finally:
+                    cursor.execute("UNLOCK TABLES")
+                if caught_up:
+                    logger.info(f"Đã bù {caught_up} kết quả của các game kết thúc trong lúc tính lại")
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (SEASON_LOCK,))
+                cursor.fetchone()
+        finally:
+            cursor.close()
+    invalidate_leaderboard_cache()
+
+def drop_backup():
+    """Xóa bảng leaderboard cũ được giữ lại sau lần tính lại trước (khi đã kiểm tra kết quả mới)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {BACKUP_TABLE}")
+        finally:
+            cursor.close()
+
+def rebuild_leaderboard(guild_id: Optional[int] = None, all_history: bool = False, dry_run: bool = False) -> PlayerTotals:
+    """
+    Tính lại leaderboard (mùa hiện tại) từ game_participants theo luật điểm hiện hành
+
+    Args:
+        guild_id (int, optional): Chỉ tính lại một guild
+        all_history (bool): Tính cả các game của các mùa đã kết thúc
+        dry_run (bool): Chỉ tính, không ghi vào database
+    """
+    started = time.perf_counter()
+    columns = stream_results(guild_id, all_history)
+    read_done = time.perf_counter()
+    totals = compute_totals(columns)
+    compute_done = time.perf_counter()
+    if not dry_run:
+        load_leaderboard(totals, columns, guild_id)
+    logger.info(
+        f"Tính lại leaderboard: {len(columns)} lượt chơi, {len(totals)} người chơi "
+        f"(đọc {read_done - started:.2f}s, tính {compute_done - read_done:.2f}s "
+        f"[{'numpy' if np is not None else 'python'}], ghi {time.perf_counter() - compute_done:.2f}s)"
+    )
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tính lại leaderboard từ lịch sử game")
+    parser.add_argument("--guild", type=int, default=None, help="Chỉ tính lại một guild")
+    parser.add_argument("--all-history", action="store_true", help="Tính cả các game của các mùa đã kết thúc")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ tính và in kết quả, không ghi")
+    parser.add_argument("--drop-backup", action="store_true", help=f"Xóa bảng {BACKUP_TABLE} của lần tính lại trước rồi thoát")
+    args = parser.parse_args()
+    if args.drop_backup:
+        drop_backup()
+        print(f"Đã xóa {BACKUP_TABLE}")
+        raise SystemExit(0)
+    totals = rebuild_leaderboard(args.guild, args.all_history, args.dry_run)
+    if args.dry_run:
+        for (g, p), (score, games, wins, _, _) in sorted(totals.items(), key=lambda item: -item[1][0])[:20]:
+            print(f"{g}\t{p}\tđiểm={score}\tgame={games}\tthắng={wins}")
@@ -0,0 +1,152 @@
+# utils/log_pipeline.py
+# Logging không chặn event loop: record được đưa vào queue, một thread riêng ghi ra console và file JSON xoay vòng
+
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Optional
+
+# Ngữ cảnh game của task hiện tại (asyncio sao chép context khi tạo task con)
+_log_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+CONTEXT_FIELDS = ("guild_id", "game_id", "phase")
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(context)s%(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def bind_log_context(**fields):
+    """
+    Gắn guild_id/game_id/phase cho các log phát ra trong task hiện tại (và các task con tạo sau đó)
+
+    Ví dụ:
+        bind_log_context(guild_id=guild.id, phase="night")
+    """
+    context = dict(_log_context.get())
+    context.update({key: value for key, value in fields.items() if key in CONTEXT_FIELDS})
+    _log_context.set(context)
+
+def bind_game_context(game_state):
+    """Gắn ngữ cảnh log từ game_state (guild_id, game_id và phase hiện tại)"""
+    bind_log_context(
+        guild_id=game_state.get("guild_id"),
+        game_id=game_state.get("game_id"),
+        phase=game_state.get("phase")
+    )
+
+class ContextFilter(logging.Filter):
+    """Gắn ngữ cảnh game vào record ngay trong thread phát log (trước khi đưa vào queue)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        for key in CONTEXT_FIELDS:
+            if not hasattr(record, key):
+                setattr(record, key, context.get(key))
+        parts = [f"{key}={getattr(record, key)}" for key in CONTEXT_FIELDS if getattr(record, key) is not None]
+        record.context = f"[{' '.join(parts)}] " if parts else ""
+        return True
+
+_exception_formatter = logging.Formatter()
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler giữ traceback ở thuộc tính riêng (exc_formatted) thay vì gộp vào message như
+    QueueHandler.prepare mặc định, để file JSON có trường exc_info riêng
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        exc_formatted = None
+        if record.exc_info:
+            exc_formatted = _exception_formatter.formatException(record.exc_info)
+        elif record.exc_text:
+            exc_formatted = record.exc_text
+        record = copy.copy(record)
+        # Ghép args vào message ngay trong thread phát log (args có thể không an toàn khi dùng ở thread khác)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.exc_formatted = exc_formatted
+        return record
+
+class TextFormatter(logging.Formatter):
+    """Định dạng text cho console, thêm traceback từ exc_formatted"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        exc_formatted = getattr(record, "exc_formatted", None)
+        return f"{text}\n{exc_formatted}" if exc_formatted else text
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi record một dòng JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        exc_formatted = getattr(record, "exc_formatted", None)
+        if exc_formatted:
+            data["exc_info"] = exc_formatted
+        elif record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+def setup_logging(level: int = logging.INFO, log_file: str = "bot.log",
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+    """
+    Cấu hình root logger: QueueHandler trong thread phát log, QueueListener ghi ra
+    console (dạng text) và file xoay vòng theo dung lượng (dạng JSON)
+
+    Args:
+        level (int): Mức log của root logger
+        log_file (str): Đường dẫn file log
+        max_bytes (int): Dung lượng tối đa của một file trước khi xoay vòng
+        backup_count (int): Số file cũ được giữ lại
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(TextFormatter(TEXT_FORMAT))
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Ghi nốt các record còn trong queue và dừng thread ghi log"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -12,6 +12,13 @@ from discord.ext import commands
 from config import DISCORD_TOKEN, logger, game_states
 from db import init_database
 from utils.voice_manager import VoiceManager
+from utils.resource_sweeper import ResourceSweeper
+from utils.audio_cache import audio_cache
+from utils.readiness import readiness
+from utils.command_sync import sync_commands
+from utils.task_graph import Step, run_step_graph, failed_steps
+from views.persistent_views import register_persistent_views
+from constants import AUDIO_FILES
 
 # Khởi tạo bot với các intents cần thiết
 intents = discord.Intents.default()
@@ -20,39 +27,86 @@ intents.members = True
 intents.voice_states = True
 intents.guilds = True
 
-# Cờ đánh dấu đã đồng bộ lệnh
-COMMANDS_SYNCED = False
+# Task khởi động (tự thử lại các bước thất bại cho đến khi xong; on_ready không tạo task mới khi task cũ còn chạy)
+startup_task = None
+
+# Thời gian chờ giữa các lần thử lại bước khởi động thất bại (tăng gấp đôi, tối đa STARTUP_RETRY_MAX_DELAY giây)
+STARTUP_RETRY_DELAY = 5
+STARTUP_RETRY_MAX_DELAY = 300
 
 bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
 voice_manager = VoiceManager(bot)
 
+def get_live_game_states():
+    """Gộp game_states toàn cục với game_states của cog GameCommands"""
+    states = dict(game_states)
+    game_commands = bot.get_cog("GameCommands")
+    if game_commands:
+        states.update(game_commands.game_states)
+    return states
+
+resource_sweeper = ResourceSweeper(bot, get_live_game_states)
+
+async def init_database_step():
+    """Khởi tạo database trong executor để không chặn heartbeat của gateway"""
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(None, init_database):
+        raise RuntimeError("init_database thất bại")
+    logger.info("Database initialized")
+
+async def sync_commands_step():
+    """Đồng bộ commands với Discord (bỏ qua nếu command tree không đổi so với lần trước)"""
+    await sync_commands(bot)
+
+async def voice_manager_step():
+    """Thêm liên kết đến game_states cho voice_manager"""
+    voice_manager.set_game_states_reference(game_states)
+    logger.info("Voice Manager đã được khởi tạo với game_states")
+
+async def run_startup():
+    """
+    Chạy các bước khởi động song song, ngoài luồng on_ready. Mỗi bước đánh dấu
+    phụ thuộc tương ứng trong readiness để lệnh game chỉ chờ đúng thứ nó cần.
+    Bước thất bại (ví dụ MySQL chưa sẵn sàng) được thử lại với thời gian chờ tăng dần cho đến khi thành công.
+    """
+    steps = {
+        "database": init_database_step,
+        "commands": sync_commands_step,
+        "voice_manager": voice_manager_step
+    }
+    def tracked(name, func):
+        async def run():
+            try:
+                await func()
+            except Exception as e:
+                readiness.mark_failed(name, str(e))
+                raise
+            readiness.mark_ready(name)
+        return run
+    
+    delay = STARTUP_RETRY_DELAY
+    while True:
+        pending = {name: func for name, func in steps.items() if not readiness.is_ready(name)}
+        results = await run_step_graph({name: Step(tracked(name, func)) for name, func in pending.items()}, "startup")
+        logger.info(f"Trạng thái khởi động: {readiness.status()}")
+        failed = failed_steps(results)
+        if not failed:
+            return
+        logger.error(f"Khởi động chưa hoàn tất, thử lại sau {delay} giây: {', '.join(failed)}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, STARTUP_RETRY_MAX_DELAY)
+
 @bot.event
 async def on_ready():
-    """Event được gọi khi bot đăng nhập thành công"""
-    global COMMANDS_SYNCED
+    """Event được gọi khi bot đăng nhập thành công (cũng được gọi lại sau mỗi lần reconnect)"""
+    global startup_task
     
     logger.info(f"Bot đã sẵn sàng với tên {bot.user}")
     print(f"Bot đã sẵn sàng với tên {bot.user}")
     
-    # Hiển thị thông tin commands trước khi sync
-    print("Commands in tree before sync:")
-    for command in bot.tree.get_commands():
-        print(f"- {command.name}")
-        
-    # Khởi tạo cơ sở dữ liệu nếu cần
-    init_database()
-    logger.info("Database initialized")
-    
-    # Đồng bộ commands một lần duy nhất sau khi bot đã sẵn sàng
-    if not COMMANDS_SYNCED:
-        try:
-            await bot.tree.sync()
-            COMMANDS_SYNCED = True
-            logger.info("Command tree synced successfully")
-            print("Command tree synced successfully")
-        except Exception as e:
-            logger.error(f"Lỗi khi đồng bộ lệnh: {str(e)}")
-            print(f"Error syncing commands: {str(e)}")
+    # Khởi tạo database, đồng bộ lệnh và voice manager chạy nền; on_ready trả về ngay
+    if startup_task is None or startup_task.done():
+        startup_task = asyncio.create_task(run_startup())
     
     # Hiển thị thông tin kết nối
     guild_count = len(bot.guilds)
@@ -67,9 +121,11 @@ async def on_ready():
         )
     )
     
-    # Thêm liên kết đến game_states cho voice_manager
-    voice_manager.set_game_states_reference(game_states)
-    logger.info("Voice Manager đã được khởi tạo với game_states")
+    # Giải mã trước âm thanh các phase (chỉ chạy ffmpeg một lần cho mỗi file)
+    asyncio.create_task(audio_cache.preload(AUDIO_FILES.values()))
+    
+    # Dọn dẹp kênh/vai trò bị bỏ sót từ các game trước và lặp lại định kỳ
+    resource_sweeper.start()
 
 @bot.event
 async def on_guild_join(guild):
@@ -129,7 +185,8 @@ async def on_app_command_error(interaction: discord.Interaction, error):
         logger.error(f"Không thể phản hồi interaction: {str(e)}")
 
 @bot.tree.command(name="sync", description="Đồng bộ các lệnh slash (chỉ dành cho admin)")
-async def sync_command(interaction: discord.Interaction):
+@discord.app_commands.describe(force="Đồng bộ kể cả khi command tree không thay đổi")
+async def sync_command(interaction: discord.Interaction, force: bool = False):
     """Lệnh đồng bộ hóa các slash command thủ công"""
     # Kiểm tra quyền admin
     if not interaction.user.guild_permissions.administrator:
@@ -138,12 +195,13 @@ async def sync_command(interaction: discord.Interaction):
     
     try:
         await interaction.response.defer(ephemeral=True)
-        synced = await bot.tree.sync()
-        await interaction.followup.send(
-            f"✅ Đã đồng bộ {len(synced)} lệnh slash cho server này!",
-            ephemeral=True
-        )
-        logger.info(f"Đã đồng bộ lại {len(synced)} lệnh theo yêu cầu của {interaction.user}")
+        results = await sync_commands(bot, force=force)
+        lines = [
+            f"• {scope}: " + ("không thay đổi, bỏ qua" if count is None else f"đã đồng bộ {count} lệnh")
+            for scope, count in results.items()
+        ]
+        await interaction.followup.send("✅ Kết quả đồng bộ lệnh slash:\n" + "\n".join(lines), ephemeral=True)
+        logger.info(f"Đồng bộ lệnh theo yêu cầu của {interaction.user}: {results}")
     except Exception as e:
         await interaction.followup.send(f"Đã xảy ra lỗi: {str(e)}", ephemeral=True)
         logger.error(f"Lỗi khi đồng bộ lệnh theo yêu cầu: {str(e)}")
@@ -169,6 +227,9 @@ async def start_bot():
         # Tải các extensions trước
         await load_extensions()
         
+        # Đăng ký dispatcher cho các component của game (hoạt động cả sau khi bot khởi động lại)
+        register_persistent_views(bot)
+        
         # Chạy bot
         await bot.start(DISCORD_TOKEN)
         return True
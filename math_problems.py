@@ -0,0 +1,113 @@
+# utils/math_problems.py
+# Kho bài toán ban đêm được tạo sẵn cho mỗi game, không trùng lặp
+
+import random
+import logging
+from typing import Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+# Không gian bài toán (mọi bài đều có đáp án >= 100 nên không cần thử lại):
+# - Phép cộng: 100..999 + 100..999
+# - Phép trừ: 550..999 - 100..449
+OPERAND_MIN = 100
+OPERAND_MAX = 999
+ADD_SPAN = OPERAND_MAX - OPERAND_MIN + 1                  # 900
+SUB_LEFT_MIN, SUB_RIGHT_MAX = 550, 449
+SUB_LEFT_SPAN = OPERAND_MAX - SUB_LEFT_MIN + 1            # 450
+SUB_RIGHT_SPAN = SUB_RIGHT_MAX - OPERAND_MIN + 1          # 350
+ADD_SPACE = ADD_SPAN * ADD_SPAN
+PROBLEM_SPACE = ADD_SPACE + SUB_LEFT_SPAN * SUB_RIGHT_SPAN
+
+# Độ lệch của các phương án sai so với đáp án đúng
+DISTRACTOR_OFFSETS = [-100, -50, -10, 10, 50, 100]
+
+def build_problem(index: int) -> Dict:
+    """
+    Giải mã một chỉ số trong không gian bài toán thành bài toán kèm phương án
+
+    Args:
+        index (int): Chỉ số trong khoảng [0, PROBLEM_SPACE)
+
+    Returns:
+        dict: Bài toán với dạng {"problem": "123 + 456", "answer": 579, "options": [579, 589, 569]}
+    """
+    if index < ADD_SPACE:
+        num1, num2 = divmod(index, ADD_SPAN)
+        num1 += OPERAND_MIN
+        num2 += OPERAND_MIN
+        problem, answer = f"{num1} + {num2}", num1 + num2
+    else:
+        num1, num2 = divmod(index - ADD_SPACE, SUB_RIGHT_SPAN)
+        num1 += SUB_LEFT_MIN
+        num2 += OPERAND_MIN
+        problem, answer = f"{num1} - {num2}", num1 - num2
+
+    # Đáp án luôn >= 100 nên mọi phương án sai đều không âm và khác nhau
+    options = [answer] + [answer + offset for offset in random.sample(DISTRACTOR_OFFSETS, 2)]
+    random.shuffle(options)
+    return {"problem": problem, "answer": answer, "options": options}
+
+class MathProblemPool:
+    """
+    Kho bài toán của một game: chọn trước các chỉ số không lặp lại (lấy mẫu không hoàn lại)
+    khi game bắt đầu, mỗi đêm chỉ cần lấy ra O(1) mà không phải thử lại.
+    """
+
+    def __init__(self, size: int = 64):
+        self.size = max(1, size)
+        self.issued: Set[int] = set()
+        self.pending: List[int] = []
+        self._refill()
+
+    @classmethod
+    def for_players(cls, player_count: int) -> "MathProblemPool":
+        """Đủ cho mỗi người chơi một bài mỗi đêm (số đêm không vượt quá số người chơi)"""
+        return cls(size=max(16, player_count * player_count))
+
+    def _refill(self):
+        """Bổ sung các chỉ số chưa dùng (chỉ xảy ra khi game dài hơn dự kiến)"""
+        remaining = PROBLEM_SPACE - len(self.issued)
+        if remaining <= 0:
+            # Đã dùng hết không gian bài toán: bắt đầu một chu kỳ mới
+            self.issued.clear()
+            remaining = PROBLEM_SPACE
+
+        count = min(self.size, remaining)
+        if self.issued:
+            # Lấy mẫu trong phần chưa dùng bằng cách ánh xạ thứ hạng sang chỉ số thật
+            ranks = sorted(random.sample(range(remaining), count))
+            self.pending = self._ranks_to_indices(ranks, sorted(self.issued))
+            random.shuffle(self.pending)
+        else:
+            self.pending = random.sample(range(PROBLEM_SPACE), count)
+        logger.debug(f"Đã tạo sẵn {len(self.pending)} bài toán ban đêm")
+
+    @staticmethod
+    def _ranks_to_indices(ranks: List[int], used: List[int]) -> List[int]:
+        """Đổi thứ hạng trong tập chưa dùng thành chỉ số (ranks và used đã được sắp xếp)"""
+        indices = []
+        skipped = 0
+        for rank in ranks:
+            index = rank + skipped
+            while skipped < len(used) and used[skipped] <= index:
+                skipped += 1
+                index = rank + skipped
+            indices.append(index)
+        return indices
+
+    def draw(self) -> Dict:
+        """
+        Lấy bài toán tiếp theo, không trùng với bài nào đã phát trong game
+
+        Returns:
+            dict: {"problem": ..., "answer": ..., "options": [...]}
+        """
+        if not self.pending:
+            self._refill()
+        index = self.pending.pop()
+        self.issued.add(index)
+        return build_problem(index)
+
+    def __len__(self) -> int:
+        return len(self.pending)
@@ -0,0 +1,103 @@
+# utils/member_mutations.py
+# Gom các thay đổi vai trò, kênh voice và mute của thành viên thành một lần member.edit
+
+import discord
+import logging
+from typing import Dict, Iterable, Optional
+
+from utils.rate_limiter import scheduler
+
+logger = logging.getLogger(__name__)
+
+class MemberMutationBatch:
+    """
+    Thu thập trạng thái mong muốn (vai trò, kênh voice, mute) của từng thành viên trong một bước
+    của phase, sau đó áp dụng mỗi thành viên đúng một lần member.edit.
+
+    Ví dụ:
+        batch = MemberMutationBatch(guild, reason="Người chơi đã chết")
+        batch.update_roles(member, add=[dead_role], remove=[villager_role])
+        batch.move(member, main_channel)
+        await batch.apply()
+    """
+
+    def __init__(self, guild: discord.Guild, reason: Optional[str] = None):
+        self.guild = guild
+        self.reason = reason
+        self.members: Dict[int, discord.Member] = {}
+        self.changes: Dict[int, dict] = {}
+
+    def _entry(self, member: discord.Member) -> dict:
+        self.members[member.id] = member
+        return self.changes.setdefault(member.id, {})
+
+    def update_roles(self, member: discord.Member, add: Iterable[discord.Role] = (), remove: Iterable[discord.Role] = ()):
+        """Thêm/bớt vai trò, tính trên tập vai trò mong muốn hiện tại của thành viên"""
+        entry = self._entry(member)
+        roles = entry.get("roles")
+        if roles is None:
+            roles = {role.id: role for role in member.roles if not role.is_default()}
+        for role in remove:
+            if role:
+                roles.pop(role.id, None)
+        for role in add:
+            if role:
+                roles[role.id] = role
+        entry["roles"] = roles
+
+    def move(self, member: discord.Member, channel: Optional[discord.VoiceChannel]):
+        """Di chuyển thành viên sang kênh voice (chỉ áp dụng nếu đang ở trong voice)"""
+        self._entry(member)["voice_channel"] = channel
+
+    def set_mute(self, member: discord.Member, muted: bool):
+        """Đặt trạng thái server mute (chỉ áp dụng nếu đang ở trong voice)"""
+        self._entry(member)["mute"] = muted
+
+    def _build_kwargs(self, member: discord.Member, entry: dict) -> dict:
+        """Chỉ giữ lại những trường thực sự thay đổi"""
+        kwargs = {}
+
+        if "roles" in entry:
+            current = {role.id for role in member.roles if not role.is_default()}
+            if set(entry["roles"]) != current:
+                kwargs["roles"] = list(entry["roles"].values())
+
+        in_voice = member.voice is not None and member.voice.channel is not None
+        if in_voice:
+            channel = entry.get("voice_channel")
+            if channel is not None and member.voice.channel.id != channel.id:
+                kwargs["voice_channel"] = channel
+            if "mute" in entry and member.voice.mute != entry["mute"]:
+                kwargs["mute"] = entry["mute"]
+
+        return kwargs
+
+    async def apply(self) -> Dict[int, Optional[Exception]]:
+        """
+        Áp dụng tất cả thay đổi, song song và điều tiết qua bucket scheduler
+
+        Returns:
+            dict: {member_id: None nếu thành công hoặc exception nếu thất bại}
+        """
+        calls = []
+        for member_id, entry in self.changes.items():
+            member = self.members[member_id]
+            kwargs = self._build_kwargs(member, entry)
+            if kwargs:
+                calls.append((member, lambda m=member, kw=kwargs: m.edit(reason=self.reason, **kw)))
+
+        self.changes.clear()
+        if not calls:
+            return {}
+
+        results = await scheduler.gather(f"member_edit:{self.guild.id}", [call for _, call in calls])
+        outcome = {}
+        for (member, _), result in zip(calls, results):
+            if isinstance(result, Exception):
+                logger.error(f"Lỗi khi cập nhật thành viên {member.display_name} (ID={member.id}): {str(result)}")
+                outcome[member.id] = result
+            else:
+                outcome[member.id] = None
+
+        logger.debug("Đã áp dụng %d member.edit trong guild %s", len(calls), self.guild.id)
+        return outcome
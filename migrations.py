@@ -0,0 +1,331 @@
+# utils/migrations.py
+# Migration schema theo phiên bản: mỗi migration chạy đúng một lần, được ghi lại trong schema_version kèm checksum
+
+import json
+import hashlib
+import inspect
+import logging
+from typing import Callable, List, NamedTuple, Sequence, Union
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from config import DB_CONFIG
+from db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Khóa MySQL để hai tiến trình bot khởi động cùng lúc không chạy migration chồng lên nhau
+MIGRATION_LOCK = "masoi_schema_migration"
+MIGRATION_LOCK_TIMEOUT = 60
+
+# Mỗi bước là một câu SQL hoặc hàm nhận cursor (dùng cho migration cần kiểm tra/biến đổi dữ liệu)
+MigrationStep = Union[str, Callable]
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    steps: Sequence[MigrationStep]
+
+    @property
+    def checksum(self) -> str:
+        """sha256 của nội dung migration: phát hiện migration đã chạy nhưng bị sửa lại sau đó"""
+        digest = hashlib.sha256(f"{self.version}:{self.name}".encode("utf-8"))
+        for step in self.steps:
+            text = step if isinstance(step, str) else inspect.getsource(step)
+            digest.update(" ".join(text.split()).encode("utf-8"))
+        return digest.hexdigest()
+
+def _add_legacy_columns(cursor):
+    """Thêm các cột mà các bản cũ của bot chưa có (thay cho việc dò cột ở mỗi lần khởi động)"""
+    expected = {
+        "leaderboard": [
+            ("wins", "INT DEFAULT 0 AFTER games_played"),
+            ("role_counts", "TEXT DEFAULT '{}' AFTER wins"),
+            ("role_wins", "TEXT DEFAULT '{}' AFTER role_counts")
+        ],
+        "game_logs": [
+            ("winner", "VARCHAR(20) DEFAULT NULL AFTER log_message"),
+            ("players_count", "INT DEFAULT 0 AFTER timestamp"),
+            ("werewolves_count", "INT DEFAULT 0 AFTER players_count"),
+            ("villagers_count", "INT DEFAULT 0 AFTER werewolves_count"),
+            ("duration", "INT DEFAULT 0 AFTER villagers_count"),
+            ("players_data", "TEXT DEFAULT NULL AFTER duration")
+        ]
+    }
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ('leaderboard', 'game_logs')
+    """, (DB_CONFIG["database"],))
+    existing = {(row[0], row[1]) for row in cursor.fetchall()}
+    for table, columns in expected.items():
+        for column_name, column_def in columns:
+            if (table, column_name) not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_def}")
+                logger.info(f"Đã thêm cột {column_name} vào bảng {table}")
+
+def _backfill_analytics(cursor):
+    """
+    Nạp các game cũ trong game_logs vào bảng thống kê, cùng transaction với migration
+    (commit cùng dòng schema_version nên lỗi giữa chừng không để lại bảng thống kê nạp dở)
+    """
+    from utils.analytics import backfill_from_game_logs
+    cursor.execute("SELECT COUNT(*) FROM game_results")
+    if cursor.fetchone()[0] == 0:
+        backfill_from_game_logs(cursor)
+
+def _backfill_participants(cursor):
+    """Dựng game_participants từ players_data (JSON) của các game cũ trong game_logs"""
+    from db import PARTICIPANTS_INSERT, player_team, player_won
+    cursor.execute("""
+        SELECT id, guild_id, winner, players_data FROM game_logs
+        WHERE players_data IS NOT NULL AND winner IS NOT NULL
+    """)
+    rows = []
+    for game_id, guild_id, winner, players_data in cursor.fetchall():
+        try:
+            players = json.loads(players_data)
+        except (TypeError, ValueError):
+            continue
+        for user_id, data in players.items():
+            role = data.get("role", "Unknown")
+            rows.append((game_id, guild_id, int(user_id), role, player_team(role),
+                         int(player_won(role, winner)), int(data.get("status") in ["alive", "wounded"])))
+    # Ghi theo lô để không tạo một câu lệnh quá lớn
+    for start in range(0, len(rows), 1000):
+        cursor.executemany(PARTICIPANTS_INSERT, rows[start:start + 1000])
+    logger.info(f"Đã dựng game_participants cho {len(rows)} lượt chơi cũ")
+
+def _backfill_ratings(cursor):
+    """Phát lại các game cũ theo thứ tự thời gian để có rating ban đầu"""
+    from utils.rating import backfill_ratings
+    backfill_ratings(cursor)
+
+def _rating_table() -> str:
+    from utils.rating import RATING_TABLE
+    return RATING_TABLE
+
+def _analytics_tables() -> List[str]:
+    from utils.analytics import ANALYTICS_TABLES
+    return ANALYTICS_TABLES
+
+# Danh sách migration theo thứ tự. Chỉ thêm migration mới vào cuối, không sửa migration đã phát hành.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "leaderboard và game_logs", [
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            guild_id BIGINT NOT NULL,
+            player_id BIGINT NOT NULL,
+            player_name VARCHAR(255) NOT NULL,
+            score INT DEFAULT 0,
+            games_played INT DEFAULT 0,
+            wins INT DEFAULT 0,
+            role_counts TEXT DEFAULT '{}',
+            role_wins TEXT DEFAULT '{}',
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_guild_player (guild_id, player_id),
+            INDEX idx_guild_score (guild_id, score DESC)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS game_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            guild_id BIGINT NOT NULL,
+            log_message TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            winner VARCHAR(20) DEFAULT NULL,
+            players_count INT DEFAULT 0,
+            werewolves_count INT DEFAULT 0,
+            villagers_count INT DEFAULT 0,
+            duration INT DEFAULT 0,
+            players_data TEXT DEFAULT NULL,
+            INDEX idx_guild_time (guild_id, timestamp DESC)
+        )
+        """
+    ]),
+    # Cơ sở dữ liệu tạo từ các bản cũ có thể thiếu cột
+    Migration(2, "cột thống kê của leaderboard và game_logs", [_add_legacy_columns]),
+    Migration(3, "bảng thống kê", _analytics_tables()),
+    Migration(4, "nạp thống kê từ game_logs cũ", [_backfill_analytics]),
+    Migration(5, "bảng game_events", [
+        """
+        CREATE TABLE IF NOT EXISTS game_events (
+            game_id INT NOT NULL,
+            seq SMALLINT UNSIGNED NOT NULL,
+            kind TINYINT UNSIGNED NOT NULL,
+            offset_ms INT UNSIGNED NOT NULL,
+            night SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+            actor_id BIGINT DEFAULT NULL,
+            target_id BIGINT DEFAULT NULL,
+            data VARCHAR(255) DEFAULT NULL,
+            PRIMARY KEY (game_id, seq),
+            CONSTRAINT fk_game_events_game FOREIGN KEY (game_id) REFERENCES game_logs (id) ON DELETE CASCADE
+        )
+        """
+    ]),
+    # Các dòng "Đêm N: ..." do bản cũ ghi mỗi đêm (game mới ghi diễn biến vào game_events).
+    # Được chuyển nguyên vẹn sang game_logs_nights trước khi xóa khỏi game_logs, không mất dữ liệu cũ
+    Migration(6, "chuyển log từng đêm sang game_logs_nights", [
+        """
+        CREATE TABLE IF NOT EXISTS game_logs_nights (
+            id INT PRIMARY KEY,
+            guild_id BIGINT NOT NULL,
+            log_message TEXT NOT NULL,
+            timestamp DATETIME DEFAULT NULL,
+            INDEX idx_guild_time (guild_id, timestamp)
+        )
+        """,
+        """
+        INSERT IGNORE INTO game_logs_nights (id, guild_id, log_message, timestamp)
+        SELECT id, guild_id, log_message, timestamp FROM game_logs
+        WHERE winner IS NULL AND log_message LIKE 'Đêm %'
+        """,
+        """
+        DELETE g FROM game_logs g JOIN game_logs_nights n ON n.id = g.id
+        """
+    ]),
+    # Mỗi người chơi chỉ được cộng điểm một lần cho mỗi game
+    Migration(7, "leaderboard_ledger", [
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_ledger (
+            game_id INT NOT NULL,
+            player_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            role VARCHAR(32) NOT NULL,
+            points SMALLINT NOT NULL,
+            won TINYINT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (game_id, player_id)
+        )
+        """
+    ]),
+    Migration(8, "chỉ mục game_participants", [
+        """
+        CREATE TABLE IF NOT EXISTS game_participants (
+            game_id INT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            player_id BIGINT NOT NULL,
+            role VARCHAR(32) NOT NULL,
+            team VARCHAR(20) NOT NULL,
+            won TINYINT NOT NULL,
+            survived TINYINT NOT NULL,
+            PRIMARY KEY (game_id, player_id),
+            INDEX idx_guild_player_game (guild_id, player_id, game_id DESC)
+        )
+        """,
+        _backfill_participants
+    ]),
+    # Mùa hiện tại luôn là bảng leaderboard; mùa đã kết thúc trỏ tới bảng lưu trữ leaderboard_season_<id>
+    Migration(9, "leaderboard_seasons", [
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_seasons (
+            season_id INT PRIMARY KEY,
+            table_name VARCHAR(64) NOT NULL,
+            started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ended_at DATETIME DEFAULT NULL
+        )
+        """,
+        "INSERT IGNORE INTO leaderboard_seasons (season_id, table_name) VALUES (1, 'leaderboard')"
+    ]),
+    # Rating kỹ năng (mu/sigma) bên cạnh điểm leaderboard, không reset khi chuyển mùa
+    Migration(10, "player_ratings", [_rating_table(), _backfill_ratings]),
+    # Mùa được giới hạn theo game_id thay vì thời gian; mùa đầu tiên (first_game_id NULL) gồm toàn bộ lịch sử
+    # và started_at lấy theo game cũ nhất thay vì thời điểm chạy migration 9
+    Migration(11, "leaderboard_seasons.first_game_id", [
+        "ALTER TABLE leaderboard_seasons ADD COLUMN first_game_id INT DEFAULT NULL",
+        """
+        UPDATE leaderboard_seasons s
+        JOIN (SELECT MIN(timestamp) AS first_game FROM game_logs) g ON g.first_game IS NOT NULL
+        SET s.started_at = LEAST(s.started_at, g.first_game)
+        WHERE s.season_id = 1
+        """
+    ])
+]
+
+LATEST = MIGRATIONS[-1]
+
+def _current_version(cursor):
+    """(version, checksum) của migration mới nhất đã chạy, (0, None) nếu chưa có"""
+    try:
+        cursor.execute("SELECT version, checksum FROM schema_version ORDER BY version DESC LIMIT 1")
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        # Lần chạy đầu tiên (hoặc cơ sở dữ liệu tạo từ bản cũ chưa có migration)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        return 0, None
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+def _verify_applied(cursor):
+    """So checksum của các migration đã chạy với mã hiện tại (chỉ cảnh báo, không chạy lại)"""
+    cursor.execute("SELECT version, checksum FROM schema_version")
+    applied = dict(cursor.fetchall())
+    for migration in MIGRATIONS:
+        checksum = applied.get(migration.version)
+        if checksum and checksum != migration.checksum:
+            logger.warning(f"Migration {migration.version} ({migration.name}) đã bị sửa sau khi chạy (checksum khác)")
+
+def run_migrations() -> int:
+    """
+    Đưa schema lên phiên bản mới nhất (hàm đồng bộ, chạy trong executor)
+
+    Returns:
+        int: Phiên bản schema sau khi chạy
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            version, checksum = _current_version(cursor)
+            # Trường hợp thường gặp: schema đã mới nhất, chỉ tốn một lần đọc
+            if version == LATEST.version and checksum == LATEST.checksum:
+                logger.info(f"Schema đã ở phiên bản mới nhất ({version})")
+                return version
+
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+            if cursor.fetchone()[0] != 1:
+                raise RuntimeError("Không lấy được khóa migration (tiến trình khác đang chạy migration?)")
+            try:
+                # Đọc lại sau khi có khóa vì tiến trình khác có thể vừa chạy xong
+                version, _ = _current_version(cursor)
+                _verify_applied(cursor)
+                if version > LATEST.version:
+                    logger.warning(f"Schema ({version}) mới hơn mã hiện tại ({LATEST.version}), bỏ qua migration")
+                    return version
+
+                for migration in MIGRATIONS:
+                    if migration.version <= version:
+                        continue
+                    logger.info(f"Đang chạy migration {migration.version}: {migration.name}")
+                    try:
+                        for step in migration.steps:
+                            if isinstance(step, str):
+                                cursor.execute(step)
+                            else:
+                                step(cursor)
+                        cursor.execute(
+                            "INSERT INTO schema_version (version, name, checksum) VALUES (%s, %s, %s)",
+                            (migration.version, migration.name, migration.checksum)
+                        )
+                        conn.commit()
+                    except Exception:
+                        # Bỏ phần dữ liệu đã ghi của migration lỗi (DDL đã tự commit, nên dùng IF NOT EXISTS)
+                        conn.rollback()
+                        raise
+                    version = migration.version
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+                cursor.fetchone()
+
+            logger.info(f"Schema đã được cập nhật lên phiên bản {version}")
+            return version
+        finally:
+            cursor.close()
@@ -8,6 +8,10 @@ from typing import Dict, List, Optional
 
 from constants import GIF_URLS, AUDIO_FILES
 from utils.api_utils import play_audio, countdown, safe_send_message
+from utils.member_mutations import MemberMutationBatch
+from utils.perf import span
+from utils.log_pipeline import bind_game_context
+from utils.game_journal import EventKind, record_event
 from phases.voting import voting_phase
 
 logger = logging.getLogger(__name__)
@@ -26,7 +30,11 @@ async def morning_phase(interaction: discord.Interaction, game_state):
         
     # Đặt phase sớm để có thể kiểm tra ở các hàm khác
     game_state["phase"] = "morning"
+    bind_game_context(game_state)
+    record_event(game_state, EventKind.PHASE, data="morning")
     game_state["votes"].clear()  # Xóa phiếu bầu từ ngày trước
+    game_state["vote_tally"] = None
+    game_state["vote_board"] = None
     
     # Reset trạng thái vote skip nếu có
     game_state["skip_vote_active"] = False
@@ -42,9 +50,12 @@ async def morning_phase(interaction: discord.Interaction, game_state):
         logger.error("morning_phase: text_channel is None, cannot proceed")
         return
     
+    # Gom thay đổi vai trò/kênh voice của người chơi để áp dụng một lần cho mỗi người
+    batch = MemberMutationBatch(interaction.guild)
+    
     # Xử lý người bị nguyền từ đêm trước
     if game_state["demon_werewolf_cursed_player"] is not None:
-        await handle_cursed_player(interaction, game_state)
+        await handle_cursed_player(interaction, game_state, batch)
     
     try:
         # Thiết lập quyền chat cho người còn sống
@@ -52,18 +63,18 @@ async def morning_phase(interaction: discord.Interaction, game_state):
         villager_role = guild.get_role(game_state["villager_role_id"])
         if text_channel and villager_role:
             # Thiết lập quyền chat một lần cho toàn bộ channel thay vì từng người một
-            await text_channel.set_permissions(guild.default_role, send_messages=True)
-            await text_channel.set_permissions(villager_role, send_messages=True)
+            with span(game_state, "morning.permissions"):
+                await text_channel.set_permissions(guild.default_role, send_messages=True)
+                await text_channel.set_permissions(villager_role, send_messages=True)
             
-        # Di chuyển tất cả người chơi về main channel trong một coroutine
-        move_tasks = []
+        # Di chuyển tất cả người chơi về main channel (kèm vai trò mới của người bị nguyền)
         for user_id in game_state["players"]:
             member = game_state["member_cache"].get(user_id)
             if member and member.voice and member.voice.channel:
-                move_tasks.append(member.move_to(main_channel))
-                
-        if move_tasks:
-            await asyncio.gather(*move_tasks)
+                batch.move(member, main_channel)
+        
+        with span(game_state, "morning.move_players"):
+            await batch.apply()
             
         # Hiệu ứng và thông báo
         embed = discord.Embed(
@@ -104,13 +115,14 @@ async def morning_phase(interaction: discord.Interaction, game_state):
         if text_channel:
             await text_channel.send(f"Đã xảy ra lỗi trong pha sáng: {str(e)[:100]}...")
 
-async def handle_cursed_player(interaction: discord.Interaction, game_state):
+async def handle_cursed_player(interaction: discord.Interaction, game_state, batch: Optional[MemberMutationBatch] = None):
     """
     Xử lý người chơi đã bị nguyền bởi Sói Quỷ
     
     Args:
         interaction (discord.Interaction): Interaction gốc
         game_state (dict): Trạng thái game hiện tại
+        batch (MemberMutationBatch, optional): Batch để gom việc thêm vai trò Werewolf; nếu không có sẽ áp dụng ngay
     """
     cursed_id = game_state["demon_werewolf_cursed_player"]
     if cursed_id in game_state["players"] and game_state["players"][cursed_id]["status"] in ["alive", "wounded"]:
@@ -119,13 +131,19 @@ async def handle_cursed_player(interaction: discord.Interaction, game_state):
         
         # Chuyển đổi vai trò thành Werewolf
         game_state["players"][cursed_id]["role"] = "Werewolf"
+        record_event(game_state, EventKind.ROLE_CHANGED, actor=cursed_id, data="Werewolf")
+        if game_state.get("eligible_voters") is not None:
+            game_state["eligible_voters"].add(cursed_id)
         
         member = game_state["member_cache"].get(cursed_id)
         if member:
             # Thêm Discord Werewolf role
             werewolf_role = interaction.guild.get_role(game_state["werewolf_role_id"])
             if werewolf_role and werewolf_role not in member.roles:
-                await member.add_roles(werewolf_role)
+                if batch is not None:
+                    batch.update_roles(member, add=[werewolf_role])
+                else:
+                    await member.add_roles(werewolf_role)
             
             # Thông báo cho người bị nguyền
             embed = discord.Embed(
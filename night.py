@@ -7,8 +7,14 @@ import asyncio
 from typing import Dict, List, Optional
 
 from constants import GIF_URLS, AUDIO_FILES, VILLAGER_ROLES, WEREWOLF_ROLES, NO_NIGHT_ACTION_ROLES
-from utils.api_utils import play_audio, countdown, safe_send_message, generate_math_problem
+from utils.api_utils import play_audio, countdown, safe_send_message
+from utils.math_problems import MathProblemPool
+from utils.task_graph import Step, run_step_graph, failed_steps
+from utils.perf import span, traced
+from utils.log_pipeline import bind_game_context
+from utils.game_journal import EventKind, record_event
 from utils.role_utils import handle_player_death, get_player_team
+from utils.member_mutations import MemberMutationBatch
 
 logger = logging.getLogger(__name__)
 
@@ -27,31 +33,47 @@ async def night_phase(interaction: discord.Interaction, game_state):
     # Tăng số đêm và đặt phase
     game_state["phase"] = "night"
     game_state["night_count"] += 1
+    bind_game_context(game_state)
+    record_event(game_state, EventKind.PHASE, data="night")
     
-    # Gọi các hàm riêng biệt cho từng chức năng
-    await setup_night_permissions(interaction, game_state)  # Thiết lập quyền hạn đêm
-    await move_players_to_private_rooms(interaction, game_state)  # Di chuyển người chơi vào phòng riêng
-    await send_night_announcement(interaction, game_state)  # Gửi thông báo đêm
-    
-    # Reset các biến theo dõi hành động đêm
-    await reset_night_actions(game_state)
+    # Danh sách người chơi còn sống được tính một lần, dùng chung cho các bước bên dưới
+    from phases.voting import get_alive_players
+    alive_players = await get_alive_players(interaction, game_state)
     
-    # Gửi hành động đêm cho từng vai trò
-    await send_werewolf_actions(interaction, game_state)
-    await send_special_role_actions(interaction, game_state)
-    await send_math_problems(interaction, game_state)
+    # Bắt đầu đêm theo đồ thị phụ thuộc: các bước độc lập chạy song song,
+    # các bước gửi hành động chỉ cần chờ reset biến đêm (không chờ quyền hạn, di chuyển hay âm thanh)
+    with span(game_state, "night.start"):
+        results = await run_step_graph({
+            "permissions": Step(lambda: setup_night_permissions(interaction, game_state)),
+            "move_players": Step(lambda: move_players_to_private_rooms(interaction, game_state)),
+            "announcement": Step(lambda: send_night_announcement(interaction, game_state)),
+            "reset_actions": Step(lambda: reset_night_actions(game_state)),
+            "werewolf_actions": Step(lambda: send_werewolf_actions(interaction, game_state, alive_players), after=("reset_actions",)),
+            "special_role_actions": Step(lambda: send_special_role_actions(interaction, game_state, alive_players), after=("reset_actions",)),
+            "math_problems": Step(lambda: send_math_problems(interaction, game_state, alive_players), after=("reset_actions",))
+        }, name=f"night_start guild {interaction.guild.id}")
+    
+    failed = failed_steps(results)
+    if failed:
+        logger.warning(f"Night {game_state['night_count']} started with failed steps: {', '.join(failed)}")
     
     # Đếm ngược thời gian hành động đêm
     from config import TIMINGS
     await countdown(game_state["text_channel"], TIMINGS["night_action"], "hành động đêm", game_state)
     if not game_state["is_game_running"] or game_state["is_game_paused"]:
         return
+    
+    # Hết giờ giải toán: chốt tập người được tính phiếu cho ngày hôm sau
+    game_state.close_math_window()
         
     # Xử lý hành động Phù Thủy riêng biệt
     await process_witch_actions(interaction, game_state)
     
-    # Xử lý kết quả của tất cả hành động đêm
+    # Xử lý kết quả của tất cả hành động đêm (ghi hành động và thay đổi trạng thái vào journal)
+    record_night_actions(game_state)
+    statuses_before = {user_id: data["status"] for user_id, data in game_state["players"].items()}
     dead_players = await process_night_action_results(interaction, game_state)
+    record_status_changes(game_state, statuses_before)
     
     # Thông báo người chết
     await announce_night_deaths(interaction, game_state, dead_players)
@@ -66,6 +88,36 @@ async def night_phase(interaction: discord.Interaction, game_state):
     from phases.morning import morning_phase
     await morning_phase(interaction, game_state)
 
+def record_night_actions(game_state):
+    """Ghi các lựa chọn cuối cùng của đêm vào journal trước khi xử lý kết quả"""
+    def role_holder(role):
+        return next((uid for uid, d in game_state["players"].items() if d["role"] == role), 0)
+    
+    actions = [
+        ("Werewolf", 0, game_state["werewolf_target_id"]),
+        ("Guard", role_holder("Guard"), game_state["protected_player_id"]),
+        ("Seer", role_holder("Seer"), game_state["seer_target_id"]),
+        ("Hunter", role_holder("Hunter"), game_state["hunter_target_id"]),
+        ("Explorer", role_holder("Explorer"), game_state["explorer_target_id"])
+    ]
+    if game_state["witch_action_save"]:
+        actions.append(("Witch:save", role_holder("Witch"), game_state["witch_target_save_id"]))
+    if game_state["witch_action_kill"]:
+        actions.append(("Witch:kill", role_holder("Witch"), game_state["witch_target_kill_id"]))
+    if game_state["demon_werewolf_cursed_this_night"]:
+        actions.append(("Demon Werewolf", role_holder("Demon Werewolf"), game_state["demon_werewolf_cursed_player"]))
+    
+    for action, actor, target in actions:
+        if target:
+            record_event(game_state, EventKind.NIGHT_ACTION, actor=actor, target=target, data=action)
+
+def record_status_changes(game_state, statuses_before: Dict[int, str]):
+    """Ghi các thay đổi trạng thái (chết/bị thương) so với ảnh chụp trước đó"""
+    for user_id, data in game_state["players"].items():
+        if statuses_before.get(user_id) != data["status"]:
+            record_event(game_state, EventKind.STATUS, actor=user_id, data=data["status"])
+
+@traced("night.permissions")
 async def setup_night_permissions(interaction: discord.Interaction, game_state):
     """
     Thiết lập quyền hạn cho pha đêm
@@ -81,13 +133,16 @@ async def setup_night_permissions(interaction: discord.Interaction, game_state):
     # Thiết lập quyền cho kênh text: cấm chat cho @everyone và vai trò Dân Làng
     if text_channel and villager_role:
         try:
-            await text_channel.set_permissions(guild.default_role, send_messages=False)
-            await text_channel.set_permissions(villager_role, send_messages=False)
+            await asyncio.gather(
+                text_channel.set_permissions(guild.default_role, send_messages=False),
+                text_channel.set_permissions(villager_role, send_messages=False)
+            )
             logger.info("Set text channel permissions for night phase")
         except Exception as e:
             logger.error(f"Failed to set text channel permissions: {str(e)}")
             await text_channel.send(f"Lỗi: Không thể chặn chat trong kênh text: {str(e)}")
 
+@traced("night.move_players")
 async def move_players_to_private_rooms(interaction: discord.Interaction, game_state):
     """
     Di chuyển người chơi vào các phòng riêng
@@ -97,19 +152,18 @@ async def move_players_to_private_rooms(interaction: discord.Interaction, game_s
         game_state (dict): Trạng thái game hiện tại
     """
     # Di chuyển người chơi vào kênh riêng
-    move_tasks = []
+    batch = MemberMutationBatch(interaction.guild)
     for user_id, data in game_state["players"].items():
         if data["status"] in ["alive", "wounded"]:
             if user_id in game_state["player_channels"]:
                 member = game_state["member_cache"].get(user_id)
                 if member and member.voice:
-                    temp_channel = game_state["player_channels"][user_id]
-                    move_tasks.append(member.move_to(temp_channel))
+                    batch.move(member, game_state["player_channels"][user_id])
     
-    # Thực hiện tất cả task di chuyển cùng lúc
-    if move_tasks:
-        await asyncio.gather(*move_tasks, return_exceptions=True)
+    # Mỗi người chơi một lần member.edit, chạy song song
+    await batch.apply()
 
+@traced("night.announcement")
 async def send_night_announcement(interaction: discord.Interaction, game_state):
     """
     Gửi thông báo pha đêm
@@ -133,6 +187,7 @@ async def send_night_announcement(interaction: discord.Interaction, game_state):
     # Phát âm thanh đêm
     await play_audio(AUDIO_FILES["night"], game_state["voice_connection"])
 
+@traced("night.reset_actions")
 async def reset_night_actions(game_state):
     """
     Reset các biến theo dõi hành động đêm
@@ -149,6 +204,7 @@ async def reset_night_actions(game_state):
     game_state["explorer_target_id"] = None
     game_state["math_problems"] = {}
     game_state["math_results"] = {}
+    game_state["eligible_voters"] = None
     game_state["demon_werewolf_cursed_this_night"] = False    
     game_state["seer_target_id"] = None
     game_state["protected_player_id"] = None
@@ -173,13 +229,15 @@ async def reset_night_actions(game_state):
                 if member:
                     await member.send("Một Sói đã chết! Bạn có thể nguyền một người chơi trong đêm này hoặc các đêm tiếp theo.")
 
-async def send_werewolf_actions(interaction: discord.Interaction, game_state):
+@traced("night.dm_werewolf_actions")
+async def send_werewolf_actions(interaction: discord.Interaction, game_state, alive_players: Optional[List[discord.Member]] = None):
     """
     Gửi action view cho phe Sói
     
     Args:
         interaction (discord.Interaction): Interaction gốc
         game_state (dict): Trạng thái game hiện tại
+        alive_players (list, optional): Người chơi còn sống đã tính sẵn
     """
     wolf_channel = game_state["wolf_channel"]
     if not wolf_channel:
@@ -187,8 +245,9 @@ async def send_werewolf_actions(interaction: discord.Interaction, game_state):
         return
         
     # Lấy danh sách người chơi còn sống
-    from phases.voting import get_alive_players
-    alive_players = await get_alive_players(interaction, game_state)
+    if alive_players is None:
+        from phases.voting import get_alive_players
+        alive_players = await get_alive_players(interaction, game_state)
     
     # Gửi thông báo chung cho phe Sói trong wolf-chat
     from views.action_views import NightActionView
@@ -200,22 +259,26 @@ async def send_werewolf_actions(interaction: discord.Interaction, game_state):
         )
         await wolf_channel.send(
             embed=embed,
-            view=NightActionView("Werewolf", alive_players, game_state, 40)
+            view=NightActionView("Werewolf", alive_players, game_state)
         )
     except Exception as e:
         logger.error(f"Error sending werewolf action view: {str(e)}")
 
-async def send_special_role_actions(interaction: discord.Interaction, game_state):
+@traced("night.dm_special_role_actions")
+async def send_special_role_actions(interaction: discord.Interaction, game_state, alive_players: Optional[List[discord.Member]] = None):
     """
     Gửi action view cho các vai trò đặc biệt
     
     Args:
         interaction (discord.Interaction): Interaction gốc
         game_state (dict): Trạng thái game hiện tại
+        alive_players (list, optional): Người chơi còn sống đã tính sẵn
     """
     # Lấy danh sách người chơi còn sống
-    from phases.voting import get_alive_players
-    alive_players = await get_alive_players(interaction, game_state)
+    if alive_players is None:
+        from phases.voting import get_alive_players
+        alive_players = await get_alive_players(interaction, game_state)
+    alive_ids = {member.id for member in alive_players}
     
     # Import các view cần thiết
     from views.action_views import NightActionView, DetectiveSelectView, AssassinActionView
@@ -226,7 +289,7 @@ async def send_special_role_actions(interaction: discord.Interaction, game_state
             continue
             
         member = game_state["member_cache"].get(user_id)
-        if not member or member not in alive_players:
+        if not member or member.id not in alive_ids:
             continue
             
         try:
@@ -236,7 +299,7 @@ async def send_special_role_actions(interaction: discord.Interaction, game_state
                     description="Chọn một người để soi phe:",
                     color=discord.Color.purple()
                 )
-                await member.send(embed=embed, view=NightActionView("Seer", alive_players, game_state, 40))
+                await member.send(embed=embed, view=NightActionView("Seer", alive_players, game_state))
                 
             elif data["role"] == "Guard":
                 embed = discord.Embed(
@@ -244,7 +307,7 @@ async def send_special_role_actions(interaction: discord.Interaction, game_state
                     description="Chọn một người để bảo vệ:",
                     color=discord.Color.blue()
                 )
-                await member.send(embed=embed, view=NightActionView("Guard", alive_players, game_state, 40))
+                await member.send(embed=embed, view=NightActionView("Guard", alive_players, game_state))
                 
             elif data["role"] == "Hunter" and game_state["hunter_has_power"]:
                 embed = discord.Embed(
@@ -252,7 +315,7 @@ async def send_special_role_actions(interaction: discord.Interaction, game_state
                     description="Chọn một người để giết (chỉ một lần duy nhất):",
                     color=discord.Color.dark_orange()
                 )
-                await member.send(embed=embed, view=NightActionView("Hunter", alive_players, game_state, 40))
+                await member.send(embed=embed, view=NightActionView("Hunter", alive_players, game_state))
                 
             elif data["role"] == "Explorer" and game_state["night_count"] >= 2 and game_state.get("explorer_can_act", False):
                 embed = discord.Embed(
@@ -260,7 +323,7 @@ async def send_special_role_actions(interaction: discord.Interaction, game_state
                     description="Chọn một người để khám phá. Chọn đúng Sói, Sói chết; chọn sai, bạn chết:",
                     color=discord.Color.gold()
                 )
-                await member.send(embed=embed, view=NightActionView("Explorer", alive_players, game_state, 40))
+                await member.send(embed=embed, view=NightActionView("Explorer", alive_players, game_state))
                 
             elif data["role"] == "Demon Werewolf":
                 if game_state["demon_werewolf_activated"] and not game_state["demon_werewolf_has_cursed"]:
@@ -269,7 +332,7 @@ async def send_special_role_actions(interaction: discord.Interaction, game_state
                         description="Chọn một người để nguyền. Họ sẽ trở thành Sói vào đêm tiếp theo:",
                         color=discord.Color.dark_red()
                     )
-                    await member.send(embed=embed, view=NightActionView("Demon Werewolf", alive_players, game_state, 40))
+                    await member.send(embed=embed, view=NightActionView("Demon Werewolf", alive_players, game_state))
                 elif game_state["demon_werewolf_has_cursed"]:
                     await member.send("Bạn đã sử dụng chức năng nguyền! Không còn chức năng đặc biệt nữa.")
                 else:
@@ -309,17 +372,26 @@ async def send_special_role_actions(interaction: discord.Interaction, game_state
                 except Exception as e:
                     logger.error(f"Error sending Detective view to user {user_id}: {str(e)}")
 
-async def send_math_problems(interaction: discord.Interaction, game_state):
+@traced("night.dm_math_problems")
+async def send_math_problems(interaction: discord.Interaction, game_state, alive_players: Optional[List[discord.Member]] = None):
     """
     Gửi bài toán cho các vai trò cần giải toán
     
     Args:
         interaction (discord.Interaction): Interaction gốc
         game_state (dict): Trạng thái game hiện tại
+        alive_players (list, optional): Người chơi còn sống đã tính sẵn
     """
     # Lấy danh sách người chơi còn sống
-    from phases.voting import get_alive_players
-    alive_players = await get_alive_players(interaction, game_state)
+    if alive_players is None:
+        from phases.voting import get_alive_players
+        alive_players = await get_alive_players(interaction, game_state)
+    alive_ids = {member.id for member in alive_players}
+    
+    # Kho bài toán được tạo khi game bắt đầu (tạo bù nếu game cũ chưa có)
+    math_pool = game_state.get("math_pool")
+    if math_pool is None:
+        math_pool = game_state["math_pool"] = MathProblemPool.for_players(len(game_state["players"]))
     
     # Gửi bài toán cho các vai không có hành động đêm
     for user_id, data in game_state["players"].items():
@@ -327,15 +399,14 @@ async def send_math_problems(interaction: discord.Interaction, game_state):
             continue
             
         member = game_state["member_cache"].get(user_id)
-        if not member or member not in alive_players:
+        if not member or member.id not in alive_ids:
             continue
             
         try:
             # Tạo và gửi bài toán
             from views.action_views import NightMathView
-            from utils.api_utils import generate_math_problem
             
-            math_problem = await generate_math_problem(game_state["math_problems"])
+            math_problem = math_pool.draw()
             game_state["math_problems"][user_id] = math_problem
             
             options_str = "\n".join([f"{i+1}. {opt}" for i, opt in enumerate(math_problem["options"])])
@@ -352,7 +423,7 @@ async def send_math_problems(interaction: discord.Interaction, game_state):
             
             await member.send(
                 embed=embed,
-                view=NightMathView(user_id, math_problem["options"], math_problem["answer"], game_state)
+                view=NightMathView(math_problem["options"], game_state)
             )
             
         except discord.errors.Forbidden:
@@ -364,6 +435,7 @@ async def send_math_problems(interaction: discord.Interaction, game_state):
             logger.error(f"Error sending math problem to user {user_id}: {str(e)}")
             game_state["math_results"][user_id] = True
 
+@traced("night.witch_actions")
 async def process_witch_actions(interaction: discord.Interaction, game_state):
     """
     Xử lý hành động của Phù Thủy
@@ -466,7 +538,7 @@ async def process_witch_actions(interaction: discord.Interaction, game_state):
                     )
                     await witch_member.send(
                         embed=embed,
-                        view=WitchActionView(alive_players, potential_targets, game_state, timeout=20)
+                        view=WitchActionView(alive_players, potential_targets, game_state)
                     )
                     logger.info(f"Sent Witch notification with targets: {target_names}")
                 else:
@@ -477,7 +549,7 @@ async def process_witch_actions(interaction: discord.Interaction, game_state):
                     )
                     await witch_member.send(
                         embed=embed,
-                        view=WitchActionView(alive_players, [], game_state, timeout=20)
+                        view=WitchActionView(alive_players, [], game_state)
                     )
                     logger.info(f"Sent Witch notification: no targets")
             except Exception as e:
@@ -490,6 +562,7 @@ async def process_witch_actions(interaction: discord.Interaction, game_state):
     if not game_state["is_game_running"] or game_state["is_game_paused"]:
         return
 
+@traced("night.resolve_actions")
 async def process_night_action_results(interaction: discord.Interaction, game_state):
     """
     Xử lý kết quả các hành động đêm
@@ -723,6 +796,7 @@ async def process_night_action_results(interaction: discord.Interaction, game_st
     
     return dead_players
 
+@traced("night.announce_deaths")
 async def announce_night_deaths(interaction: discord.Interaction, game_state, dead_players):
     """
     Thông báo người chết sau pha đêm
@@ -748,10 +822,6 @@ async def announce_night_deaths(interaction: discord.Interaction, game_state, de
         death_embed.set_image(url=GIF_URLS["death"])
         await text_channel.send(embed=death_embed)
         logger.info(f"Announced deaths: {dead_players}")
-        
-        # Thêm vào log game
-        from db import save_game_log
-        await save_game_log(interaction.guild.id, f"Đêm {game_state['night_count']}: {', '.join(dead_players)} đã chết.")
     else:
         no_death_embed = discord.Embed(
             title="💀 Thông Báo Người Ra Đi",
@@ -760,11 +830,8 @@ async def announce_night_deaths(interaction: discord.Interaction, game_state, de
         )
         await text_channel.send(embed=no_death_embed)
         logger.info("No deaths announced")
-        
-        # Thêm vào log game
-        from db import save_game_log
-        await save_game_log(interaction.guild.id, f"Đêm {game_state['night_count']}: Không ai chết.")
 
+@traced("night.restore_permissions")
 async def restore_permissions(interaction: discord.Interaction, game_state):
     """
     Khôi phục quyền hạn sau pha đêm
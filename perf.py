@@ -0,0 +1,153 @@
+# utils/perf.py
+# Đo thời gian từng bước của các pha game (span) theo guild/game và thống kê p50/p95 qua các game gần đây
+
+import time
+import inspect
+import logging
+import functools
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+class Span(NamedTuple):
+    """Một bước đã đo: thời điểm bắt đầu (tính từ đầu game) và thời lượng, đơn vị giây"""
+    name: str
+    offset: float
+    duration: float
+    ok: bool = True
+
+class GameTimeline:
+    """Các span của một game, theo thứ tự kết thúc"""
+
+    def __init__(self, guild_id: Optional[int], game_id=None, max_spans: int = 2000):
+        self.guild_id = guild_id
+        self.game_id = game_id
+        self.started_at = time.perf_counter()
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def record(self, name: str, start: float, duration: float, ok: bool = True):
+        self.spans.append(Span(name, start - self.started_at, duration, ok))
+
+    def format(self) -> str:
+        """Timeline dạng văn bản để ghi log"""
+        lines = [f"Timeline game {self.game_id or '-'} (guild {self.guild_id}), {len(self.spans)} span:"]
+        for span in sorted(self.spans, key=lambda s: s.offset):
+            status = "" if span.ok else " [lỗi]"
+            lines.append(f"  +{span.offset:8.2f}s  {span.duration * 1000:9.1f}ms  {span.name}{status}")
+        return "\n".join(lines)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile theo nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))  # ceil
+    return sorted_values[int(rank) - 1]
+
+class PerfRegistry:
+    """Giữ timeline của các game gần đây để báo cáo qua /perf"""
+
+    def __init__(self, max_games: int = 50):
+        self.recent: Deque[GameTimeline] = deque(maxlen=max_games)
+
+    def timeline(self, game_state) -> GameTimeline:
+        """Lấy (hoặc tạo) timeline của game hiện tại"""
+        timeline = game_state.get("perf_timeline")
+        if timeline is None:
+            timeline = GameTimeline(game_state.get("guild_id"), game_state.get("game_id"))
+            game_state["perf_timeline"] = timeline
+        return timeline
+
+    def start_game(self, game_state) -> GameTimeline:
+        """Bắt đầu timeline mới cho game (game trước chưa kết thúc đúng cách sẽ được lưu lại)"""
+        self.finish_game(game_state)
+        return self.timeline(game_state)
+
+    def finish_game(self, game_state):
+        """Ghi timeline của game vào log và lưu lại để thống kê"""
+        timeline = game_state.get("perf_timeline")
+        if timeline is None:
+            return
+        game_state["perf_timeline"] = None
+        if not timeline.spans:
+            return
+        self.recent.append(timeline)
+        logger.info(timeline.format())
+
+    def report(self, guild_id: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Thống kê thời lượng từng bước qua các game gần đây
+
+        Args:
+            guild_id (int, optional): Chỉ tính các game của guild này
+
+        Returns:
+            dict: {tên bước: {"count", "p50", "p95", "max"}} (đơn vị giây)
+        """
+        samples: Dict[str, List[float]] = {}
+        for timeline in self.recent:
+            if guild_id is not None and timeline.guild_id != guild_id:
+                continue
+            for span in timeline.spans:
+                samples.setdefault(span.name, []).append(span.duration)
+
+        report = {}
+        for name, values in samples.items():
+            values.sort()
+            report[name] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": values[-1]
+            }
+        return report
+
+# Registry dùng chung cho toàn bộ bot
+perf = PerfRegistry()
+
+@contextmanager
+def span(game_state, name: str):
+    """
+    Đo thời gian một bước của pha game
+
+    Ví dụ:
+        with span(game_state, "night.move_players"):
+            await batch.apply()
+    """
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        if game_state is not None:
+            perf.timeline(game_state).record(name, start, time.perf_counter() - start, ok)
+
+def record_value(game_state, name: str, seconds: float):
+    """Ghi một giá trị thời gian đã đo sẵn (ví dụ độ trễ của đếm ngược)"""
+    if game_state is not None:
+        perf.timeline(game_state).record(name, time.perf_counter(), seconds)
+
+def traced(name: str):
+    """
+    Decorator đo thời gian một hàm async có tham số game_state
+
+    Ví dụ:
+        @traced("night.send_math_problems")
+        async def send_math_problems(interaction, game_state): ...
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        if "game_state" not in signature.parameters:
+            raise TypeError(f"{func.__name__} không có tham số game_state để gắn span")
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            game_state = signature.bind_partial(*args, **kwargs).arguments.get("game_state")
+            with span(game_state, name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
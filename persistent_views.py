@@ -0,0 +1,186 @@
+# views/persistent_views.py
+# Điều phối các component của game theo custom_id (không lưu View/game_state trong bộ nhớ)
+
+import discord
+import logging
+import re
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from utils.log_pipeline import bind_game_context, bind_log_context
+
+logger = logging.getLogger(__name__)
+
+# custom_id: mw<b|s>:<kind>:<guild_id>:<phase>:<night>:<role>:<extra>
+# (b = button, s = select; discord.py phân biệt dynamic item theo template nên mỗi loại cần prefix riêng)
+CUSTOM_ID_BODY = r"(?P<kind>[a-z]+):(?P<guild_id>\d+):(?P<phase>[a-z]+):(?P<night>\d+):(?P<role>[a-z]+):(?P<extra>[\w.\-]*)"
+BUTTON_TEMPLATE = r"mwb:" + CUSTOM_ID_BODY
+SELECT_TEMPLATE = r"mws:" + CUSTOM_ID_BODY
+
+# Mã ngắn của vai trò thực hiện hành động (custom_id tối đa 100 ký tự)
+ROLE_CODES = {
+    "Villager": "villager",
+    "Werewolf": "wolf",
+    "Seer": "seer",
+    "Guard": "guard",
+    "Witch": "witch",
+    "Hunter": "hunter",
+    "Tough Guy": "tough",
+    "Illusionist": "illusionist",
+    "Wolfman": "wolfman",
+    "Explorer": "explorer",
+    "Demon Werewolf": "demon",
+    "Assassin Werewolf": "assassin",
+    "Detective": "detective",
+    "Any": "any"
+}
+ROLE_NAMES = {code: role for role, code in ROLE_CODES.items()}
+
+class Route(NamedTuple):
+    """Thông tin định tuyến được mã hóa trong custom_id"""
+    kind: str
+    guild_id: int
+    phase: str
+    night: int
+    role: str
+    extra: str = ""
+
+    def custom_id(self, prefix: str) -> str:
+        return f"{prefix}:{self.kind}:{self.guild_id}:{self.phase}:{self.night}:{ROLE_CODES[self.role]}:{self.extra}"
+
+    def with_kind(self, kind: str, extra: str = "") -> "Route":
+        return self._replace(kind=kind, extra=extra)
+
+    @classmethod
+    def from_match(cls, match: re.Match) -> "Route":
+        return cls(
+            kind=match["kind"],
+            guild_id=int(match["guild_id"]),
+            phase=match["phase"],
+            night=int(match["night"]),
+            role=ROLE_NAMES.get(match["role"], "Any"),
+            extra=match["extra"]
+        )
+
+    @classmethod
+    def for_game(cls, kind: str, game_state, role: str = "Any", extra: str = "") -> "Route":
+        """Tạo route cho phase hiện tại của game"""
+        guild_id = game_state.get("guild_id") or game_state["text_channel"].guild.id
+        return cls(kind, guild_id, game_state["phase"], game_state["night_count"], role, extra)
+
+Handler = Callable[[discord.Interaction, object, Route, List[str]], Awaitable[None]]
+HANDLERS: Dict[str, Handler] = {}
+
+def route_handler(kind: str):
+    """Decorator đăng ký hàm xử lý cho một loại component"""
+    def decorator(func: Handler) -> Handler:
+        if kind in HANDLERS:
+            raise ValueError(f"Handler cho '{kind}' đã được đăng ký")
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+def get_game_state(client, guild_id: int):
+    """Tìm game_state của guild từ cog GameCommands (hoặc game_states toàn cục)"""
+    game_commands = client.get_cog("GameCommands")
+    if game_commands and guild_id in game_commands.game_states:
+        return game_commands.game_states[guild_id]
+    from config import game_states
+    return game_states.get(guild_id)
+
+async def close_components(interaction: discord.Interaction):
+    """Gỡ các component khỏi message sau khi người chơi đã hành động"""
+    try:
+        await interaction.message.edit(view=None)
+    except discord.errors.NotFound:
+        logger.warning(f"Message not found when closing components for interaction_id={interaction.id}")
+    except Exception as e:
+        logger.warning(f"Không thể gỡ component của message: {str(e)}")
+
+async def dispatch(interaction: discord.Interaction, route: Route, values: List[str]):
+    """
+    Định tuyến một interaction tới handler tương ứng sau khi kiểm tra route còn hiệu lực
+
+    Args:
+        interaction (discord.Interaction): Interaction của component
+        route (Route): Route giải mã từ custom_id
+        values (list): Giá trị đã chọn (với select menu)
+    """
+    handler = HANDLERS.get(route.kind)
+    if handler is None:
+        logger.warning(f"Không có handler cho component kind={route.kind}")
+        await interaction.response.send_message("Hành động không hợp lệ!", ephemeral=True)
+        return
+
+    game_state = get_game_state(interaction.client, route.guild_id)
+    bind_log_context(guild_id=route.guild_id, phase=route.phase)
+    if game_state:
+        bind_game_context(game_state)
+    if (not game_state or not game_state["is_game_running"]
+            or game_state["phase"] != route.phase or game_state["night_count"] != route.night):
+        await interaction.response.send_message("Hành động này đã hết hạn!", ephemeral=True)
+        await close_components(interaction)
+        return
+
+    if game_state["is_game_paused"]:
+        await interaction.response.send_message("Game đang tạm dừng, không thể thực hiện hành động!", ephemeral=True)
+        return
+
+    try:
+        await handler(interaction, game_state, route, values)
+    except Exception as e:
+        logger.error(f"Lỗi khi xử lý component kind={route.kind}, guild={route.guild_id}: {str(e)}")
+        if not interaction.response.is_done():
+            await interaction.response.send_message("Đã xảy ra lỗi khi xử lý hành động!", ephemeral=True)
+
+class GameButton(discord.ui.DynamicItem[discord.ui.Button], template=BUTTON_TEMPLATE):
+    """Button của game, được định tuyến bằng custom_id"""
+
+    def __init__(self, route: Route, label: str, style: discord.ButtonStyle = discord.ButtonStyle.primary, disabled: bool = False):
+        super().__init__(discord.ui.Button(label=label, style=style, custom_id=route.custom_id("mwb"), disabled=disabled))
+        self.route = route
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: re.Match):
+        return cls(Route.from_match(match), label=item.label, style=item.style)
+
+    async def callback(self, interaction: discord.Interaction):
+        await dispatch(interaction, self.route, [])
+
+class GameSelect(discord.ui.DynamicItem[discord.ui.Select], template=SELECT_TEMPLATE):
+    """Select menu của game, được định tuyến bằng custom_id"""
+
+    def __init__(self, route: Route, options: Optional[List[discord.SelectOption]] = None, placeholder: Optional[str] = None,
+                 min_values: int = 1, max_values: int = 1, disabled: bool = False):
+        super().__init__(discord.ui.Select(
+            custom_id=route.custom_id("mws"),
+            options=options or [],
+            placeholder=placeholder,
+            min_values=min_values,
+            max_values=max_values,
+            disabled=disabled
+        ))
+        self.route = route
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match: re.Match):
+        return cls(Route.from_match(match), options=item.options, placeholder=item.placeholder,
+                   min_values=item.min_values, max_values=item.max_values)
+
+    async def callback(self, interaction: discord.Interaction):
+        await dispatch(interaction, self.route, interaction.data.get("values", []))
+
+class GameComponentView(discord.ui.View):
+    """View chỉ dùng để gửi các GameButton/GameSelect"""
+
+    def __init__(self):
+        super().__init__(timeout=None)
+        # Đánh dấu đã kết thúc để discord.py không lưu view này theo message:
+        # interaction được định tuyến qua dynamic item đã đăng ký, không cần giữ view trong bộ nhớ
+        self.stop()
+
+def register_persistent_views(bot):
+    """Đăng ký dispatcher một lần khi khởi động (import các module view để handler được đăng ký)"""
+    import views.action_views  # noqa: F401
+    import views.voting_views  # noqa: F401
+    bot.add_dynamic_items(GameButton, GameSelect)
+    logger.info(f"Đã đăng ký {len(HANDLERS)} handler cho component của game")
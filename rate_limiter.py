@@ -0,0 +1,106 @@
+# utils/rate_limiter.py
+# Điều phối các API call theo bucket để tránh chạm giới hạn tốc độ của Discord
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Token bucket đơn giản: tối đa `rate` lời gọi trong mỗi `per` giây"""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Chờ cho tới khi có token để thực hiện một lời gọi"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                elapsed = now - self.updated_at
+                self.updated_at = now
+                self.tokens = min(self.rate, self.tokens + elapsed * self.rate / self.per)
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+class BucketScheduler:
+    """
+    Chạy các coroutine song song nhưng được điều tiết theo từng bucket
+
+    Mỗi bucket tương ứng với một nhóm route của Discord (ví dụ "member_edit:<guild_id>"),
+    nên các thao tác khác loại không phải chờ lẫn nhau.
+    """
+
+    def __init__(self, default_rate: int = 5, default_per: float = 1.0):
+        self.default_rate = default_rate
+        self.default_per = default_per
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def configure(self, bucket: str, rate: int, per: float):
+        """Thiết lập giới hạn riêng cho một bucket"""
+        self.buckets[bucket] = TokenBucket(rate, per)
+
+    def _get_bucket(self, bucket: str) -> TokenBucket:
+        if bucket not in self.buckets:
+            self.buckets[bucket] = TokenBucket(self.default_rate, self.default_per)
+        return self.buckets[bucket]
+
+    async def run(self, bucket: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Chờ token của bucket rồi thực hiện lời gọi
+
+        Args:
+            bucket (str): Tên bucket
+            func (callable): Hàm trả về coroutine cần thực hiện
+
+        Returns:
+            Any: Kết quả của coroutine
+        """
+        await self._get_bucket(bucket).acquire()
+        return await func()
+
+    async def gather(self, bucket: str, funcs: Iterable[Callable[[], Awaitable[Any]]]) -> List[Any]:
+        """
+        Thực hiện nhiều lời gọi cùng bucket song song, trả về kết quả hoặc exception của từng lời gọi
+
+        Args:
+            bucket (str): Tên bucket
+            funcs (iterable): Các hàm trả về coroutine
+
+        Returns:
+            list: Kết quả theo đúng thứ tự đầu vào
+        """
+        return await asyncio.gather(*(self.run(bucket, func) for func in funcs), return_exceptions=True)
+
+    async def run_batches(self, bucket: str, funcs: List[Callable[[], Awaitable[Any]]], batch_size: int = 5, pause: float = 1.0) -> List[Any]:
+        """
+        Thực hiện lời gọi theo từng đợt, nghỉ giữa các đợt (dùng cho tác vụ nền không gấp)
+
+        Args:
+            bucket (str): Tên bucket
+            funcs (list): Các hàm trả về coroutine
+            batch_size (int): Số lời gọi mỗi đợt
+            pause (float): Thời gian nghỉ giữa các đợt (giây)
+
+        Returns:
+            list: Kết quả theo đúng thứ tự đầu vào
+        """
+        results = []
+        for start in range(0, len(funcs), batch_size):
+            if start > 0:
+                await asyncio.sleep(pause)
+            results.extend(await self.gather(bucket, funcs[start:start + batch_size]))
+        return results
+
+# Scheduler dùng chung cho toàn bộ bot
+scheduler = BucketScheduler()
@@ -0,0 +1,211 @@
+# utils/rating.py
+# Xếp hạng kỹ năng kiểu TrueSkill (hai đội: bên thắng và bên thua), cập nhật tăng dần sau mỗi game.
+# Mỗi người chơi có mu (kỹ năng ước lượng) và sigma (độ không chắc chắn); bảng xếp hạng dùng
+# rating = mu - 3*sigma (ước lượng thận trọng) được lưu sẵn trong cột có chỉ mục.
+#
+# Dựng lại từ lịch sử: python -m utils.rating [--guild GUILD_ID]
+
+import math
+import logging
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from db import get_db_connection, execute_async_query
+
+logger = logging.getLogger(__name__)
+
+MU = 25.0
+SIGMA = MU / 3
+BETA = SIGMA / 2      # độ dao động phong độ trong một game
+TAU = SIGMA / 100     # nhiễu cộng thêm mỗi game để sigma không tiến về 0
+MIN_SIGMA = 0.5
+FETCH_SIZE = 10000
+INSERT_BATCH = 1000
+
+RATING_TABLE = """
+    CREATE TABLE IF NOT EXISTS player_ratings (
+        guild_id BIGINT NOT NULL,
+        player_id BIGINT NOT NULL,
+        mu DOUBLE NOT NULL,
+        sigma DOUBLE NOT NULL,
+        rating DOUBLE NOT NULL,
+        games INT NOT NULL DEFAULT 0,
+        last_game_id INT DEFAULT NULL,
+        PRIMARY KEY (guild_id, player_id),
+        INDEX idx_guild_rating (guild_id, rating DESC)
+    )
+"""
+
+RATING_UPSERT = """
+    INSERT INTO player_ratings (guild_id, player_id, mu, sigma, rating, games, last_game_id)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE mu = VALUES(mu), sigma = VALUES(sigma), rating = VALUES(rating),
+        games = VALUES(games), last_game_id = VALUES(last_game_id)
+"""
+
+# (mu, sigma, số game)
+Rating = Tuple[float, float, int]
+
+def conservative(mu: float, sigma: float) -> float:
+    return mu - 3 * sigma
+
+def _pdf(x: float) -> float:
+    return math.exp(-x * x / 2) / math.sqrt(2 * math.pi)
+
+def _cdf(x: float) -> float:
+    return (1 + math.erf(x / math.sqrt(2))) / 2
+
+def rate_game(winners: List[Rating], losers: List[Rating]) -> Tuple[List[Rating], List[Rating]]:
+    """
+    Cập nhật rating của hai đội sau một game (không hòa). Chi phí tỉ lệ với số người chơi của game.
+
+    Returns:
+        tuple: (rating mới của bên thắng, rating mới của bên thua) theo đúng thứ tự đầu vào
+    """
+    if not winners or not losers:
+        return winners, losers
+    variances_w = [sigma * sigma + TAU * TAU for _, sigma, _ in winners]
+    variances_l = [sigma * sigma + TAU * TAU for _, sigma, _ in losers]
+    n = len(winners) + len(losers)
+    c = math.sqrt(sum(variances_w) + sum(variances_l) + n * BETA * BETA)
+    t = (sum(mu for mu, _, _ in winners) - sum(mu for mu, _, _ in losers)) / c
+    # v: mức dịch chuyển mu, w: mức giảm phương sai; kết quả càng bất ngờ (t âm) thì cả hai càng lớn
+    v = _pdf(t) / max(_cdf(t), 1e-12)
+    w = v * (v + t)
+
+    def update(team, variances, sign):
+        updated = []
+        for (mu, _, games), variance in zip(team, variances):
+            mu += sign * variance / c * v
+            sigma = math.sqrt(max(variance * (1 - variance / (c * c) * w), MIN_SIGMA * MIN_SIGMA))
+            updated.append((mu, sigma, games + 1))
+        return updated
+
+    return update(winners, variances_w, 1), update(losers, variances_l, -1)
+
+def apply_game_ratings(cursor, game_id: int, guild_id: int, players: List[Dict]) -> int:
+    """
+    Cập nhật rating cho người chơi của một game bằng cursor của transaction ghi kết quả game
+    (db._ingest_game_result chỉ gọi ở lần ghi kết quả đầu tiên nên không bị cộng trùng).
+    Một lần đọc FOR UPDATE và một executemany, không phụ thuộc số game đã chơi.
+
+    Args:
+        players (list): Danh sách người chơi như trong update_all_player_stats (user_id, win)
+
+    Returns:
+        int: Số người chơi được cập nhật (0 nếu không có bên thắng hoặc không có bên thua)
+    """
+    winners = [p["user_id"] for p in players if p["win"]]
+    losers = [p["user_id"] for p in players if not p["win"]]
+    if not winners or not losers:
+        return 0
+    placeholders = ", ".join(["%s"] * len(players))
+    cursor.execute(
+        f"SELECT player_id, mu, sigma, games FROM player_ratings WHERE guild_id = %s AND player_id IN ({placeholders}) FOR UPDATE",
+        (guild_id, *[p["user_id"] for p in players])
+    )
+    current = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+    new_winners, new_losers = rate_game(
+        [current.get(player_id, (MU, SIGMA, 0)) for player_id in winners],
+        [current.get(player_id, (MU, SIGMA, 0)) for player_id in losers]
+    )
+    cursor.executemany(RATING_UPSERT, [
+        (guild_id, player_id, mu, sigma, conservative(mu, sigma), games, game_id)
+        for player_id, (mu, sigma, games) in zip(winners + losers, new_winners + new_losers)
+    ])
+    return len(players)
+
+def replay_ratings(rows: Iterable[Tuple[int, int, int, int]]) -> Dict[Tuple[int, int], Tuple[float, float, int, int]]:
+    """
+    Phát lại lịch sử theo thứ tự thời gian
+
+    Args:
+        rows: (game_id, guild_id, player_id, won) đã sắp theo game_id
+
+    Returns:
+        dict: {(guild_id, player_id): (mu, sigma, games, last_game_id)}
+    """
+    ratings: Dict[Tuple[int, int], Tuple[float, float, int, int]] = {}
+
+    def finish(game_id, guild_id, game_players):
+        winners = [player_id for player_id, won in game_players if won]
+        losers = [player_id for player_id, won in game_players if not won]
+        if not winners or not losers:
+            return
+        lookup = lambda player_id: ratings.get((guild_id, player_id), (MU, SIGMA, 0, None))[:3]
+        new_winners, new_losers = rate_game([lookup(p) for p in winners], [lookup(p) for p in losers])
+        for player_id, (mu, sigma, games) in zip(winners + losers, new_winners + new_losers):
+            ratings[(guild_id, player_id)] = (mu, sigma, games, game_id)
+
+    current_game, current_guild, game_players = None, None, []
+    for game_id, guild_id, player_id, won in rows:
+        if game_id != current_game:
+            if game_players:
+                finish(current_game, current_guild, game_players)
+            current_game, current_guild, game_players = game_id, guild_id, []
+        game_players.append((player_id, won))
+    if game_players:
+        finish(current_game, current_guild, game_players)
+    return ratings
+
+def _stream(cursor, query: str, params: tuple):
+    cursor.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+def backfill_ratings(cursor, guild_id: Optional[int] = None) -> int:
+    """
+    Dựng lại player_ratings từ game_participants theo thứ tự game_id (thứ tự thời gian).
+    Dùng trong migration và khi chạy module này từ dòng lệnh; commit do bên gọi đảm nhiệm.
+
+    Returns:
+        int: Số người chơi có rating
+    """
+    where, params = ("WHERE guild_id = %s", (guild_id,)) if guild_id is not None else ("", ())
+    ratings = replay_ratings(_stream(cursor, f"""
+        SELECT game_id, guild_id, player_id, won FROM game_participants {where}
+        ORDER BY game_id, player_id
+    """, params))
+    cursor.execute(f"DELETE FROM player_ratings {where}", params)
+    rows = [
+        (g, p, mu, sigma, conservative(mu, sigma), games, last_game_id)
+        for (g, p), (mu, sigma, games, last_game_id) in ratings.items()
+    ]
+    for start in range(0, len(rows), INSERT_BATCH):
+        cursor.executemany(RATING_UPSERT, rows[start:start + INSERT_BATCH])
+    logger.info(f"Đã dựng lại rating cho {len(rows)} người chơi")
+    return len(rows)
+
+async def get_rating_ranking(guild_id: int, limit: int = 10) -> List[Dict]:
+    """
+    Người chơi có rating cao nhất của guild (đọc theo chỉ mục (guild_id, rating)).
+    player_name chỉ có với người đã chơi trong mùa hiện tại, bên gọi tự bổ sung tên cho người còn lại.
+    """
+    rows, _ = await execute_async_query("""
+        SELECT r.player_id, r.mu, r.sigma, r.rating, r.games, l.player_name
+        FROM player_ratings r
+        LEFT JOIN leaderboard l ON l.guild_id = r.guild_id AND l.player_id = r.player_id
+        WHERE r.guild_id = %s
+        ORDER BY r.rating DESC
+        LIMIT %s
+    """, (int(guild_id), limit), fetch=True)
+    return rows or []
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dựng lại rating kỹ năng từ lịch sử game")
+    parser.add_argument("--guild", type=int, default=None, help="Chỉ dựng lại một guild")
+    args = parser.parse_args()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            count = backfill_ratings(cursor, args.guild)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    print(f"Đã dựng lại rating cho {count} người chơi")
@@ -0,0 +1,97 @@
+# utils/readiness.py
+# Theo dõi các phụ thuộc khởi động (database, đồng bộ lệnh, voice manager) để lệnh chỉ chờ đúng thứ nó cần
+
+import asyncio
+import logging
+import functools
+from typing import Dict, Iterable, List, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+class Readiness:
+    """Trạng thái sẵn sàng của từng phụ thuộc: chưa xong, sẵn sàng hoặc thất bại"""
+
+    def __init__(self):
+        self.events: Dict[str, asyncio.Event] = {}
+        self.errors: Dict[str, str] = {}
+
+    def _event(self, name: str) -> asyncio.Event:
+        if name not in self.events:
+            self.events[name] = asyncio.Event()
+        return self.events[name]
+
+    def mark_ready(self, name: str):
+        self.errors.pop(name, None)
+        self._event(name).set()
+        logger.info(f"Phụ thuộc '{name}' đã sẵn sàng")
+
+    def mark_failed(self, name: str, error: str):
+        """Đánh dấu thất bại: lệnh phụ thuộc trả lời ngay thay vì chờ hết thời gian"""
+        self.errors[name] = error
+        self._event(name).clear()
+        logger.error(f"Phụ thuộc '{name}' khởi tạo thất bại: {error}")
+
+    def is_ready(self, name: str) -> bool:
+        return self._event(name).is_set()
+
+    def missing(self, names: Iterable[str]) -> List[str]:
+        return [name for name in names if not self.is_ready(name)]
+
+    async def wait(self, names: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """
+        Chờ các phụ thuộc sẵn sàng
+
+        Returns:
+            bool: True nếu tất cả đã sẵn sàng, False nếu hết thời gian hoặc có phụ thuộc thất bại
+        """
+        pending = self.missing(names)
+        if not pending:
+            return True
+        if any(name in self.errors for name in pending):
+            return False
+        try:
+            await asyncio.wait_for(asyncio.gather(*(self._event(name).wait() for name in pending)), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def status(self) -> Dict[str, str]:
+        """Trạng thái từng phụ thuộc để hiển thị/ghi log"""
+        return {
+            name: "ready" if event.is_set() else ("failed" if name in self.errors else "pending")
+            for name, event in self.events.items()
+        }
+
+# Trạng thái dùng chung cho toàn bộ bot
+readiness = Readiness()
+
+def requires(*dependencies: str, timeout: float = 2.0):
+    """
+    Decorator cho lệnh slash: chờ tối đa timeout giây (dưới hạn 3 giây của interaction)
+    cho các phụ thuộc, nếu chưa sẵn sàng thì báo người dùng thử lại. Đặt ngoài handle_interaction.
+
+    Ví dụ:
+        @app_commands.command(name="start_game", ...)
+        @requires("database")
+        @handle_interaction
+        async def start_game(self, interaction): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, interaction: discord.Interaction, *args, **kwargs):
+            if not await readiness.wait(dependencies, timeout):
+                missing = readiness.missing(dependencies)
+                logger.warning(f"Từ chối /{func.__name__}: chưa sẵn sàng {', '.join(missing)}")
+                try:
+                    await interaction.response.send_message(
+                        f"⏳ Bot đang khởi động (chưa sẵn sàng: {', '.join(missing)}). Vui lòng thử lại sau ít giây.",
+                        ephemeral=True
+                    )
+                except Exception as e:
+                    logger.error(f"Không thể phản hồi interaction: {str(e)}")
+                return None
+            return await func(self, interaction, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,191 @@
+# utils/resource_sweeper.py
+# Dọn dẹp các kênh và vai trò game bị bỏ sót khi end_game thất bại giữa chừng
+
+import discord
+import asyncio
+import logging
+import traceback
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Set
+
+from constants import GAME_ROLE_NAMES, GAME_TEXT_CHANNEL_NAMES, PLAYER_CHANNEL_PREFIX
+from utils.rate_limiter import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Màu của các vai trò được tạo trong start_game_logic
+GAME_ROLE_COLORS = {
+    "Villager": discord.Color.green(),
+    "Dead": discord.Color.greyple(),
+    "Werewolf": discord.Color.red()
+}
+
+def collect_live_resource_ids(game_states) -> Set[int]:
+    """
+    Lấy ID các kênh và vai trò đang được sử dụng bởi game còn chạy
+
+    Args:
+        game_states (dict): {guild_id: GameState}
+
+    Returns:
+        set: Tập ID của kênh và vai trò không được phép xóa
+    """
+    live_ids = set()
+    for game_state in game_states.values():
+        if not game_state.get("is_game_running") and not game_state.get("reset_in_progress"):
+            continue
+
+        for key in ["villager_role_id", "dead_role_id", "werewolf_role_id"]:
+            if game_state.get(key):
+                live_ids.add(game_state.get(key))
+
+        for key in ["wolf_channel", "dead_channel"]:
+            channel = game_state.get(key)
+            if channel:
+                live_ids.add(channel.id)
+
+        for channel in (game_state.get("player_channels") or {}).values():
+            if channel:
+                live_ids.add(channel.id)
+    return live_ids
+
+def _is_old_enough(obj, min_age: float) -> bool:
+    """Bỏ qua tài nguyên vừa tạo (game có thể đang được khởi tạo)"""
+    age = (datetime.now(timezone.utc) - obj.created_at).total_seconds()
+    return age >= min_age
+
+def _is_bot_private_channel(channel, guild: discord.Guild) -> bool:
+    """Kênh do bot tạo luôn có overwrite riêng cho bot và ẩn với @everyone"""
+    overwrites = channel.overwrites
+    if guild.me not in overwrites or guild.default_role not in overwrites:
+        return False
+    return overwrites[guild.default_role].read_messages is False
+
+def find_orphaned_resources(guild: discord.Guild, live_ids: Set[int], min_age: float = 600) -> Dict[str, List]:
+    """
+    Tìm các kênh và vai trò game không còn gắn với game nào đang chạy
+
+    Args:
+        guild (discord.Guild): Guild cần kiểm tra
+        live_ids (set): ID tài nguyên đang được sử dụng
+        min_age (float): Tuổi tối thiểu (giây) để tài nguyên được coi là bị bỏ sót
+
+    Returns:
+        dict: {"channels": [...], "roles": [...]}
+    """
+    channels = []
+    for channel in guild.voice_channels:
+        # Kênh riêng còn người (không di chuyển được khi game kết thúc) được giữ đến khi trống
+        if (channel.id not in live_ids and channel.name.startswith(PLAYER_CHANNEL_PREFIX)
+                and not any(not m.bot for m in channel.members)
+                and _is_bot_private_channel(channel, guild) and _is_old_enough(channel, min_age)):
+            channels.append(channel)
+
+    for channel in guild.text_channels:
+        if (channel.id not in live_ids and channel.name in GAME_TEXT_CHANNEL_NAMES
+                and _is_bot_private_channel(channel, guild) and _is_old_enough(channel, min_age)):
+            channels.append(channel)
+
+    roles = []
+    for role in guild.roles:
+        if role.id in live_ids or role.name not in GAME_ROLE_NAMES:
+            continue
+        if role.managed or role.is_default() or role >= guild.me.top_role:
+            continue
+        if role.color != GAME_ROLE_COLORS[role.name] or not _is_old_enough(role, min_age):
+            continue
+        roles.append(role)
+
+    return {"channels": channels, "roles": roles}
+
+async def sweep_guild(guild: discord.Guild, live_ids: Set[int], min_age: float = 600, batch_size: int = 5) -> Dict[str, List[str]]:
+    """
+    Xóa các tài nguyên game bị bỏ sót trong một guild theo từng đợt
+
+    Returns:
+        dict: Tên các kênh và vai trò đã xóa
+    """
+    orphans = find_orphaned_resources(guild, live_ids, min_age)
+    report = {"channels": [], "roles": []}
+    bucket = f"resource_delete:{guild.id}"
+
+    for kind in ["channels", "roles"]:
+        items = orphans[kind]
+        if not items:
+            continue
+
+        results = await scheduler.run_batches(
+            bucket,
+            [lambda item=item: item.delete(reason="DeWolfVie orphaned game resource") for item in items],
+            batch_size=batch_size
+        )
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Không thể xóa {item.name} (ID={item.id}) trong guild {guild.id}: {str(result)}")
+            else:
+                report[kind].append(item.name)
+
+    if report["channels"] or report["roles"]:
+        logger.info(
+            f"Resource sweeper: guild {guild.id} đã xóa {len(report['channels'])} kênh "
+            f"({', '.join(report['channels'])}) và {len(report['roles'])} vai trò ({', '.join(report['roles'])})"
+        )
+    return report
+
+class ResourceSweeper:
+    """Chạy dọn dẹp tài nguyên game bị bỏ sót lúc khởi động và theo chu kỳ"""
+
+    def __init__(self, bot, get_game_states: Callable[[], dict], interval: float = 1800, min_age: float = 600):
+        self.bot = bot
+        self.get_game_states = get_game_states
+        self.interval = interval
+        self.min_age = min_age
+        self.task = None
+
+    def start(self):
+        """Bắt đầu task dọn dẹp (gọi lại nhiều lần không tạo thêm task)"""
+        if self.task and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._sweep_loop())
+        logger.debug("Đã bắt đầu task resource sweeper")
+
+    def stop(self):
+        """Dừng task dọn dẹp"""
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+    async def sweep_all(self) -> Dict[int, Dict[str, List[str]]]:
+        """
+        Dọn dẹp tất cả guild mà bot đang tham gia
+
+        Returns:
+            dict: {guild_id: report} cho các guild có tài nguyên bị xóa
+        """
+        live_ids = collect_live_resource_ids(self.get_game_states())
+        reports = {}
+        for guild in self.bot.guilds:
+            try:
+                report = await sweep_guild(guild, live_ids, self.min_age)
+                if report["channels"] or report["roles"]:
+                    reports[guild.id] = report
+            except Exception as e:
+                logger.error(f"Lỗi khi dọn dẹp tài nguyên trong guild {guild.id}: {str(e)}")
+
+        total_channels = sum(len(r["channels"]) for r in reports.values())
+        total_roles = sum(len(r["roles"]) for r in reports.values())
+        logger.info(f"Resource sweeper hoàn tất: đã xóa {total_channels} kênh và {total_roles} vai trò trong {len(reports)} guild")
+        return reports
+
+    async def _sweep_loop(self):
+        """Loop dọn dẹp định kỳ"""
+        try:
+            while True:
+                # Lỗi của một lượt chỉ được ghi log, lượt sau vẫn chạy theo lịch
+                try:
+                    await self.sweep_all()
+                except Exception as e:
+                    logger.error(f"Lỗi trong task resource sweeper: {e}")
+                    logger.error(traceback.format_exc())
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            logger.debug("Task resource sweeper đã bị hủy")
@@ -9,6 +9,9 @@ import asyncio
 
 from constants import ROLE_DESCRIPTIONS, ROLE_ICONS, ROLE_LINKS, ROLES, VILLAGER_ROLES, WEREWOLF_ROLES
 from utils.api_utils import retry_api_call, safe_send_message
+from utils.member_mutations import MemberMutationBatch
+from utils.perf import traced
+from utils.game_journal import EventKind, record_event
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +32,7 @@ def get_player_team(role: str) -> str:
     else:
         return "unknown"
 
+@traced("setup.assign_roles")
 async def assign_random_roles(game_state, guild):
     """
     Phân vai ngẫu nhiên cho người chơi
@@ -53,6 +57,7 @@ async def assign_random_roles(game_state, guild):
     illusionist_player = None
     
     tasks = []
+    role_batch = MemberMutationBatch(guild, reason="Phân vai trò Ma Sói")
     for i, user_id in enumerate(game_state.temp_players):
         member = game_state.member_cache.get(user_id)
         if not member:
@@ -65,20 +70,18 @@ async def assign_random_roles(game_state, guild):
             "status": "alive", 
             "muted": False
         }
+        record_event(game_state, EventKind.ROLE_ASSIGNED, actor=user_id, data=role)
         
-        # Gán Discord roles
-        role_tasks = [member.add_roles(villager_role)]
+        # Gán Discord roles (gom lại, áp dụng một lần cho mỗi người sau vòng lặp)
+        role_batch.update_roles(member, add=[villager_role])
         
         if role in ["Werewolf", "Wolfman", "Demon Werewolf", "Assassin Werewolf"]:
-            role_tasks.append(member.add_roles(werewolf_role))
-            role_tasks.append(wolf_channel.set_permissions(member, read_messages=True, send_messages=True))
+            role_batch.update_roles(member, add=[werewolf_role])
+            tasks.append(wolf_channel.set_permissions(member, read_messages=True, send_messages=True))
             werewolf_players.append(member)
         elif role == "Illusionist":
             illusionist_player = member
         
-        # Thực hiện các thao tác role Discord song song
-        tasks.append(asyncio.gather(*role_tasks))
-        
         # Tạo embed thông báo vai trò (chỉ giữ lại phần này)
         role_icon_url = ROLE_ICONS.get(role, "https://example.com/default_icon.png")
         role_link = ROLE_LINKS.get(role, "")
@@ -118,6 +121,7 @@ async def assign_random_roles(game_state, guild):
             game_state["explorer_can_act"] = True
     
     # Đợi tất cả các tác vụ hoàn thành
+    tasks.append(role_batch.apply())
     await asyncio.gather(*tasks)
     
     # Gửi thông báo trong Wolf Channel về danh sách sói và ảo giác
@@ -304,23 +308,13 @@ async def handle_player_death(interaction, member, user_id, game_state, guild):
         # Tạo các tasks để thực hiện đồng thời
         tasks = []
         
-        # Task gán vai trò Dead và xóa vai trò Villager/Werewolf
+        # Task gán vai trò Dead và xóa vai trò Villager/Werewolf trong một lần member.edit
         async def update_roles():
-            try:
-                roles_to_remove = []
-                if villager_role in member.roles:
-                    roles_to_remove.append(villager_role)
-                
-                if werewolf_role and werewolf_role in member.roles:
-                    roles_to_remove.append(werewolf_role)
-                
-                if roles_to_remove:
-                    await member.remove_roles(*roles_to_remove, reason="Người chơi đã chết")
-                
-                await member.add_roles(dead_role, reason="Người chơi đã chết")
+            batch = MemberMutationBatch(guild, reason="Người chơi đã chết")
+            batch.update_roles(member, add=[dead_role], remove=[villager_role, werewolf_role])
+            result = await batch.apply()
+            if not result.get(member.id):
                 logger.info(f"Đã cập nhật vai trò cho người chết: {member.display_name}")
-            except Exception as e:
-                logger.error(f"Lỗi cập nhật vai trò cho người chết {member.id}: {str(e)}")
         
         # Task cấp quyền truy cập kênh dead-chat
         async def update_dead_channel():
@@ -0,0 +1,79 @@
+# utils/task_graph.py
+# Chạy các bước theo đồ thị phụ thuộc: bước nào đủ điều kiện thì chạy ngay, song song với các bước khác
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Step(NamedTuple):
+    """Một bước trong đồ thị: hàm không tham số trả về coroutine và tên các bước phải xong trước"""
+    func: Callable[[], Awaitable]
+    after: Tuple[str, ...] = ()
+
+class SkippedStep(Exception):
+    """Bước bị bỏ qua vì một bước phụ thuộc đã thất bại"""
+
+def _check_acyclic(steps: Dict[str, Step], name: str):
+    """Đồ thị có vòng sẽ khiến các bước chờ nhau mãi mãi"""
+    done, visiting = set(), set()
+
+    def visit(step_name: str):
+        if step_name in done:
+            return
+        if step_name in visiting:
+            raise ValueError(f"{name} có phụ thuộc vòng tại bước '{step_name}'")
+        visiting.add(step_name)
+        for dep in steps[step_name].after:
+            visit(dep)
+        visiting.discard(step_name)
+        done.add(step_name)
+
+    for step_name in steps:
+        visit(step_name)
+
+async def run_step_graph(steps: Dict[str, Step], name: str = "graph") -> Dict[str, object]:
+    """
+    Chạy tất cả các bước, mỗi bước bắt đầu ngay khi các bước nó phụ thuộc đã xong
+
+    Args:
+        steps (dict): {tên bước: Step}
+        name (str): Tên đồ thị để ghi log
+
+    Returns:
+        dict: {tên bước: kết quả hoặc exception nếu bước thất bại/bị bỏ qua}
+    """
+    for step_name, step in steps.items():
+        missing = [dep for dep in step.after if dep not in steps]
+        if missing:
+            raise ValueError(f"Bước '{step_name}' của {name} phụ thuộc vào bước không tồn tại: {', '.join(missing)}")
+    _check_acyclic(steps, name)
+
+    loop = asyncio.get_running_loop()
+    futures = {step_name: loop.create_future() for step_name in steps}
+
+    async def run(step_name: str, step: Step):
+        future = futures[step_name]
+        try:
+            for dep in step.after:
+                result = await asyncio.shield(futures[dep])
+                if isinstance(result, Exception):
+                    raise SkippedStep(f"bước '{dep}' thất bại")
+            future.set_result(await step.func())
+        except SkippedStep as e:
+            logger.warning(f"{name}: bỏ qua bước '{step_name}' vì {e}")
+            future.set_result(e)
+        except Exception as e:
+            logger.error(f"{name}: lỗi ở bước '{step_name}': {str(e)}")
+            future.set_result(e)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    await asyncio.gather(*(run(step_name, step) for step_name, step in steps.items()))
+    return {step_name: future.result() for step_name, future in futures.items()}
+
+def failed_steps(results: Dict[str, object]) -> Iterable[str]:
+    """Tên các bước thất bại hoặc bị bỏ qua"""
+    return [step_name for step_name, result in results.items() if isinstance(result, Exception)]
@@ -6,30 +6,90 @@ import asyncio
 import logging
 from typing import Dict, Optional
 
+from utils.audio_cache import audio_cache
+
 logger = logging.getLogger(__name__)
 
+# VoiceManager đang hoạt động (để các module khác không phải import từ main)
+_active_manager = None
+
+def get_voice_manager():
+    """Lấy VoiceManager đang hoạt động, None nếu chưa khởi tạo"""
+    return _active_manager
+
+def start_playback(voice_client, file_path) -> bool:
+    """
+    Phát âm thanh ngay trên voice client đang kết nối (dùng chung cho VoiceManager và api_utils.play_audio)
+
+    Returns:
+        bool: True nếu đã bắt đầu phát
+    """
+    try:
+        # Ngừng phát âm thanh nếu đang phát
+        if voice_client.is_playing():
+            voice_client.stop()
+
+        # Ưu tiên PCM đã giải mã sẵn, chỉ chạy ffmpeg nếu file chưa có trong cache
+        audio_source = audio_cache.get_source(file_path)
+        if audio_source is None:
+            audio_source = discord.FFmpegPCMAudio(file_path)
+
+        voice_client.play(
+            audio_source,
+            after=lambda error: logger.error(f"Audio playback error: {error}") if error else None
+        )
+        return True
+    except FileNotFoundError:
+        logger.error(f"Audio file not found: {file_path}")
+    except discord.errors.ClientException as e:
+        logger.error(f"Discord client error when playing audio: {e}")
+    except Exception as e:
+        logger.error(f"General error playing audio {file_path}: {e}")
+    return False
+
 class VoiceManager:
     """Lớp quản lý các kết nối voice của bot"""
-    
-    def __init__(self, bot):
+
+    def __init__(self, bot, health_check_interval: float = 30, max_reconnect_attempts: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        global _active_manager
         self.bot = bot
         self.voice_connections: Dict[int, discord.VoiceClient] = {}
-        self.keepalive_tasks: Dict[int, asyncio.Task] = {}
         self.channel_ids: Dict[int, int] = {}  # Lưu channel id để kết nối lại
         self.game_states = {}  # Tham chiếu đến game_states
-        
+
+        # Trạng thái kết nối theo guild: "connected", "reconnecting", "failed"
+        self.states: Dict[int, str] = {}
+        # Mỗi guild chỉ có tối đa một lần kết nối lại đang chạy
+        self.reconnect_tasks: Dict[int, asyncio.Task] = {}
+        # Âm thanh chờ phát khi kết nối được khôi phục (chỉ giữ âm thanh mới nhất của mỗi guild)
+        self.pending_audio: Dict[int, str] = {}
+
+        # Một task giám sát chung cho tất cả guild thay cho loop keepalive riêng từng guild
+        self.supervisor_task: Optional[asyncio.Task] = None
+        self.wake_event = asyncio.Event()
+        self.health_check_interval = health_check_interval
+
+        # Backoff dùng chung: số lần kết nối lại thất bại liên tiếp trên mọi guild
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_streak = 0
+
+        _active_manager = self
+
     def set_game_states_reference(self, game_states):
         """Thiết lập tham chiếu đến game_states"""
         self.game_states = game_states
-        
+
     async def connect_to_voice(self, voice_channel, guild_id):
         """
-        Kết nối đến kênh voice và thiết lập giữ kết nối
-        
+        Kết nối đến kênh voice và đăng ký guild với task giám sát
+
         Args:
             voice_channel (discord.VoiceChannel): Kênh voice cần kết nối
             guild_id (int): ID của guild
-        
+
         Returns:
             discord.VoiceClient: Kết nối voice đã được thiết lập
         """
@@ -38,138 +98,247 @@ class VoiceManager:
             if guild_id in self.voice_connections and self.voice_connections[guild_id].is_connected():
                 await self.voice_connections[guild_id].disconnect(force=True)
                 logger.info(f"Đã ngắt kết nối voice cũ trong guild {guild_id}")
-            
+
             # Thử kết nối
             voice_client = await voice_channel.connect(timeout=10.0, reconnect=True)
-            
+
             # Lưu thông tin
             self.voice_connections[guild_id] = voice_client
             self.channel_ids[guild_id] = voice_channel.id
-            
-            # Bắt đầu task giữ kết nối
-            self._start_keepalive(guild_id)
-            
+            self.states[guild_id] = "connected"
+
+            # Đảm bảo task giám sát đang chạy
+            self.start_supervisor()
+
             logger.info(f"Kết nối thành công đến kênh voice {voice_channel.name} (ID: {voice_channel.id}) trong guild {guild_id}")
             return voice_client
-            
+
         except Exception as e:
             logger.error(f"Lỗi khi kết nối đến kênh voice: {e}")
             return None
-    
+
     async def disconnect(self, guild_id):
         """Ngắt kết nối voice từ guild"""
-        if guild_id in self.voice_connections and self.voice_connections[guild_id].is_connected():
-            # Dừng task giữ kết nối
-            self._stop_keepalive(guild_id)
-            
-            # Ngắt kết nối
-            await self.voice_connections[guild_id].disconnect()
-            
-            # Xóa thông tin
-            del self.voice_connections[guild_id]
-            if guild_id in self.channel_ids:
-                del self.channel_ids[guild_id]
-                
+        # Hủy kết nối lại đang chạy và âm thanh đang chờ
+        task = self.reconnect_tasks.pop(guild_id, None)
+        if task and not task.done():
+            task.cancel()
+        self.pending_audio.pop(guild_id, None)
+        self.states.pop(guild_id, None)
+
+        voice_client = self.voice_connections.pop(guild_id, None)
+        self.channel_ids.pop(guild_id, None)
+
+        if voice_client and voice_client.is_connected():
+            await voice_client.disconnect()
             logger.info(f"Đã ngắt kết nối voice từ guild {guild_id}")
             return True
         return False
-    
-    def _start_keepalive(self, guild_id):
-        """Bắt đầu task giữ kết nối cho guild"""
-        if guild_id in self.keepalive_tasks and not self.keepalive_tasks[guild_id].done():
-            self.keepalive_tasks[guild_id].cancel()
-        
-        self.keepalive_tasks[guild_id] = asyncio.create_task(self._keepalive_loop(guild_id))
-        logger.debug(f"Đã bắt đầu task giữ kết nối cho guild {guild_id}")
-    
-    def _stop_keepalive(self, guild_id):
-        """Dừng task giữ kết nối cho guild"""
-        if guild_id in self.keepalive_tasks and not self.keepalive_tasks[guild_id].done():
-            self.keepalive_tasks[guild_id].cancel()
-            logger.debug(f"Đã dừng task giữ kết nối cho guild {guild_id}")
-    
-    async def _keepalive_loop(self, guild_id):
-        """Loop giữ kết nối voice"""
+
+    def start_supervisor(self):
+        """Bắt đầu task giám sát (gọi lại nhiều lần không tạo thêm task)"""
+        if self.supervisor_task and not self.supervisor_task.done():
+            return
+        self.supervisor_task = asyncio.create_task(self._supervisor_loop())
+        logger.debug("Đã bắt đầu task giám sát voice")
+
+    def stop_supervisor(self):
+        """Dừng task giám sát"""
+        if self.supervisor_task and not self.supervisor_task.done():
+            self.supervisor_task.cancel()
+            logger.debug("Đã dừng task giám sát voice")
+
+    async def _supervisor_loop(self):
+        """Kiểm tra tất cả kết nối khi có sự kiện hoặc định kỳ nếu không có sự kiện nào"""
         try:
             while True:
-                await asyncio.sleep(20)  # Kiểm tra mỗi 20 giây
-                
-                if guild_id not in self.voice_connections:
-                    logger.debug(f"Guild {guild_id} không còn trong danh sách kết nối voice, dừng keepalive")
-                    break
-                    
-                voice_client = self.voice_connections[guild_id]
-                
-                # Kiểm tra nếu kết nối đã bị ngắt
-                if not voice_client or not voice_client.is_connected():
-                    logger.warning(f"Phát hiện mất kết nối voice trong guild {guild_id}, đang thử kết nối lại")
-                    await self._attempt_reconnect(guild_id)
-                    
+                try:
+                    await asyncio.wait_for(self.wake_event.wait(), timeout=self.health_check_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wake_event.clear()
+
+                for guild_id, voice_client in list(self.voice_connections.items()):
+                    if not voice_client or not voice_client.is_connected():
+                        if guild_id not in self.reconnect_tasks:
+                            logger.warning(f"Phát hiện mất kết nối voice trong guild {guild_id}, đang thử kết nối lại")
+                        self.request_reconnect(guild_id)
+
         except asyncio.CancelledError:
-            logger.debug(f"Task giữ kết nối cho guild {guild_id} đã bị hủy")
+            logger.debug("Task giám sát voice đã bị hủy")
         except Exception as e:
-            logger.error(f"Lỗi trong task giữ kết nối cho guild {guild_id}: {e}")
-    
-    async def _attempt_reconnect(self, guild_id):
-        """Thử kết nối lại khi mất kết nối"""
-        # Kiểm tra xem có thông tin kênh không
+            logger.error(f"Lỗi trong task giám sát voice: {e}")
+
+    def request_reconnect(self, guild_id) -> Optional[asyncio.Task]:
+        """
+        Yêu cầu kết nối lại cho guild, dùng lại lần kết nối lại đang chạy nếu có
+
+        Returns:
+            asyncio.Task: Task kết nối lại (kết quả True/False), None nếu không có thông tin kênh
+        """
         if guild_id not in self.channel_ids:
             logger.error(f"Không có thông tin kênh voice để kết nối lại cho guild {guild_id}")
+            return None
+
+        task = self.reconnect_tasks.get(guild_id)
+        if task and not task.done():
+            return task
+
+        self.states[guild_id] = "reconnecting"
+        task = asyncio.create_task(self._reconnect_with_backoff(guild_id))
+        self.reconnect_tasks[guild_id] = task
+        return task
+
+    async def _attempt_reconnect(self, guild_id):
+        """Thử kết nối lại khi mất kết nối (chờ lần kết nối lại chung của guild)"""
+        task = self.request_reconnect(guild_id)
+        if task is None:
             return False
-            
+        # shield để người gọi bị hủy không làm hủy lần kết nối lại dùng chung
+        return await asyncio.shield(task)
+
+    def _backoff_delay(self) -> float:
+        """Thời gian chờ trước lần thử tiếp theo, tăng theo số lần thất bại liên tiếp"""
+        if self.failure_streak == 0:
+            return 0
+        return min(self.backoff_max, self.backoff_base * (2 ** (self.failure_streak - 1)))
+
+    async def _reconnect_with_backoff(self, guild_id):
+        """Thử kết nối lại nhiều lần với backoff, phát âm thanh đang chờ khi thành công"""
+        try:
+            for attempt in range(1, self.max_reconnect_attempts + 1):
+                if guild_id not in self.channel_ids:
+                    return False
+
+                voice_client = self.voice_connections.get(guild_id)
+                if voice_client and voice_client.is_connected():
+                    self._on_reconnected(guild_id, voice_client)
+                    return True
+
+                delay = self._backoff_delay()
+                if delay:
+                    logger.info(f"Chờ {delay:.1f}s trước lần kết nối lại thứ {attempt} trong guild {guild_id}")
+                    await asyncio.sleep(delay)
+
+                voice_client = await self._reconnect_once(guild_id)
+                if voice_client:
+                    self.failure_streak = 0
+                    self._on_reconnected(guild_id, voice_client)
+                    await self._notify_reconnected(guild_id)
+                    return True
+
+                self.failure_streak += 1
+
+            logger.error(f"Không thể kết nối lại voice trong guild {guild_id} sau {self.max_reconnect_attempts} lần thử")
+            self.states[guild_id] = "failed"
+            self.pending_audio.pop(guild_id, None)
+            return False
+        finally:
+            if self.reconnect_tasks.get(guild_id) is asyncio.current_task():
+                del self.reconnect_tasks[guild_id]
+
+    async def _reconnect_once(self, guild_id) -> Optional[discord.VoiceClient]:
+        """Một lần kết nối lại tới kênh đã lưu"""
         try:
             # Lấy thông tin kênh
             channel_id = self.channel_ids[guild_id]
             channel = self.bot.get_channel(channel_id)
-            
+
             if not channel:
                 logger.error(f"Không tìm thấy kênh voice {channel_id} trong guild {guild_id}")
-                return False
-                
+                return None
+
+            # Bỏ voice client cũ còn treo, nếu không connect() sẽ báo "Already connected"
+            stale_client = channel.guild.voice_client
+            if stale_client and not stale_client.is_connected():
+                await stale_client.disconnect(force=True)
+
             # Kết nối lại
             voice_client = await channel.connect(timeout=10.0, reconnect=True)
-            self.voice_connections[guild_id] = voice_client
-            
-            # Cập nhật game_state nếu đang có game chạy
-            if guild_id in self.game_states and self.game_states[guild_id].get("is_game_running"):
-                game_state = self.game_states[guild_id]
-                game_state["voice_connection"] = voice_client
-                
-                # Thông báo trong kênh text nếu có
-                if game_state.get("text_channel"):
-                    await game_state["text_channel"].send("🔄 Bot đã kết nối lại kênh voice sau khi bị ngắt kết nối!")
-            
             logger.info(f"Đã kết nối lại thành công đến kênh voice {channel.name} trong guild {guild_id}")
-            return True
-            
+            return voice_client
+
         except Exception as e:
             logger.error(f"Lỗi khi thử kết nối lại kênh voice trong guild {guild_id}: {e}")
-            return False
-            
+            return None
+
+    def _on_reconnected(self, guild_id, voice_client):
+        """Cập nhật trạng thái sau khi kết nối lại và phát âm thanh đang chờ"""
+        self.voice_connections[guild_id] = voice_client
+        self.states[guild_id] = "connected"
+
+        # Cập nhật game_state nếu đang có game chạy
+        if guild_id in self.game_states and self.game_states[guild_id].get("is_game_running"):
+            self.game_states[guild_id]["voice_connection"] = voice_client
+
+        file_path = self.pending_audio.pop(guild_id, None)
+        if file_path:
+            start_playback(voice_client, file_path)
+
+    async def _notify_reconnected(self, guild_id):
+        """Thông báo trong kênh text nếu có game đang chạy"""
+        game_state = self.game_states.get(guild_id)
+        if game_state and game_state.get("is_game_running") and game_state.get("text_channel"):
+            try:
+                await game_state["text_channel"].send("🔄 Bot đã kết nối lại kênh voice sau khi bị ngắt kết nối!")
+            except Exception as e:
+                logger.error(f"Không thể gửi thông báo kết nối lại trong guild {guild_id}: {e}")
+
+    def play(self, guild_id, file_path, voice_client=None) -> bool:
+        """
+        Phát âm thanh trong guild, hoặc xếp hàng chờ nếu đang mất kết nối
+
+        Args:
+            guild_id (int): ID của guild
+            file_path (str): Đường dẫn đến file âm thanh
+            voice_client (discord.VoiceClient, optional): Kết nối mà người gọi đang giữ
+
+        Returns:
+            bool: True nếu đã phát ngay, False nếu phải chờ kết nối lại hoặc lỗi
+        """
+        current = self.voice_connections.get(guild_id) or voice_client
+        if current and current.is_connected():
+            return start_playback(current, file_path)
+
+        # Âm thanh phase mới thay thế âm thanh cũ đang chờ
+        self.pending_audio[guild_id] = file_path
+        if self.request_reconnect(guild_id) is None:
+            self.pending_audio.pop(guild_id, None)
+        else:
+            logger.warning(f"Voice trong guild {guild_id} đang mất kết nối, âm thanh {file_path} sẽ phát khi kết nối lại")
+        return False
+
     async def handle_voice_state_update(self, member, before, after):
         """Xử lý sự kiện thay đổi trạng thái voice"""
         # Xử lý khi bot bị ngắt kết nối
         if member.id == self.bot.user.id and before.channel and not after.channel:
             guild_id = before.channel.guild.id
             logger.warning(f"Bot bị ngắt kết nối khỏi kênh voice trong guild {guild_id}")
-            
+
             # Kiểm tra nếu đang có game chạy
             if guild_id in self.game_states and self.game_states[guild_id].get("is_game_running"):
                 logger.info(f"Đang có game chạy trong guild {guild_id}, thử kết nối lại")
-                await self._attempt_reconnect(guild_id)
-                
+                self.request_reconnect(guild_id)
+            else:
+                # Đánh thức task giám sát để kiểm tra lại trạng thái
+                self.wake_event.set()
+
         # Xử lý khi không còn người trong kênh (ngoài bot)
         elif before.channel and member.id != self.bot.user.id:
             if before.channel.members and len([m for m in before.channel.members if not m.bot]) == 0:
                 guild_id = before.channel.guild.id
-                
+
                 # Không tự động ngắt kết nối nếu đang có game chạy
                 if guild_id in self.game_states and self.game_states[guild_id].get("is_game_running"):
                     logger.debug(f"Không ngắt kết nối khỏi kênh trống vì game đang chạy trong guild {guild_id}")
                     return
-                    
+
                 # Ngắt kết nối nếu không còn người trong kênh và không có game chạy
                 voice_client = discord.utils.get(self.bot.voice_clients, guild=before.channel.guild)
                 if voice_client and voice_client.channel == before.channel:
                     logger.info(f"Ngắt kết nối khỏi kênh trống {before.channel.name} trong guild {guild_id}")
-                    await voice_client.disconnect()
\ No newline at end of file
+                    if guild_id in self.voice_connections:
+                        # Hủy đăng ký để task giám sát không kết nối lại
+                        await self.disconnect(guild_id)
+                    else:
+                        await voice_client.disconnect()
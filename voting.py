@@ -5,11 +5,15 @@ import discord
 import logging
 import asyncio
 import traceback
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
-from constants import GIF_URLS, AUDIO_FILES, WEREWOLF_ROLES  # Thêm import WEREWOLF_ROLES
+from constants import GIF_URLS, AUDIO_FILES
 from utils.api_utils import play_audio, countdown, safe_send_message
-from db import update_leaderboard, update_all_player_stats  # Thêm import update_all_player_stats
+from db import update_all_player_stats
+from game_state import VoteTally
+from utils.perf import traced
+from utils.log_pipeline import bind_game_context
+from utils.game_journal import EventKind, record_event
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +31,8 @@ async def voting_phase(interaction: discord.Interaction, game_state):
         
     logger.info(f"Starting voting phase in guild {interaction.guild.id}")
     game_state["phase"] = "voting"
+    bind_game_context(game_state)
+    record_event(game_state, EventKind.PHASE, data="voting")
     text_channel = game_state["text_channel"]
     
     try:
@@ -41,11 +47,16 @@ async def voting_phase(interaction: discord.Interaction, game_state):
         )
         vote_embed.set_image(url=GIF_URLS["vote"])
         
+        # Khởi tạo bảng kiểm phiếu cho lượt này
+        game_state["votes"].clear()
+        game_state["vote_tally"] = VoteTally([m.id for m in alive_players], get_eligible_voters(game_state))
+        
         # Import view
         from views.voting_views import VoteView
         
-        # Tạo view và gửi tin nhắn
-        vote_message = await text_channel.send(embed=vote_embed, view=VoteView(alive_players, game_state, 45))
+        # Tạo view và gửi tin nhắn (embed này được cập nhật trực tiếp khi có phiếu mới)
+        vote_message = await text_channel.send(embed=vote_embed, view=VoteView(alive_players, game_state))
+        game_state["vote_board"] = LiveVoteBoard(vote_message, vote_embed, game_state)
         await vote_message.pin()
         
         # Phát âm thanh không đồng bộ
@@ -61,15 +72,18 @@ async def voting_phase(interaction: discord.Interaction, game_state):
         if game_state["is_game_running"] and not game_state["is_game_paused"]:
             await text_channel.send("🗳️ **Nhắc nhở:** Còn 30 giây để bỏ phiếu!")
         
-        # Hiển thị nhắc nhở thứ hai và kết quả tạm thời sau 30 giây
+        # Hiển thị nhắc nhở thứ hai sau 30 giây (kết quả tạm thời đã hiển thị trực tiếp trên tin nhắn vote)
         await asyncio.sleep(15)  # thêm 15 giây nữa (tổng 30 giây)
         if game_state["is_game_running"] and not game_state["is_game_paused"]:
             await text_channel.send("🗳️ **Nhắc nhở cuối:** Còn 15 giây để bỏ phiếu!")
-            await display_current_votes(interaction, game_state)
         
         # Đếm ngược 15 giây cuối (để đạt tổng 45 giây)
         await countdown(text_channel, 15, "bỏ phiếu", game_state)
         
+        # Dừng cập nhật embed trực tiếp
+        if game_state.get("vote_board"):
+            await game_state["vote_board"].close()
+        
         # Bỏ ghim tin nhắn vote
         try:
             await vote_message.unpin()
@@ -125,50 +139,84 @@ async def get_alive_players(interaction: discord.Interaction, game_state) -> Lis
                 alive_players.append(member)
     return alive_players
 
-async def display_current_votes(interaction: discord.Interaction, game_state):
+class LiveVoteBoard:
     """
-    Hiển thị phiếu bầu hiện tại
+    Embed kết quả bỏ phiếu trực tiếp trên tin nhắn vote
     
-    Args:
-        interaction (discord.Interaction): Interaction gốc
-        game_state (dict): Trạng thái game hiện tại
+    Mỗi phiếu mới chỉ đánh dấu cần cập nhật; tin nhắn được sửa tối đa một lần
+    trong mỗi khoảng debounce.
     """
-    text_channel = game_state["text_channel"]
-    if not text_channel:
-        return
     
-    try:
-        # Đếm phiếu
-        vote_counts, skip_votes, ineligible_count = count_votes(game_state)
-        non_vote_count = skip_votes + ineligible_count
-        
-        # Tạo nội dung hiển thị
-        embed = discord.Embed(
-            title="🗳️ Thống Kê Phiếu Bầu Tạm Thời",
-            color=discord.Color.gold()
-        )
-        
-        # Hiển thị phiếu bầu cho từng người
-        if vote_counts:
-            vote_lines = []
-            for target_id, count in sorted(vote_counts.items(), key=lambda x: x[1], reverse=True):
-                target_member = game_state["member_cache"].get(target_id)
-                if target_member:
-                    vote_lines.append(f"**{target_member.display_name}**: {count} phiếu")
-            
-            embed.add_field(name="Phiếu bầu", value="\n".join(vote_lines) or "Không có phiếu bầu", inline=False)
-        else:
-            embed.add_field(name="Phiếu bầu", value="Chưa có ai nhận được phiếu bầu", inline=False)
-        
-        # Gộp số phiếu bỏ qua và không đủ điều kiện
-        embed.add_field(name="Bỏ qua/Không đủ điều kiện", value=str(non_vote_count), inline=False)
-        
-        embed.set_footer(text="Kết quả tạm thời, còn 15 giây để bỏ phiếu...")
-        await text_channel.send(embed=embed)
-    except Exception as e:
-        logger.error(f"Error displaying current votes: {str(e)}")
-        traceback.print_exc()
+    def __init__(self, message: discord.Message, base_embed: discord.Embed, game_state, debounce: float = 3.0):
+        self.message = message
+        self.base_embed = base_embed
+        self.game_state = game_state
+        self.debounce = debounce
+        self.rendered_version = -1
+        self.last_edit = 0.0
+        self.update_task: Optional[asyncio.Task] = None
+        self.closed = False
+    
+    def schedule_update(self):
+        """Đánh dấu cần cập nhật; gộp các phiếu đến trong cùng khoảng debounce"""
+        if self.closed or (self.update_task and not self.update_task.done()):
+            return
+        self.update_task = asyncio.create_task(self._update_later())
+    
+    async def _update_later(self):
+        # Phiếu đến trong lúc đang sửa tin nhắn không tạo task mới (task này chưa xong),
+        # nên sau mỗi lần sửa kiểm tra lại và vẽ tiếp nếu tally đã đổi
+        loop = asyncio.get_event_loop()
+        while not self.closed:
+            delay = self.last_edit + self.debounce - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not await self._render():
+                return
+    
+    def _is_stale(self) -> bool:
+        tally = self.game_state.get("vote_tally")
+        return bool(tally) and tally.version != self.rendered_version
+    
+    def build_embed(self) -> discord.Embed:
+        """Embed gốc của pha bỏ phiếu kèm kết quả tạm thời"""
+        embed = self.base_embed.copy()
+        embed.clear_fields()
+        vote_counts, skip_votes, ineligible_count = count_votes(self.game_state)
+        
+        vote_lines = []
+        for target_id, count in sorted(vote_counts.items(), key=lambda x: x[1], reverse=True):
+            target_member = self.game_state["member_cache"].get(target_id)
+            if target_member:
+                vote_lines.append(f"**{target_member.display_name}**: {count} phiếu")
+        
+        embed.add_field(name="Phiếu bầu", value="\n".join(vote_lines) or "Chưa có ai nhận được phiếu bầu", inline=False)
+        embed.add_field(name="Bỏ qua/Không đủ điều kiện", value=str(skip_votes + ineligible_count), inline=False)
+        return embed
+    
+    async def _render(self) -> bool:
+        """Sửa tin nhắn nếu tally đã đổi; True nếu cần vẽ lại (có phiếu mới đến trong lúc sửa)"""
+        if self.closed or not self._is_stale():
+            return False
+        version = self.game_state.get("vote_tally").version
+        try:
+            await self.message.edit(embed=self.build_embed())
+            self.rendered_version = version
+        except Exception as e:
+            logger.warning(f"Không thể cập nhật embed bỏ phiếu: {str(e)}")
+            # Không thử lại liên tục khi Discord lỗi; phiếu tiếp theo sẽ lên lịch lại
+            return False
+        finally:
+            self.last_edit = asyncio.get_event_loop().time()
+        return not self.closed and self._is_stale()
+    
+    async def close(self):
+        """Dừng cập nhật sau khi hết giờ bỏ phiếu"""
+        self.closed = True
+        if self.update_task and not self.update_task.done():
+            self.update_task.cancel()
 
+@traced("voting.display_results")
 async def display_final_votes(interaction: discord.Interaction, game_state):
     """
     Hiển thị kết quả phiếu bầu cuối cùng
@@ -223,44 +271,52 @@ async def display_final_votes(interaction: discord.Interaction, game_state):
         logger.error(f"Error displaying final votes: {str(e)}")
         traceback.print_exc()
 
+def get_eligible_voters(game_state) -> Set[int]:
+    """Tập người được tính phiếu đã chốt khi hết giờ giải toán (chốt ngay nếu chưa có)"""
+    eligible_voters = game_state.get("eligible_voters")
+    if eligible_voters is None:
+        eligible_voters = game_state.close_math_window()
+    return eligible_voters
+
 def count_votes(game_state) -> Tuple[Dict[int, int], int, int]:
     """
     Đếm số phiếu bầu cho từng người chơi
     
+    Dùng bảng kiểm phiếu tăng dần của lượt hiện tại nếu có, nếu không thì đếm lại từ đầu.
+    
     Args:
         game_state (dict): Trạng thái game
         
     Returns:
         Tuple[Dict[int, int], int, int]: (vote_counts, skip_votes, ineligible_count)
     """
+    tally = game_state.get("vote_tally")
+    if tally is not None:
+        return tally.snapshot()
+    
     vote_counts = {}
     skip_votes = 0
     ineligible_count = 0
     
+    eligible_voters = get_eligible_voters(game_state)
     for user_id, data in game_state["players"].items():
         if not data["status"] in ["alive", "wounded"]:
             continue
-            
-        # Kiểm tra điều kiện để vote
-        from constants import NO_NIGHT_ACTION_ROLES
-        eligible_to_vote = True
         
-        if data["role"] in NO_NIGHT_ACTION_ROLES:
-            if user_id not in game_state["math_results"] or not game_state["math_results"][user_id]:
-                eligible_to_vote = False
-                ineligible_count += 1
-                continue
+        if user_id not in eligible_voters:
+            ineligible_count += 1
+            continue
         
         # Xử lý phiếu bầu
-        if eligible_to_vote:
-            target_id = game_state["votes"].get(user_id, "skip")
-            if target_id == "skip":
-                skip_votes += 1
-            elif isinstance(target_id, int):
-                vote_counts[target_id] = vote_counts.get(target_id, 0) + 1
+        target_id = game_state["votes"].get(user_id, "skip")
+        if target_id == "skip":
+            skip_votes += 1
+        elif isinstance(target_id, int):
+            vote_counts[target_id] = vote_counts.get(target_id, 0) + 1
     
     return vote_counts, skip_votes, ineligible_count
 
+@traced("voting.process_results")
 async def process_vote_results(interaction: discord.Interaction, game_state):
     """
     Xử lý kết quả bỏ phiếu để loại người chơi
@@ -299,6 +355,8 @@ async def process_vote_results(interaction: discord.Interaction, game_state):
                 game_state["players"][eliminated_id]["status"] in ["alive", "wounded"]):
                 # Xử lý người chơi bị loại
                 game_state["players"][eliminated_id]["status"] = "dead"
+                record_event(game_state, EventKind.VOTE_RESULT, target=eliminated_id, data=str(max_votes))
+                record_event(game_state, EventKind.STATUS, actor=eliminated_id, data="dead")
                 
                 # Import hàm xử lý người chơi chết
                 from utils.role_utils import handle_player_death
@@ -316,19 +374,17 @@ async def process_vote_results(interaction: discord.Interaction, game_state):
                 # Phát âm thanh
                 await play_audio(AUDIO_FILES["hang"], game_state["voice_connection"])
                 
-                # Thêm vào log
-                if hasattr(interaction, 'guild') and interaction.guild.id in globals().get('game_logs', {}):
-                    game_logs[interaction.guild.id].append(f"{eliminated_member.display_name} bị ngồi ghế điện với {max_votes} phiếu.")
-                    
                 return True  # Có người bị loại
         
         elif len(candidates) > 1:
             # Có đồng phiếu giữa các người chơi
             candidate_names = [game_state["member_cache"].get(c).display_name for c in candidates if game_state["member_cache"].get(c)]
+            record_event(game_state, EventKind.VOTE_RESULT, data=str(max_votes))
             await text_channel.send(f"**Có đồng phiếu giữa {', '.join(candidate_names)}! Không ai bị loại.**")
             
         else:
             # Số phiếu bỏ qua cao hơn hoặc bằng số phiếu cao nhất
+            record_event(game_state, EventKind.VOTE_RESULT, data=str(max_votes))
             await text_channel.send(f"**Không ai bị loại!** Số phiếu 'bỏ qua' cao hơn hoặc bằng số phiếu cao nhất ({max_votes}).")
             
     else:
@@ -469,9 +525,10 @@ async def send_game_analysis(interaction: discord.Interaction, game_state, winni
     
     await text_channel.send(embed=embed)
 
+@traced("voting.update_leaderboard")
 async def update_leaderboard_from_game(interaction: discord.Interaction, game_state, winning_team):
     """
-    Cập nhật leaderboard từ kết quả game - Sử dụng cả hai phương pháp để đảm bảo dữ liệu được cập nhật
+    Cập nhật leaderboard từ kết quả game (qua update_all_player_stats, an toàn khi gọi lại)
     
     Args:
         interaction (discord.Interaction): Interaction gốc
@@ -479,81 +536,15 @@ async def update_leaderboard_from_game(interaction: discord.Interaction, game_st
         winning_team (str): "villagers" hoặc "werewolves"
     """
     try:
-        # Thiết lập cờ để tránh cập nhật nhiều lần
-        if game_state.get("leaderboard_updated", False):
-            logger.info("Leaderboard đã được cập nhật trước đó, bỏ qua")
-            return
-            
         logger.info(f"Bắt đầu cập nhật leaderboard với phe thắng: {winning_team}")
-        
-        # Phương pháp 1: Sử dụng update_all_player_stats (đáng tin cậy hơn)
-        try:
-            logger.info("Đang cập nhật leaderboard bằng update_all_player_stats...")
-            result = await update_all_player_stats(game_state, winning_team)
-            if result:
-                logger.info("Cập nhật leaderboard thành công với update_all_player_stats")
-                game_state["leaderboard_updated"] = True
-                if game_state["text_channel"]:
-                    await game_state["text_channel"].send("🏆 Leaderboard đã được cập nhật!")
-                return
-            else:
-                logger.warning("update_all_player_stats trả về False, thử phương pháp khác")
-        except Exception as e:
-            logger.error(f"Lỗi khi sử dụng update_all_player_stats: {str(e)}")
-            traceback.print_exc()
-        
-        # Phương pháp 2: Sử dụng update_leaderboard - phương pháp backup
-        guild_id = interaction.guild.id
-        player_updates = {}
-        
-        for user_id, data in game_state["players"].items():
-            # Đảm bảo user_id là int
-            user_id_int = int(user_id)
-            
-            member = game_state["member_cache"].get(user_id_int) or game_state["member_cache"].get(str(user_id_int))
-            
-            if not member:
-                logger.warning(f"Không tìm thấy member cho user_id {user_id_int} trong cache")
-                continue
-                
-            # Xác định vai trò và điểm thưởng
-            is_werewolf = data["role"] in WEREWOLF_ROLES
-            player_team = "werewolves" if is_werewolf else "villagers"
-            
-            # SỬA ĐỔI: Kiểm tra trạng thái người chơi
-            is_alive = data["status"] in ["alive", "wounded"]
-            
-            # SỬA ĐỔI: Logic tính điểm mới
-            if player_team == winning_team:
-                score_increment = 3 if is_alive else 1
-            else:
-                score_increment = -1  # Phe thua luôn -1 điểm
-                              
-            player_updates[user_id_int] = {
-                "name": member.display_name,
-                "score": score_increment
-            }
-            
-            # Ghi log chi tiết
-            logger.debug(f"Chuẩn bị cập nhật điểm cho {member.display_name} ({user_id_int}): +{score_increment} điểm (Team: {player_team}, Win: {player_team == winning_team}, Alive: {is_alive})")
-        
-        # Cập nhật leaderboard trong database
-        try:
-            logger.info(f"Đang cập nhật leaderboard cho {len(player_updates)} người chơi...")
-            success = await update_leaderboard(guild_id, player_updates)
-            
-            if success:
-                logger.info("Cập nhật leaderboard thành công với update_leaderboard")
-                game_state["leaderboard_updated"] = True
-                if game_state["text_channel"]:
-                    await game_state["text_channel"].send("🏆 Leaderboard đã được cập nhật!")
-                return True
-            else:
-                logger.warning("Cập nhật leaderboard thất bại với update_leaderboard")
-        except Exception as e:
-            logger.error(f"Lỗi khi cập nhật leaderboard với update_leaderboard: {str(e)}")
-            traceback.print_exc()
-            
+        success, first_write = await update_all_player_stats(game_state, winning_team)
+        if success:
+            logger.info("Cập nhật leaderboard thành công")
+            if first_write and game_state["text_channel"]:
+                await game_state["text_channel"].send("🏆 Leaderboard đã được cập nhật!")
+            return True
+        
+        logger.warning("Cập nhật leaderboard thất bại")
         return False
     except Exception as e:
         logger.error(f"Lỗi tổng thể khi cập nhật leaderboard: {str(e)}")
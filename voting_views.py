@@ -5,22 +5,15 @@ import discord
 import logging
 from typing import List, Dict, Optional
 
-from constants import NO_NIGHT_ACTION_ROLES
+from utils.game_journal import EventKind, record_event
+from views.persistent_views import GameButton, GameSelect, GameComponentView, Route, route_handler
 
 logger = logging.getLogger(__name__)
 
-class VoteView(discord.ui.View):
+class VoteView(GameComponentView):
     """View cho việc bỏ phiếu ban ngày"""
-    def __init__(self, alive_players, game_state, timeout=45):
-        super().__init__(timeout=timeout)
-        self.alive_players = alive_players
-        self.game_state = game_state
-        self.add_item(VoteSelect(alive_players, game_state))
-        self.add_item(SkipButton(game_state))
-
-class VoteSelect(discord.ui.Select):
-    """Select menu cho việc bỏ phiếu"""
     def __init__(self, alive_players, game_state):
+        super().__init__()
         options = [
             discord.SelectOption(
                 label=member.display_name[:25], 
@@ -29,88 +22,88 @@ class VoteSelect(discord.ui.Select):
             )
             for member in alive_players
         ]
-        super().__init__(placeholder="Chọn người để loại", options=options, min_values=1, max_values=1)
-        self.game_state = game_state
+        self.add_item(GameSelect(Route.for_game("vote", game_state), options=options, placeholder="Chọn người để loại"))
+        self.add_item(GameButton(Route.for_game("vskip", game_state), label="Bỏ qua", style=discord.ButtonStyle.grey))
 
-    async def callback(self, interaction: discord.Interaction):
-        # Kiểm tra điều kiện cơ bản
-        if interaction.user.id not in self.game_state["players"] or self.game_state["players"][interaction.user.id]["status"] not in ["alive", "wounded"]:
-            await interaction.response.send_message("Bạn không thể bỏ phiếu!", ephemeral=True)
-            return
-            
-        if self.game_state["phase"] != "voting":
-            await interaction.response.send_message("Chưa phải pha bỏ phiếu!", ephemeral=True)
-            return
-            
-        if self.game_state["is_game_paused"]:
-            await interaction.response.send_message("Game đang tạm dừng, không thể bỏ phiếu!", ephemeral=True)
-            return
+def record_vote(game_state, voter_id, target):
+    """Cập nhật bảng kiểm phiếu (O(1)) và hẹn cập nhật embed trực tiếp"""
+    tally = game_state.get("vote_tally")
+    if tally is not None:
+        tally.cast(voter_id, target)
+    record_event(game_state, EventKind.VOTE, actor=voter_id, target=0 if target == "skip" else target)
+    board = game_state.get("vote_board")
+    if board is not None:
+        board.schedule_update()
 
-        # Ghi nhận phiếu bầu
-        target_id = int(self.values[0])
-        self.game_state["votes"][interaction.user.id] = target_id
-        
-        target_member = next((m for m in self.options if m.value == self.values[0]), None)
-        target_name = target_member.label if target_member else "Unknown"
+def is_counted_voter(game_state, user_id) -> bool:
+    """Phiếu của người chơi có được tính hay không (tra cứu trong tập đã chốt)"""
+    eligible_voters = game_state.get("eligible_voters")
+    return eligible_voters is None or user_id in eligible_voters
 
-        # Kiểm tra điều kiện để hiển thị thông báo phù hợp
-        player_data = self.game_state["players"][interaction.user.id]
-        
-        # Người chơi đủ điều kiện nếu: vai trò không yêu cầu toán HOẶC đã giải toán đúng
-        if player_data["role"] not in NO_NIGHT_ACTION_ROLES or (interaction.user.id in self.game_state["math_results"] and self.game_state["math_results"][interaction.user.id]):
-            embed = discord.Embed(
-                title="🗳️ Phiếu Bầu Đã Ghi Nhận",
-                description=f"Bạn đã bỏ phiếu cho **{target_name}**!",
-                color=discord.Color.blue()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-        else:
-            embed = discord.Embed(
-                title="🗳️ Phiếu Bầu Không Hợp Lệ",
-                description=f"Bạn đã bỏ phiếu cho **{target_name}**, nhưng phiếu của bạn không được tính do không giải đúng bài toán!",
-                color=discord.Color.red()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            
-        logger.info(f"Player {interaction.user.id} voted for {target_id} ({target_name})")
+async def check_voter(interaction: discord.Interaction, game_state) -> bool:
+    """Kiểm tra điều kiện cơ bản để bỏ phiếu"""
+    if interaction.user.id not in game_state["players"] or game_state["players"][interaction.user.id]["status"] not in ["alive", "wounded"]:
+        await interaction.response.send_message("Bạn không thể bỏ phiếu!", ephemeral=True)
+        return False
+    return True
 
-class SkipButton(discord.ui.Button):
-    """Button để bỏ qua vote"""
-    def __init__(self, game_state):
-        super().__init__(label="Bỏ qua", style=discord.ButtonStyle.grey)
-        self.game_state = game_state
+@route_handler("vote")
+async def vote_select(interaction: discord.Interaction, game_state, route: Route, values: List[str]):
+    """Người chơi chọn người để loại"""
+    if not await check_voter(interaction, game_state):
+        return
 
-    async def callback(self, interaction: discord.Interaction):
-        if interaction.user.id not in self.game_state["players"] or self.game_state["players"][interaction.user.id]["status"] not in ["alive", "wounded"]:
-            await interaction.response.send_message("Bạn không thể bỏ phiếu!", ephemeral=True)
-            return
-            
-        if self.game_state["phase"] != "voting":
-            await interaction.response.send_message("Chưa phải pha bỏ phiếu!", ephemeral=True)
-            return
-            
-        if self.game_state["is_game_paused"]:
-            await interaction.response.send_message("Game đang tạm dừng, không thể bỏ phiếu!", ephemeral=True)
-            return
-            
-        if interaction.user.id in self.game_state["math_results"] and not self.game_state["math_results"][interaction.user.id]:
-            embed = discord.Embed(
-                title="🗳️ Không Thể Bỏ Phiếu",
-                description="Bạn không có quyền bỏ phiếu do trả lời sai bài toán đêm qua!",
-                color=discord.Color.red()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            return
-            
-        self.game_state["votes"][interaction.user.id] = "skip"
-        
+    # Ghi nhận phiếu bầu và cập nhật bảng kiểm phiếu trực tiếp
+    target_id = int(values[0])
+    game_state["votes"][interaction.user.id] = target_id
+    record_vote(game_state, interaction.user.id, target_id)
+    
+    target_member = game_state["member_cache"].get(target_id)
+    target_name = target_member.display_name if target_member else "Unknown"
+
+    # Tập người được tính phiếu đã được chốt khi hết giờ giải toán ban đêm
+    if is_counted_voter(game_state, interaction.user.id):
         embed = discord.Embed(
-            title="🗳️ Bỏ Qua Bỏ Phiếu",
-            description="Bạn đã chọn bỏ qua việc bỏ phiếu trong lượt này.",
+            title="🗳️ Phiếu Bầu Đã Ghi Nhận",
+            description=f"Bạn đã bỏ phiếu cho **{target_name}**!",
             color=discord.Color.blue()
         )
         await interaction.response.send_message(embed=embed, ephemeral=True)
-        logger.info(f"Player {interaction.user.id} skipped voting")
+    else:
+        embed = discord.Embed(
+            title="🗳️ Phiếu Bầu Không Hợp Lệ",
+            description=f"Bạn đã bỏ phiếu cho **{target_name}**, nhưng phiếu của bạn không được tính do không giải đúng bài toán!",
+            color=discord.Color.red()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        
+    logger.info("Player %s voted for %s (%s)", interaction.user.id, target_id, target_name)
+
+@route_handler("vskip")
+async def vote_skip(interaction: discord.Interaction, game_state, route: Route, values: List[str]):
+    """Người chơi bỏ qua lượt bỏ phiếu"""
+    if not await check_voter(interaction, game_state):
+        return
+        
+    if not is_counted_voter(game_state, interaction.user.id):
+        embed = discord.Embed(
+            title="🗳️ Không Thể Bỏ Phiếu",
+            description="Bạn không có quyền bỏ phiếu do không giải đúng bài toán đêm qua!",
+            color=discord.Color.red()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+        
+    game_state["votes"][interaction.user.id] = "skip"
+    record_vote(game_state, interaction.user.id, "skip")
+    
+    embed = discord.Embed(
+        title="🗳️ Bỏ Qua Bỏ Phiếu",
+        description="Bạn đã chọn bỏ qua việc bỏ phiếu trong lượt này.",
+        color=discord.Color.blue()
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+    logger.info("Player %s skipped voting", interaction.user.id)
 
 class GameEndView(discord.ui.View):
     """View cho tùy chọn khi game kết thúc"""